@@ -1,17 +1,25 @@
-from pathlib import Path
-import pandas as pd
+import argparse
 import unicodedata
 import re
 
+from compaction import compact_frame, memory_mb
+from dag import DEFAULT_IO_WORKERS, IO_WORKERS_ENV, map_tables
+from instrumentation import current_steps, inherit_steps, step
+from paths import RAW_DIR, INTERIM_DIR, REPORTS_DIR as REPORTS_ROOT
+from profiling import TableProfiler, print_profile, save_profile
+from readers import find_raw, sniff_csv, read_header, iter_csv_chunks
+from schema import check_header, coerce_numbers, merge_invalid, print_invalid, raw_files, read_columns, read_dtypes
+from storage import TableWriter
+
 # ---------------------------
 # Configuração de caminhos
 # ---------------------------
-HERE = Path(__file__).resolve().parent
-PROJECT_ROOT = HERE.parent
-RAW_DIR = PROJECT_ROOT / "data" / "raw"
-INTERIM_DIR = PROJECT_ROOT / "data" / "interim"
+REPORTS_DIR = REPORTS_ROOT / "raw"
 INTERIM_DIR.mkdir(parents=True, exist_ok=True)
 
+# Linhas por bloco na leitura dos extratos brutos (limita a memória usada)
+CHUNK_ROWS = 250_000
+
 # ---------------------------
 # Funções utilitárias
 # ---------------------------
@@ -22,54 +30,69 @@ def clean_colname(col: str) -> str:
     s = re.sub(r"\s+", "_", no_accent.lower().strip())
     return re.sub(r"[^a-z0-9_]", "", s)
 
-def try_read_csv(path: Path):
-    encodings = ["utf-8", "latin1", "cp1252"]
-    for enc in encodings:
-        for sep in [",",";"]:
-            try:
-                df = pd.read_csv(path, encoding=enc, sep=sep, infer_datetime_format=True)
-                if df.shape[1] > 1:
-                    return df
-            except Exception:
-                continue
-    raise ValueError(f"Não consegui ler {path}")
-
 def inspect_and_save(key, filename):
-    path = RAW_DIR / filename
-    if not path.exists():
-        print(f" Arquivo não encontrado: {path}")
+    path = find_raw(RAW_DIR / filename)
+    if path is None:
+        print(f" Arquivo não encontrado: {RAW_DIR / filename}")
         return None
 
-    df = try_read_csv(path)
-    df.columns = [clean_colname(c) for c in df.columns]
+    encoding, sep = sniff_csv(path)
+    # Cabeçalho conferido com o registro de esquemas antes de ler os dados;
+    # só as colunas usadas por alguma etapa são lidas, já com o tipo declarado
+    # (números fora do tipo viram nulo e são contados, sem interromper a leitura)
+    names = {clean_colname(c): c for c in read_header(path, encoding, sep)}
+    check_header(key, list(names))
+    usecols = [names[c] for c in read_columns(key)]
+    dtype = {names[c]: t for c, t in read_dtypes(key).items()}
+    profiler = TableProfiler(key)
+    preview = None
+    mem_before = mem_after = 0.0
+    invalid = {}
 
-    print(f"\n📂 {filename}")
-    print("Dimensões:", df.shape)
-    print("Nulos:\n", df.isnull().sum())
-    print("Tipos:\n", df.dtypes)
-    print("Preview:\n", df.head())
+    # Uma única leitura do arquivo, em blocos, direto para data/interim;
+    # o perfil (nulos, tipos, distintos, duplicatas...) é montado na mesma passada
+    with step(f"ingestao/{key}") as span, TableWriter(INTERIM_DIR, f"{key}_interim") as writer:
+        for chunk in iter_csv_chunks(path, CHUNK_ROWS, encoding, sep, usecols=usecols, dtype=dtype):
+            chunk.columns = [clean_colname(c) for c in chunk.columns]
+            merge_invalid(invalid, coerce_numbers(key, chunk))
+            mem_before += memory_mb(chunk)
+            chunk = compact_frame(chunk, key)
+            mem_after += memory_mb(chunk)
+            writer.write(chunk)
+            profiler.update(chunk)
+            if preview is None:
+                preview = chunk.head()
+        span.rows_in = span.rows_out = writer.rows
 
-    out_path = INTERIM_DIR / f"{key}_interim.csv"
-    df.to_csv(out_path, index=False, encoding="utf-8")
-    print(f"✅ Salvou: {out_path}")
-    return df
+    report = profiler.report()
+    report["invalidos"] = invalid
+    print(f"\n📂 {path.name}  (encoding={encoding}, sep='{sep}')")
+    print("Dimensões:", (report["registros"], len(report["colunas"])))
+    print(f"Memória: {mem_before:.2f} MB → {mem_after:.2f} MB (tipos compactos)")
+    print_profile(report)
+    print_invalid(key, invalid)
+    print("Preview:\n", preview)
+    print(f"✅ Salvou: {writer.path}  (perfil: {save_profile(report, REPORTS_DIR)})")
+    return writer.path
 
 # ---------------------------
 # Main
 # ---------------------------
-expected_files = {
-    "agencias": "agencias.csv",
-    "clientes": "clientes.csv",
-    "colab_agencia": "colaborador_agencia.csv",
-    "colaboradores": "colaboradores.csv",
-    "contas": "contas.csv",
-    "propostas": "propostas_credito.csv",
-    "transacoes": "transacoes.csv"
-}
+expected_files = raw_files()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão e inspeção dos extratos brutos")
+    parser.add_argument("--workers", type=int, default=DEFAULT_IO_WORKERS,
+                        help=f"tabelas lidas/gravadas ao mesmo tempo (padrão: {IO_WORKERS_ENV} ou 4)")
+    args = parser.parse_args(argv)
 
-def main():
-    for key, filename in expected_files.items():
-        inspect_and_save(key, filename)
+    # As tabelas são independentes: leitura, perfil e gravação de cada uma em
+    # uma thread; a saída de cada tabela aparece inteira, na ordem de expected_files
+    _, errors = map_tables(lambda key: inspect_and_save(key, expected_files[key]), expected_files,
+                           args.workers, initializer=inherit_steps, initargs=(current_steps(),))
+    if errors:
+        print(f"\n❌ Ingestão com falha em: {', '.join(errors)}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -6,223 +6,573 @@
 #  - Criar colunas derivadas (sazonalidade, fim de semana etc.)
 #  - Validar consistência e qualidade dos dados
 #  - Salvar versões limpas em data/processed/
+#    (transações e propostas particionadas por mês)
+#  - Detectar anomalias e drift nas transações novas (anomalies.py)
+#
+# Uso:
+#  python scripts/02_clean_transform.py                # reprocessa todo o histórico
+#  python scripts/02_clean_transform.py --incremental  # só linhas novas/atrasadas
+#  python scripts/02_clean_transform.py --streaming --memoria-mb 512
+#  python scripts/02_clean_transform.py --workers 8     # tabelas em paralelo
+#
+# Carga, datas, numéricos, derivadas, perfis e gravação rodam tabela a tabela
+# em até --workers threads (as tabelas só se cruzam no calendário e no
+# checklist). A saída de console de cada tabela sai inteira e na ordem fixa;
+# uma tabela com falha é informada e fica fora das etapas seguintes, sem
+# interromper as demais (código de saída 1 no fim).
+#
+# No modo streaming, transacoes não é carregada inteira: é lida em blocos
+# dimensionados pelo orçamento de memória e cada bloco passa por datas,
+# numéricos, colunas derivadas, perfil de qualidade e gravação (ver
+# stream_fact). Só as demais tabelas (pequenas) ficam em memória.
+#
+# As etapas também são usadas tabela a tabela pelo DAG (run_pipeline.py):
+# clean_table(), check_table() e detect_anomalies().
 # ============================================================
 
-from pathlib import Path
+import argparse
+import shutil
+import threading
 import pandas as pd
 import numpy as np
 
+from anomalies import AnomalyDetector, DATE_COL as ANOMALY_DATE_COL, ROW_COLS as ANOMALY_COLS
+from calendar_dim import build_date_dim, attach_date_dim
+from compaction import compact_frame, compact_tables, memory_mb
+from constraints import ConstraintValidator, FOREIGN_KEYS, PRIMARY_KEYS, print_results
+from dag import DEFAULT_IO_WORKERS, IO_WORKERS_ENV, map_tables
+from date_parsing import parse_timestamps, merge_reports
+from instrumentation import current_steps, inherit_steps, step
+from incremental import (
+    INCREMENTAL_TABLES, load_state, save_state, get_watermark, set_watermark,
+    add_pending_months, months_to_check, split_increment,
+)
+from paths import INTERIM_DIR, PROCESSED_DIR, STATE_DIR, REPORTS_DIR, QUARANTINE_DIR
+from profiling import TableProfiler, profile_frame, print_profile, save_profile
+from schema import coerce_numbers, date_columns, date_formats, float_columns, print_invalid
+from storage import (
+    load_partitions, load_table, save_table, list_partitions, month_partition_keys, partition_manifest,
+    read_partitioned, write_partitions,
+)
+from streaming import ChunkStream, DEFAULT_BUDGET_MB, BUDGET_ENV
+
 
 # ------------------------------
 # Configurações
 # ------------------------------
-DATA_INTERIM = Path("data/interim")
-DATA_PROCESSED = Path("data/processed")
+DATA_INTERIM = INTERIM_DIR
+DATA_PROCESSED = PROCESSED_DIR
 DATA_PROCESSED.mkdir(parents=True, exist_ok=True)
-
-# ------------------------------
-# Funções auxiliares
-# ------------------------------
-def load_csv(path):
-    """Carrega CSV com tratamento básico de encoding e separador"""
-    return pd.read_csv(path, encoding="utf-8", sep=",")
-
-def print_quality_report(df, name):
-    """Exibe relatório de qualidade do DataFrame"""
-    print(f"\n{'='*80}")
-    print(f"📊 INSPEÇÃO DO DATAFRAME: {name}")
-    print(f"{'='*80}")
-    print("\n👉 Head:")
-    print(df.head())
-
-    print("\n👉 Info:")
-    print(df.info())
-
-    print("\n👉 Valores nulos por coluna:")
-    print(df.isna().sum())
-
-    print("\n👉 Duplicatas:", df.duplicated().sum())
-
-    print("\n👉 Estatísticas descritivas:")
-    print(df.describe(include="all").transpose())
-
-# Função para calcular estação do ano
-def get_season(date):
-    if pd.isnull(date):
-        return np.nan
-    m = date.month
-    d = date.day
-    if (m == 12 and d >= 21) or (1 <= m <= 2) or (m == 3 and d < 21):
-        return "Verão"
-    elif (m == 3 and d >= 21) or (4 <= m <= 5) or (m == 6 and d < 21):
-        return "Outono"
-    elif (m == 6 and d >= 21) or (7 <= m <= 8) or (m == 9 and d < 23):
-        return "Inverno"
-    else:
-        return "Primavera"
-
-# ------------------------------
-# Carregar bases
-# ------------------------------
-print("\n🚀 Carregando bases intermediárias...")
-
-agencias = load_csv(DATA_INTERIM / "agencias_interim.csv")
-clientes = load_csv(DATA_INTERIM / "clientes_interim.csv")
-colab_agencia = load_csv(DATA_INTERIM / "colab_agencia_interim.csv")
-colaboradores = load_csv(DATA_INTERIM / "colaboradores_interim.csv")
-contas = load_csv(DATA_INTERIM / "contas_interim.csv")
-propostas = load_csv(DATA_INTERIM / "propostas_interim.csv")
-transacoes = load_csv(DATA_INTERIM / "transacoes_interim.csv")
-
-# ------------------------------
-# Tratamento de datas
-# ------------------------------
-print("\n🛠️ Convertendo colunas de datas de forma robusta...")
-
-# Dicionário de colunas que devem ser convertidas para datetime
-date_cols = {
-    "agencias": ["data_abertura"],
-    "clientes": ["data_inclusao", "data_nascimento"],
-    "contas": ["data_abertura", "data_ultimo_lancamento"],
-    "propostas": ["data_entrada_proposta"],
-    "transacoes": ["data_transacao"]
+DATA_STATE = STATE_DIR
+DATA_REPORTS = REPORTS_DIR
+DATA_QUARANTINE = QUARANTINE_DIR
+
+TABLES = ["agencias", "clientes", "colab_agencia", "colaboradores", "contas", "propostas", "transacoes"]
+
+# Colunas convertidas para datetime e colunas float64, do registro de esquemas
+DATE_COLS = {name: date_columns(name) for name in TABLES if date_columns(name)}
+NUMERIC_COLS = {name: float_columns(name) for name in TABLES if float_columns(name)}
+
+# Atributos de calendário levados para as tabelas fato
+DATE_DIM_COLS = ["date_key", "day_name", "is_weekend", "is_month_even", "is_holiday",
+                 "is_business_day", "season"]
+
+# Tabelas com relatório de qualidade (título exibido no console)
+PROFILE_TITLES = {
+    "transacoes": "TRANSACOES (após transformações)",
+    "propostas": "PROPOSTAS (após transformações)",
+    "contas": "CONTAS",
+    "clientes": "CLIENTES",
+    "agencias": "AGENCIAS",
 }
+CHECKLIST_TABLES = ["agencias", "clientes", "contas", "propostas", "transacoes"]
+PARENT_TABLES = ["agencias", "clientes", "colaboradores", "contas"]
 
-# Loop geral para todas as tabelas
-for df_name, cols in date_cols.items():
-    df = locals()[df_name]  # pega o dataframe pelo nome
-    for col in cols:
-        # 1) Converter para string e limpar UTC + microsegundos
-        df[col] = (
-            df[col]
-            .astype(str)
-            .str.replace(r'(\.\d+)?\s?UTC$', '', regex=True)
-        )
-        # 2) Converter para datetime sem timezone
-        df[col] = pd.to_datetime(df[col], errors="coerce")
-
-        # Exibir quantidade de nulos
-        print(f"{df_name}.{col} → Nulos: {df[col].isna().sum()}")
-
-        # Se houver nulos, mostrar exemplos
-        if df[col].isna().sum() > 0:
-            print(f"   Exemplos inválidos em {df_name}.{col}:")
-            print(df.loc[df[col].isna(), col].head(5))
-
+# Tarefas do DAG rodam em threads e compartilham o arquivo de estado
+_state_lock = threading.Lock()
 
 # ------------------------------
-# Tratamento de numéricos
-# ------------------------------
-print("\n🛠️ Convertendo colunas numéricas...")
-
-numeric_cols = {
-    "contas": ["saldo_total", "saldo_disponivel"],
-    "propostas": ["taxa_juros_mensal", "valor_proposta", "valor_financiamento",
-                  "valor_entrada", "valor_prestacao"],
-    "transacoes": ["valor_transacao"]
-}
-
-for df_name, cols in numeric_cols.items():
-    df = locals()[df_name]
-    for col in cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
-# ------------------------------
-# Criar colunas derivadas em transações
+# Funções auxiliares
 # ------------------------------
-print("\n✨ Criando colunas derivadas em transações...")
+def select_increment(df, df_name, state, incremental=False):
+    """
+    Modo incremental: mantém apenas as linhas novas (data > marca d'água) e as
+    dos meses com linhas atrasadas. No modo completo devolve a tabela inteira.
+    Retorna (df, plano de gravação).
+    """
+    cfg = INCREMENTAL_TABLES[df_name]
+    date_col, key_col = cfg["date_col"], cfg["key_col"]
+    plan = {"full": True, "rewrite": set(), "latest": df[date_col].max()}
+
+    watermark = get_watermark(state, df_name)
+    if not incremental or watermark is None or not list_partitions(DATA_PROCESSED, df_name):
+        print(f"🔁 {df_name}: processamento completo ({len(df)} linhas)")
+        return df, plan
+
+    # Chaves já processadas: só as dos meses que o manifesto não resolve
+    known_keys, to_read = months_to_check(df, date_col, key_col, watermark,
+                                          partition_manifest(DATA_PROCESSED, df_name))
+    if to_read:
+        stored = load_partitions(DATA_PROCESSED, df_name, to_read, columns=[key_col])[key_col]
+        known_keys = pd.concat([known_keys, stored])
+    increment, append, rewrite = split_increment(df, date_col, key_col, watermark, known_keys)
+    print(f"⏩ {df_name}: {len(increment)} de {len(df)} linhas a processar "
+          f"(marca d'água {watermark}; {len(append)} mês(es) com linhas novas, "
+          f"{len(rewrite)} mês(es) reprocessado(s) por atrasos)")
+    plan.update(full=False, rewrite=rewrite)
+    return increment, plan
+
+def for_each_table(func, names, workers=1, failures=None) -> dict:
+    """
+    func(nome) para cada tabela, em até `workers` threads, com a saída de
+    console na ordem de `names`. Tabelas com falha ficam fora do resultado e
+    entram em failures (nome → traceback); sem failures, roda em sequência e
+    a primeira falha interrompe a execução (tarefas do DAG).
+    """
+    if failures is None:
+        return {name: func(name) for name in names}
+    results, errors = map_tables(func, names, workers, initializer=inherit_steps, initargs=(current_steps(),))
+    failures.update(errors)
+    return results
+
+def load_interim_table(name) -> pd.DataFrame:
+    with step(name) as span:
+        df = load_table(DATA_INTERIM, f"{name}_interim")
+        span.rows_out = len(df)
+    return df
+
+def load_interim(names, workers=1, failures=None) -> dict:
+    """Carrega as bases intermediárias (em paralelo) já com os tipos compactos"""
+    with step("carga"):
+        return compact_tables(for_each_table(load_interim_table, names, workers, failures))
+
+def parse_dates(df_name, df, columns=None):
+    """Converte as colunas de datas da tabela (ou só as de `columns`)"""
+    for col in DATE_COLS.get(df_name, []) if columns is None else columns:
+        # Formatos conhecidos com conversão explícita, um valor distinto por vez
+        with step(f"{df_name}.{col}", rows_in=len(df)) as span:
+            df[col], report = parse_timestamps(df[col], date_formats(df_name, col))
+            span.rows_out = len(df) - report["nulos"]
+        print_date_report(df_name, col, report)
+    return df
+
+def print_date_report(df_name, col, report):
+    formatos = ", ".join(f"{k}={v}" for k, v in report["formatos"].items())
+    print(f"{df_name}.{col} → Nulos: {report['nulos']}  (formatos: {formatos})")
+
+    # Valores preenchidos que não puderam ser convertidos
+    if report["invalidos"] > 0:
+        print(f"   {report['invalidos']} inválidos em {df_name}.{col}. Exemplos:")
+        print("  ", report["exemplos_invalidos"])
+
+def coerce_numeric(df_name, df):
+    # O 01 já converte com os tipos do esquema; aqui só a base intermediária
+    # relida de CSV pode divergir. Texto não numérico vira nulo e é reportado.
+    print_invalid(df_name, coerce_numbers(df_name, df))
+    return df
+
+def build_calendar(dates) -> pd.DataFrame:
+    """Dimensão de datas cobrindo todas as séries de datas recebidas"""
+    with step("calendario"):
+        dates = pd.concat(dates)
+        date_dim = build_date_dim(dates.min(), dates.max())
+        print(f"   {len(date_dim)} dias, {int(date_dim['is_holiday'].sum())} feriados")
+        return compact_frame(date_dim, "dim_calendario")
+
+def derive_columns(df_name, df, date_dim):
+    """Atributos de calendário (e ticket médio em propostas) nas tabelas fato"""
+    print(f"\n✨ Criando colunas derivadas em {df_name}...")
+    with step(f"derivadas/{df_name}", rows_in=len(df)) as span:
+        df = add_derived(df_name, df, date_dim)
+        span.rows_out = len(df)
+    return df
+
+def add_derived(df_name, df, date_dim):
+    date_col = INCREMENTAL_TABLES[df_name]["date_col"]
+    df = attach_date_dim(df, date_col, date_dim, DATE_DIM_COLS)
+    if df_name == "propostas":
+        df["year_month"] = df["data_entrada_proposta"].dt.to_period("M")
+        df["ticket_medio"] = df["valor_proposta"] / df["quantidade_parcelas"].replace(0, np.nan)
+    # Colunas derivadas também seguem a política de tipos compactos
+    return compact_frame(df, df_name)
+
+def profile_table(name, df) -> dict:
+    # Uma passada por tabela; os perfis também alimentam o checklist de consistência
+    with step(f"qualidade/{name}", rows_in=len(df)):
+        profile = profile_frame(df, name)
+    print_profile(profile, PROFILE_TITLES[name])
+    save_profile(profile, DATA_REPORTS)
+    return profile
+
+def save_dimension(name, df):
+    with step(f"gravacao/{name}", rows_in=len(df)) as span:
+        save_table(df, DATA_PROCESSED, name)
+        span.rows_out = len(df)
+
+def save_fact(df_name, df, plan, state) -> dict:
+    """Grava a tabela fato particionada por mês (year_month=AAAA-MM) e atualiza o estado"""
+    with step(f"gravacao/{df_name}", rows_in=len(df)) as span:
+        date_col = INCREMENTAL_TABLES[df_name]["date_col"]
+        written = write_partitions(df, DATA_PROCESSED, df_name, month_partition_keys(df[date_col]),
+                                   replace=plan["rewrite"], overwrite=plan["full"], date_col=date_col)
+        span.rows_out = sum(written.values())
+    print(f"   {df_name}: {sum(written.values())} linhas em {len(written)} partição(ões)")
+    record_written(df_name, written, plan, state)
+    return written
+
+def record_written(df_name, written, plan, state):
+    """Marca d'água e meses pendentes (para o 03) após gravar uma tabela fato"""
+    if plan["full"]:
+        state["watermarks"].pop(df_name, None)
+        state["pending_months"][df_name] = []
+    set_watermark(state, df_name, plan["latest"])
+    add_pending_months(state, df_name, written)
+
+def stream_fact(df_name, stream, detector=None) -> dict:
+    """
+    Modo streaming (sempre completo) de uma tabela fato: cada bloco da base
+    intermediária passa por datas, numéricos, colunas derivadas, perfil de
+    qualidade (e pelo detector de anomalias, se houver) e é gravado nas
+    partições mensais. Ficam em memória só o bloco atual, o perfil acumulado
+    e os contadores.
+    Retorna {"perfil", "gravadas" (partição → linhas), "inicio", "fim"}.
+    """
+    date_col = INCREMENTAL_TABLES[df_name]["date_col"]
+    rows = stream.chunk_rows(DATA_INTERIM, f"{df_name}_interim")
+    print(f"\n🌊 {df_name} em streaming: blocos de {rows} linhas "
+          f"(orçamento {stream.budget_mb} MB, {stream.reserved_mb:.1f} MB já residentes)")
+
+    profiler = TableProfiler(df_name)
+    reports, written, bounds = {}, {}, []
+    with step(f"streaming/{df_name}") as span:
+        chunks = stream.chunks(DATA_INTERIM, f"{df_name}_interim")
+        for i, chunk in enumerate(chunks):
+            chunk = compact_frame(chunk, df_name)
+            for col in DATE_COLS[df_name]:
+                chunk[col], report = parse_timestamps(chunk[col], date_formats(df_name, col))
+                reports[col] = merge_reports(reports.get(col), report)
+            chunk = coerce_numeric(df_name, chunk)
+
+            # Os atributos de calendário não dependem do período da dimensão:
+            # basta uma dimensão cobrindo as datas do bloco
+            dates = chunk[date_col]
+            chunk = add_derived(df_name, chunk, build_date_dim(dates.min(), dates.max()))
+            bounds += [dates.min(), dates.max()]
+
+            profiler.update(chunk)
+            if detector is not None:
+                detector.update(chunk)
+            parts = write_partitions(chunk, DATA_PROCESSED, df_name, month_partition_keys(dates),
+                                     overwrite=i == 0, date_col=date_col)
+            for key, n in parts.items():
+                written[key] = written.get(key, 0) + n
+        span.rows_in = span.rows_out = profiler.rows
+
+    for col, report in reports.items():
+        print_date_report(df_name, col, report)
+    print(f"   {df_name}: {sum(written.values())} linhas em {len(written)} partição(ões)")
+
+    profile = profiler.report()
+    print_profile(profile, PROFILE_TITLES.get(df_name))
+    save_profile(profile, DATA_REPORTS)
+    bounds = pd.Series(bounds, dtype="datetime64[ns]")
+    return {"perfil": profile, "gravadas": written, "inicio": bounds.min(), "fim": bounds.max()}
+
+def print_checklist_nulls(profiles):
+    # Nulos a partir dos perfis, sem reler as tabelas
+    for name in CHECKLIST_TABLES:
+        if name not in profiles:
+            continue
+        report = profiles[name]
+        print(f"📂 {name}:")
+        print("   - Registros:", report["registros"])
+        print("   - Nulos por coluna:")
+        print(pd.Series({c: r["nulos"] for c, r in report["colunas"].items()}), "\n")
+
+def print_checklist_dtypes(profiles):
+    print("\n📊 Tipos de dados por tabela:\n")
+    for name in CHECKLIST_TABLES:
+        if name not in profiles:
+            continue
+        print(f"{name}:")
+        print(pd.Series({c: r["dtype"] for c, r in profiles[name]["colunas"].items()}), "\n")
 
-transacoes["day_name"] = transacoes["data_transacao"].dt.day_name(locale="pt_BR")
-transacoes["is_weekend"] = transacoes["data_transacao"].dt.weekday >= 5
-transacoes["is_month_even"] = transacoes["data_transacao"].dt.month % 2 == 0
-transacoes["season"] = transacoes["data_transacao"].apply(get_season)
 
 # ------------------------------
-# Criar colunas derivadas em propostas
+# Tarefas por tabela (DAG)
 # ------------------------------
-print("\n✨ Criando colunas derivadas em propostas...")
-
-propostas["year_month"] = propostas["data_entrada_proposta"].dt.to_period("M")
-propostas["ticket_medio"] = propostas["valor_proposta"] / propostas["quantidade_parcelas"].replace(0, np.nan)
+def clean_table(name) -> dict:
+    """
+    Limpa e grava uma única tabela (modo completo), independente das demais.
+    Tabelas fato usam uma dimensão de datas do próprio período: os atributos
+    levados para a fato não dependem do intervalo da dimensão.
+    Retorna um resumo pequeno (linhas e período das datas) para as tarefas seguintes.
+    """
+    df = load_interim([name])[name]
+    df = coerce_numeric(name, parse_dates(name, df))
+    result = {"linhas": len(df)}
+
+    if name in INCREMENTAL_TABLES:
+        date_col = INCREMENTAL_TABLES[name]["date_col"]
+        df = derive_columns(name, df, build_calendar([df[date_col]]))
+        result.update(inicio=str(df[date_col].min()), fim=str(df[date_col].max()))
+        if name in PROFILE_TITLES:
+            profile_table(name, df)
+        plan = {"full": True, "rewrite": set(), "latest": df[date_col].max()}
+        save_fact(name, df, plan, {"watermarks": {}, "pending_months": {}})
+        with _state_lock:
+            state = load_state(DATA_STATE)
+            state["watermarks"].pop(name, None)
+            set_watermark(state, name, plan["latest"])
+            # Os exports do DAG são sempre recalculados por inteiro: nada fica pendente
+            state["pending_months"][name] = []
+            save_state(DATA_STATE, state)
+    else:
+        if name in PROFILE_TITLES:
+            profile_table(name, df)
+        save_dimension(name, df)
+    return result
+
+def build_calendar_table(ranges) -> dict:
+    """Grava dim_calendario cobrindo os períodos (inicio, fim) das tabelas fato"""
+    dates = [pd.to_datetime(pd.Series([r["inicio"], r["fim"]]), errors="coerce") for r in ranges]
+    date_dim = build_calendar(dates)
+    save_dimension("dim_calendario", date_dim)
+    return {"linhas": len(date_dim)}
+
+def detect_anomalies() -> dict:
+    """Anomalias e drift das transações processadas depois da marca d'água do detector"""
+    detector = AnomalyDetector(load_table(DATA_PROCESSED, "contas", columns=["num_conta", "cod_agencia"]))
+    # Só as partições a partir da marca d'água são lidas
+    trans = read_partitioned(DATA_PROCESSED, "transacoes", start=detector.watermark, columns=ANOMALY_COLS,
+                             parse_dates=[ANOMALY_DATE_COL])
+    with step("anomalias", rows_in=len(trans)):
+        detector.update(trans)
+        return detector.finish(DATA_REPORTS)
+
+def check_table(name, quarantine=False) -> dict:
+    """Valida PK e FKs de uma tabela já processada contra as tabelas pai processadas"""
+    fks = [fk for fk in FOREIGN_KEYS if fk[0] == name]
+    validator = ConstraintValidator(quarantine_dir=DATA_QUARANTINE if quarantine else None)
+    for parent in sorted({fk[2] for fk in fks}):
+        validator.add_parent(parent, load_table(DATA_PROCESSED, parent, columns=PRIMARY_KEYS[parent]))
+
+    # Sem quarentena só as colunas de chave são lidas
+    columns = None if quarantine else list(dict.fromkeys(PRIMARY_KEYS[name] + [fk[1] for fk in fks]))
+    with step(f"restricoes/{name}") as span:
+        df = load_table(DATA_PROCESSED, name, columns=columns)
+        span.rows_in = len(df)
+        results = validator.validate(name, df)
+    print_results(results)
+    return {"violacoes": sum(r["violacoes"] for r in results)}
 
-# ------------------------------
-# Relatórios de qualidade
-# ------------------------------
-print_quality_report(transacoes, "TRANSACOES (após transformações)")
-print_quality_report(propostas, "PROPOSTAS (após transformações)")
-print_quality_report(contas, "CONTAS")
-print_quality_report(clientes, "CLIENTES")
 
 # ------------------------------
-# Salvar versões processadas
+# Execução completa
 # ------------------------------
-print("\n💾 Salvando versões processadas em data/processed/...")
-
-agencias.to_csv(DATA_PROCESSED / "agencias.csv", index=False)
-clientes.to_csv(DATA_PROCESSED / "clientes.csv", index=False)
-colab_agencia.to_csv(DATA_PROCESSED / "colab_agencia.csv", index=False)
-colaboradores.to_csv(DATA_PROCESSED / "colaboradores.csv", index=False)
-contas.to_csv(DATA_PROCESSED / "contas.csv", index=False)
-propostas.to_csv(DATA_PROCESSED / "propostas.csv", index=False)
-transacoes.to_csv(DATA_PROCESSED / "transacoes.csv", index=False)
-
-print("\n✅ Processamento concluído com sucesso!")
-
-
-print("\n🔎 Rodando checklist de consistência...\n")
-
-tables = {
-    "agencias": agencias,
-    "clientes": clientes,
-    "contas": contas,
-    "propostas": propostas,
-    "transacoes": transacoes,
-}
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Limpeza e transformação das bases intermediárias")
+    parser.add_argument("--incremental", action="store_true",
+                        help="processa apenas transações/propostas novas desde a última execução")
+    parser.add_argument("--quarantine", action="store_true",
+                        help="grava as linhas que violam chaves em data/quarantine/")
+    parser.add_argument("--streaming", action="store_true",
+                        help="processa transacoes em blocos, sem carregá-la inteira (sempre completo)")
+    parser.add_argument("--memoria-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help=f"orçamento de memória do modo streaming (padrão: {BUDGET_ENV} ou 1024)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_IO_WORKERS,
+                        help=f"tabelas carregadas/tratadas/gravadas ao mesmo tempo (padrão: {IO_WORKERS_ENV} ou 4)")
+    args = parser.parse_args(argv)
+    if args.streaming and args.incremental:
+        parser.error("--streaming reprocessa todo o histórico; não combina com --incremental")
+
+    # Tabela processada em blocos no modo streaming (fora do dicionário de tabelas)
+    streamed = "transacoes" if args.streaming else None
+    facts = [name for name in ["transacoes", "propostas"] if name != streamed]
+
+    # ------------------------------
+    # Carregar bases
+    # ------------------------------
+    # Cada etapa roda tabela a tabela em até --workers threads. Uma tabela com
+    # falha é informada e sai das etapas seguintes; as demais continuam.
+    failures = {}
+
+    def drop_failed(tables):
+        return {name: df for name, df in tables.items() if name not in failures}
+
+    print("\n🚀 Carregando bases intermediárias...")
+    tables = load_interim([name for name in TABLES if name != streamed], args.workers, failures)
+
+    # ------------------------------
+    # Tratamento de datas
+    # ------------------------------
+    # No modo incremental as tabelas fato convertem aqui só a coluna que define
+    # o incremento; as demais datas são convertidas depois, só no incremento.
+    def date_columns_now(name):
+        if args.incremental and name in facts:
+            return [INCREMENTAL_TABLES[name]["date_col"]]
+        return None
+
+    print("\n🛠️ Convertendo colunas de datas de forma robusta...")
+    with step("datas"):
+        tables.update(for_each_table(lambda name: parse_dates(name, tables[name], date_columns_now(name)),
+                                     [name for name in DATE_COLS if name in tables], args.workers, failures))
+        tables = drop_failed(tables)
+
+    # Detector de anomalias das transações (precisa de contas para chegar à agência)
+    detector = AnomalyDetector(tables["contas"]) if "contas" in tables else None
+
+    if streamed:
+        stream = ChunkStream(args.memoria_mb, reserved_mb=sum(memory_mb(df) for df in tables.values()))
+        streamed_result = for_each_table(lambda name: stream_fact(name, stream, detector), [streamed], 1, failures)
+        streamed_result = streamed_result.get(streamed)
+        streamed = streamed if streamed_result is not None else None
+    facts = [name for name in facts if name in tables]
+
+    # ------------------------------
+    # Dimensão de datas (calendário) para todo o período de transações e propostas
+    # ------------------------------
+    print("\n📅 Gerando dimensão de datas...")
+    date_series = [tables[name][INCREMENTAL_TABLES[name]["date_col"]] for name in facts]
+    if streamed:
+        date_series.append(pd.Series([streamed_result["inicio"], streamed_result["fim"]]))
+    date_dim = build_calendar(date_series) if date_series else None
+
+    # ------------------------------
+    # Seleção incremental (transações e propostas)
+    # ------------------------------
+    plans = {}
+    with step("selecao_incremental"):
+        state = load_state(DATA_STATE)
+        for name in facts:
+            with step(name, rows_in=len(tables[name])) as span:
+                tables[name], plans[name] = select_increment(tables[name], name, state, args.incremental)
+                span.rows_out = len(tables[name])
+
+    if args.incremental:
+        with step("datas_incremento"):
+            pending = {name: [col for col in DATE_COLS.get(name, []) if col not in date_columns_now(name)]
+                       for name in facts}
+            tables.update(for_each_table(lambda name: parse_dates(name, tables[name], pending[name]),
+                                         [name for name in facts if pending[name]], args.workers, failures))
+            tables = drop_failed(tables)
+        facts = [name for name in facts if name in tables]
+
+    # ------------------------------
+    # Tratamento de numéricos
+    # ------------------------------
+    print("\n🛠️ Convertendo colunas numéricas...")
+    with step("numericos"):
+        tables.update(for_each_table(lambda name: coerce_numeric(name, tables[name]),
+                                     [name for name in NUMERIC_COLS if name in tables], args.workers, failures))
+        tables = drop_failed(tables)
+    facts = [name for name in facts if name in tables]
+
+    # ------------------------------
+    # Colunas derivadas em transações e propostas
+    # ------------------------------
+    tables.update(for_each_table(lambda name: derive_columns(name, tables[name], date_dim),
+                                 facts, args.workers, failures))
+    tables = drop_failed(tables)
+
+    # ------------------------------
+    # Relatórios de qualidade
+    # ------------------------------
+    profiles = for_each_table(lambda name: profile_table(name, tables[name]),
+                              [name for name in PROFILE_TITLES if name in tables], args.workers, failures)
+    tables = drop_failed(tables)
+    if streamed:
+        profiles[streamed] = streamed_result["perfil"]
+
+    # ------------------------------
+    # Salvar versões processadas
+    # ------------------------------
+    print("\n💾 Salvando versões processadas em data/processed/...")
+
+    def save(name):
+        if name == "dim_calendario":
+            save_dimension(name, date_dim)
+        elif name in plans:
+            save_fact(name, tables[name], plans[name], state)
+        else:
+            save_dimension(name, tables[name])
+
+    saved = [name for name in ["agencias", "clientes", "colab_agencia", "colaboradores", "contas"] if name in tables]
+    saved += ["dim_calendario"] if date_dim is not None else []
+    saved += [name for name in ["propostas", "transacoes"] if name in tables]
+    for_each_table(save, saved, args.workers, failures)
+    tables = drop_failed(tables)
+    if streamed:
+        # Partições já gravadas bloco a bloco: só o estado incremental é atualizado
+        plan = {"full": True, "rewrite": set(), "latest": streamed_result["fim"]}
+        record_written(streamed, streamed_result["gravadas"], plan, state)
+    save_state(DATA_STATE, state)
+
+    # ------------------------------
+    # Anomalias e drift nas transações novas (depois de gravadas: um lote só
+    # entra no histórico do detector se o 02 o gravou)
+    # ------------------------------
+    print("\n🚨 Detectando anomalias e drift nas transações novas...")
+    if detector is None or ("transacoes" not in tables and not streamed):
+        print("⏭️ Detecção de anomalias pulada (transacoes ou contas com falha)")
+    else:
+        def detect(name):
+            with step("anomalias") as span:
+                if name in tables:
+                    detector.update(tables[name])
+                span.rows_in = detector.rows
+                return detector.finish(DATA_REPORTS)
 
-# 1. Verificar nulos
-for name, df in tables.items():
-    print(f"📂 {name}:")
-    print("   - Registros:", len(df))
-    print("   - Nulos por coluna:")
-    print(df.isna().sum(), "\n")
-
-# 2. Verificar unicidade de chaves primárias
-print("🔑 Checando chaves primárias...\n")
-if transacoes["cod_transacao"].is_unique:
-    print("✅ transacoes.cod_transacao é único")
-else:
-    print("⚠️ transacoes.cod_transacao tem duplicados")
-
-if contas["num_conta"].is_unique:
-    print("✅ contas.num_conta é único")
-else:
-    print("⚠️ contas.num_conta tem duplicados")
-
-if clientes["cod_cliente"].is_unique:
-    print("✅ clientes.cod_cliente é único")
-else:
-    print("⚠️ clientes.cod_cliente tem duplicados")
-
-# 3. Verificar integridade referencial
-print("\n🔗 Checando chaves estrangeiras...\n")
-# transacoes → contas
-missing_contas = transacoes[~transacoes["num_conta"].isin(contas["num_conta"])]
-print(f"🔍 Transações sem conta correspondente: {len(missing_contas)}")
-
-# contas → clientes
-missing_clientes = contas[~contas["cod_cliente"].isin(clientes["cod_cliente"])]
-print(f"🔍 Contas sem cliente correspondente: {len(missing_clientes)}")
-
-# propostas → clientes
-if "cod_cliente" in propostas.columns:
-    missing_clientes_prop = propostas[~propostas["cod_cliente"].isin(clientes["cod_cliente"])]
-    print(f"🔍 Propostas sem cliente correspondente: {len(missing_clientes_prop)}")
-
-# 4. Tipos de dados principais
-print("\n📊 Tipos de dados por tabela:\n")
-for name, df in tables.items():
-    print(f"{name}:")
-    print(df.dtypes, "\n")
-
-print("\n✅ Checklist concluído!")
+        for_each_table(detect, ["transacoes"], 1, failures)
 
+    if failures:
+        print(f"\n⚠️ Processamento concluído com falha em: {', '.join(failures)}")
+    else:
+        print("\n✅ Processamento concluído com sucesso!")
+
+    print("\n🔎 Rodando checklist de consistência...\n")
+
+    # 1. Verificar nulos
+    print_checklist_nulls(profiles)
+
+    # 2 e 3. Chaves primárias e integridade referencial das sete tabelas
+    # (índice de chaves de cada tabela pai montado uma vez; filhas validadas em blocos)
+    print("🔑 Checando chaves primárias e estrangeiras...\n")
+    if args.quarantine:
+        shutil.rmtree(DATA_QUARANTINE, ignore_errors=True)
+    validator = ConstraintValidator(quarantine_dir=DATA_QUARANTINE if args.quarantine else None)
+    for name in PARENT_TABLES:
+        if name in tables:
+            validator.add_parent(name, tables[name])
+
+    for name in ["agencias", "clientes", "colaboradores", "colab_agencia", "contas", "propostas", "transacoes"]:
+        if name in failures:
+            print(f"⏭️ {name}: restrições não verificadas (tabela com falha)\n")
+            continue
+        if name == streamed:
+            # Relida em blocos da base processada (só as colunas de chave, salvo com quarentena);
+            # a função permite reler a tabela para buscar as linhas com PK repetida
+            fks = [fk[1] for fk in FOREIGN_KEYS if fk[0] == name]
+            columns = None if args.quarantine else list(dict.fromkeys(PRIMARY_KEYS[name] + fks))
+            with step(f"restricoes/{name}") as span:
+                results = validator.validate(name, lambda: stream.chunks(DATA_PROCESSED, name, columns=columns))
+                span.rows_in = streamed_result["perfil"]["registros"]
+        else:
+            with step(f"restricoes/{name}", rows_in=len(tables[name])):
+                results = validator.validate(name, tables[name])
+        print_results(results)
+    if args.quarantine:
+        print(f"\n🚧 Linhas violadas gravadas em {DATA_QUARANTINE}/")
+    print()
+
+    # 4. Tipos de dados principais
+    print_checklist_dtypes(profiles)
+
+    print("\n✅ Checklist concluído!")
+    if failures:
+        print(f"\n❌ Tabelas com falha: {', '.join(failures)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
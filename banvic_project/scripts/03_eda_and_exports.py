@@ -1,100 +1,713 @@
-from pathlib import Path
+# ============================================================
+# 03_eda_and_exports.py
+# Objetivo:
+#  - Gerar os exports de dashboards em data/final/
+#  - Os agregados são mantidos por mês em data/state/aggregates/: no modo
+#    incremental só os meses alterados pelo 02 são recalculados e mesclados
+#
+# Uso:
+#  python scripts/03_eda_and_exports.py                # recalcula tudo
+#  python scripts/03_eda_and_exports.py --incremental  # só meses pendentes
+#  python scripts/03_eda_and_exports.py --processos 8  # agregados por mês em 8 processos
+#  python scripts/03_eda_and_exports.py --streaming --memoria-mb 512
+#
+# Com --processos > 1 as transações e propostas não são carregadas inteiras:
+# cada processo lê um mês por vez (partições do 02), calcula os agregados
+# parciais e o processo principal junta os parciais na ordem dos meses
+# (resultado idêntico ao de um processo; ver sharded.py).
+# Com --streaming as tabelas fato são lidas em blocos dimensionados pelo
+# orçamento de memória e os parciais de cada bloco são somados aos
+# acumulados; só os acumulados e as dimensões ficam em memória.
+#
+# Cada export também roda isolado como tarefa do DAG (run_pipeline.py):
+# export_peak_load, export_monthly_proposals, export_cube_rankings,
+# export_colab_performance, export_credit_exposure e export_customer_360.
+# ============================================================
+
+from contextlib import nullcontext
+from functools import lru_cache, partial
+import argparse
+import numpy as np
 import pandas as pd
 
-HERE = Path(__file__).resolve().parent
-PROJECT_ROOT = HERE.parent
-PROC_DIR = PROJECT_ROOT / "data" / "processed"
-FINAL_DIR = PROJECT_ROOT / "data" / "final"
+from amortization import SYSTEMS, FLOW_MEASURES, contracted, portfolio_flow
+from compaction import compact_frame, compact_tables, memory_mb
+from cube import (
+    CUBE_NAME, MISSING_KEY, TransactionCube, build_cube, merge_cubes, compact_cube, canonical_cube,
+)
+from customer360 import (
+    CUSTOMER_AGGREGATES, TRANS_KEYS, TRANS_MEASURES, PROP_KEYS, PROP_MEASURES, transaction_partials,
+    proposal_partials, merge_client_partials, customer_facts, refresh_facts, customer_360, customer_segments,
+)
+from dimension_store import DimensionStore
+from joins import StarJoin
+from peak_load import (
+    LOAD_AGGREGATES, minute_counts, merge_minute_counts, monthly_load,
+    weekday_hour_heatmap, hourly_series, monthly_peaks, agency_percentiles,
+)
+from incremental import load_state, save_state, pop_pending_months
+from instrumentation import step
+from paths import PROCESSED_DIR as PROC_DIR, FINAL_DIR, STATE_DIR
+from schema import EXPORTS, columns as schema_columns, fact_tables
+from sharded import ShardPool
+from storage import (
+    load_table, save_table, export_table, find_table, concat_frames, read_partitioned, list_partitions,
+    month_partition_keys, NULL_PARTITION,
+)
+from streaming import ChunkStream, DEFAULT_BUDGET_MB, BUDGET_ENV
+
+AGG_DIR = STATE_DIR / "aggregates"
 FINAL_DIR.mkdir(parents=True, exist_ok=True)
 
+# Colunas lidas de cada tabela: as marcadas para a etapa "exports" no registro de esquemas
+TRANS_COLS = schema_columns("transacoes", EXPORTS)
+PROP_COLS = schema_columns("propostas", EXPORTS)
+AGGREGATES = ["monthly_proposals", CUBE_NAME, "colab_performance", *LOAD_AGGREGATES, "fluxo_credito",
+              *CUSTOMER_AGGREGATES]
+
+DIMENSION_COLS = {name: schema_columns(name, EXPORTS)
+                  for name in ["contas", "agencias", "colaboradores", "colab_agencia", "clientes"]}
+# Dimensões resolvidas nas transações pelo StarJoin
+JOIN_DIMENSIONS = ["contas", "agencias", "colaboradores"]
+# Propostas e carteira → colaborador, agência do colaborador (home_agency) e agência
+COLAB_DIMENSIONS = ["agencias", "colaboradores"]
+HOME_AGENCY = "agencia_colaborador"
+FACT_COLS = {
+    "transacoes": (TRANS_COLS, fact_tables()["transacoes"]),
+    "propostas": (PROP_COLS, fact_tables()["propostas"]),
+}
+AG_COLS = {"count": "total_transacoes", "sum": "valor_total"}
+PERF_KEYS = ["year_month", "cod_colaborador", "primeiro_nome", "ultimo_nome", "nome"]
+# Fluxo da carteira: year_month é o mês de entrada da proposta, mes o mês do fluxo
+FLOW_KEYS = ["sistema", "year_month", "mes", "cod_colaborador"]
+
+# Memória de trabalho de um bloco no modo streaming, em múltiplos do bloco lido:
+# chave de mês em texto + junções + groupby do cubo (medido: ~12x)
+FACT_COPIES = 12
+
+# Transações → dimensões: (dimensão, chave no fato, colunas trazidas)
+TRANS_JOINS = [
+    ("contas", "num_conta", ["cod_agencia", "cod_colaborador"]),
+    ("agencias", "cod_agencia", {"nome": "nome_agencia"}),
+    ("colaboradores", "cod_colaborador", ["primeiro_nome", "ultimo_nome"]),
+]
+
+# Partições (sequências de meses) por processo no modo --processos: poucas o
+# bastante para diluir o custo de cada tarefa, várias para balancear a carga
+SHARDS_PER_PROCESS = 4
+
 # ---------------------------
-# Carregar dados processados
+# Funções auxiliares
 # ---------------------------
-trans = pd.read_csv(PROC_DIR / "transacoes.csv", parse_dates=["data_transacao"])
-prop = pd.read_csv(PROC_DIR / "propostas.csv", parse_dates=["data_entrada_proposta"])
-contas = pd.read_csv(PROC_DIR / "contas.csv")
-agencias = pd.read_csv(PROC_DIR / "agencias.csv")
-colab = pd.read_csv(PROC_DIR / "colaboradores.csv")
-colab_ag = pd.read_csv(PROC_DIR / "colab_agencia.csv")
+def has_partials():
+    """Todos os agregados mensais já foram materializados por uma execução anterior?"""
+    for name in AGGREGATES:
+        try:
+            find_table(AGG_DIR, name)
+        except FileNotFoundError:
+            return False
+    return True
+
+def merge_partials(name, delta, months):
+    """
+    Substitui, no agregado mensal persistido, os meses recalculados.
+    months=None indica recálculo completo (o delta vira o agregado inteiro).
+    """
+    if months is not None:
+        stored = load_table(AGG_DIR, name)
+        stored = stored[~stored["year_month"].isin(months)]
+        delta = concat_frames([stored, delta])
+    save_table(delta, AGG_DIR, name)
+    return delta
+
+def merge_client_partials_store(name, delta, months):
+    """
+    merge_partials para parciais por cliente: devolve também os clientes cujas
+    linhas mudaram (as dos meses substituídos e as novas); None = recálculo completo.
+    """
+    if months is None:
+        return merge_partials(name, delta, None), None
+    stored = load_table(AGG_DIR, name)
+    replaced = stored["year_month"].isin(months).to_numpy()
+    touched = np.union1d(stored.loc[replaced, "cod_cliente"].to_numpy(dtype=np.int64),
+                         delta["cod_cliente"].to_numpy(dtype=np.int64))
+    merged = concat_frames([stored[~replaced], delta])
+    save_table(merged, AGG_DIR, name)
+    return merged, touched
+
+def load_fact(name, months=None) -> pd.DataFrame:
+    """Carrega a tabela fato (só as colunas usadas); months=None lê todas as partições"""
+    columns, date_col = FACT_COLS[name]
+    with step(name) as span:
+        df = read_partitioned(PROC_DIR, name, columns=columns, parse_dates=[date_col], partitions=months)
+        span.rows_out = len(df)
+    return df
+
+def load_dimensions(names) -> dict:
+    """Dimensões do repositório mapeado (regravado só quando data/processed/ muda)"""
+    with step("dimensoes") as span:
+        store = DimensionStore()
+        store.refresh(PROC_DIR, names)
+        dims = {name: store[name].frame(DIMENSION_COLS[name]) for name in names}
+        span.rows_out = sum(len(df) for df in dims.values())
+    return dims
+
+def prepare(tables) -> dict:
+    """Tipos compactos e chave de mês (year_month) nas tabelas fato"""
+    tables = compact_tables(tables)
+    for name, (_, date_col) in FACT_COLS.items():
+        if name in tables:
+            tables[name]["year_month"] = month_partition_keys(tables[name][date_col])
+    return tables
+
+def print_misses(misses):
+    # 🔗 Verificação de integridade
+    print(f"🔍 Transações sem conta correspondente: {misses['contas']}")
+    print(f"🔍 Transações sem agência correspondente: {misses['agencias']}")
+    print(f"🔍 Transações sem colaborador correspondente: {misses['colaboradores']}")
+
+def star_join(names=JOIN_DIMENSIONS) -> StarJoin:
+    # Índices persistidos no repositório de dimensões (já atualizado por load_dimensions):
+    # abrir é só mapear os arquivos, também em cada processo de trabalho
+    store = DimensionStore()
+    engine = StarJoin()
+    for name in names:
+        engine.add_index(name, store[name])
+    return engine
+
+def home_agency(colab_agencia) -> pd.DataFrame:
+    """
+    Uma agência por colaborador (a de menor código quando ele está em mais de
+    uma): chave única para o StarJoin, sem repetir propostas em cada agência.
+    """
+    return (colab_agencia.sort_values(["cod_colaborador", "cod_agencia"])
+                         .drop_duplicates("cod_colaborador", ignore_index=True))
+
+def colab_join() -> StarJoin:
+    """StarJoin das propostas: colaborador, agência do colaborador e agência (do repositório)"""
+    colab_agencia = DimensionStore()["colab_agencia"].frame()
+    return star_join(COLAB_DIMENSIONS).add_dimension(HOME_AGENCY, home_agency(colab_agencia), "cod_colaborador")
+
+def with_colab(prop, engine) -> pd.DataFrame:
+    prop = engine.lookup(prop, "cod_colaborador", "colaboradores", ["primeiro_nome", "ultimo_nome"])
+    prop = engine.lookup(prop, "cod_colaborador", HOME_AGENCY, ["cod_agencia"])
+    return engine.lookup(prop, "cod_agencia", "agencias", ["nome"])
+
 
 # ---------------------------
-# 1) transactions_with_date_dim
+# Agregados parciais por mês: sobre a tabela em memória, por partição no
+# ShardPool (--processos) ou bloco a bloco (--streaming)
 # ---------------------------
-transactions_with_date_dim = trans.copy()
-transactions_with_date_dim.to_csv(FINAL_DIR / "transactions_with_date_dim.csv", index=False)
+def monthly_partials(prop) -> pd.DataFrame:
+    return prop.groupby("year_month").agg(
+        qtd_propostas=("cod_proposta", "count"),
+        soma_valor=("valor_proposta", "sum"),
+        qtd_valor=("valor_proposta", "count")
+    ).reset_index()
+
+def performance_partials(prop, engine) -> pd.DataFrame:
+    return (
+        with_colab(prop, engine)
+            .groupby(PERF_KEYS)
+            .agg(
+                num_propostas=("cod_proposta", "count"),
+                valor_total_financiado=("valor_proposta", "sum")
+            )
+            .reset_index()
+    )
+
+def credit_flow(prop) -> pd.DataFrame:
+    """Fluxo projetado das propostas contratadas, nos dois sistemas de amortização"""
+    carteira = contracted(prop)
+    return concat_frames([portfolio_flow(carteira, system).assign(sistema=system)
+                          for system in SYSTEMS])[FLOW_KEYS + FLOW_MEASURES]
+
+def cube_chunk(trans, engine):
+    """Cubo parcial de um bloco de transações: (cubo, chaves sem correspondência, linhas)"""
+    misses = {}
+    for dim, fk, cols in TRANS_JOINS:
+        # Os nomes de agência/colaborador só entram depois, no cubo já agregado
+        trans = engine.lookup(trans, fk, dim, cols if dim == "contas" else [])
+        misses[dim] = engine.misses[dim]
+    return build_cube(trans), misses, len(trans)
+
+def fold_partials(parts, keys) -> pd.DataFrame:
+    """Soma parciais com as mesmas chaves (ordem final igual à de um groupby)"""
+    return pd.concat(parts, ignore_index=True).groupby(keys, observed=True).sum().reset_index()
+
+def prepare_chunk(name, df) -> pd.DataFrame:
+    df = compact_frame(df, name)
+    df["year_month"] = month_partition_keys(df[FACT_COLS[name][1]])
+    return df
+
+def stream_fact(stream, name, months=None):
+    """Blocos da tabela fato (só as colunas usadas), prontos para os agregados"""
+    columns, date_col = FACT_COLS[name]
+    for chunk in stream.chunks(PROC_DIR, name, columns, [date_col], months, copies=FACT_COPIES):
+        yield prepare_chunk(name, chunk)
+
+def run_shards(pool, shard, name, months=None) -> list:
+    """
+    Executa shard(meses) sobre blocos de meses consecutivos da tabela fato.
+    Os resultados voltam na ordem dos meses: concatenados, ficam na mesma
+    ordem de um groupby por year_month feito em um único processo.
+    """
+    months = sorted(list_partitions(PROC_DIR, name) if months is None else months)
+    n = min(len(months), pool.processes * SHARDS_PER_PROCESS)
+    # Sem meses, uma partição vazia ainda devolve um parcial com o esquema certo
+    shards = [chunk.tolist() for chunk in np.array_split(months, n)] if n else [[]]
+    return pool.map(shard, shards)
+
+def _load_shard(name, months) -> pd.DataFrame:
+    columns, date_col = FACT_COLS[name]
+    return prepare_chunk(name, read_partitioned(PROC_DIR, name, columns=columns, parse_dates=[date_col],
+                                                   partitions=months))
+
+@lru_cache(maxsize=1)
+def _shard_engine() -> StarJoin:
+    # Índices das dimensões abertos uma vez por processo de trabalho
+    return star_join()
+
+@lru_cache(maxsize=1)
+def _shard_colab_engine() -> StarJoin:
+    return colab_join()
+
+def _monthly_shard(months):
+    return monthly_partials(_load_shard("propostas", months))
+
+def _performance_shard(months):
+    return performance_partials(_load_shard("propostas", months), _shard_colab_engine())
+
+def _cube_shard(months):
+    return cube_chunk(_load_shard("transacoes", months), _shard_engine())
+
+def _credit_shard(months):
+    return credit_flow(_load_shard("propostas", months))
+
+def _client_trans_shard(months):
+    return transaction_partials(with_client(_load_shard("transacoes", months), _shard_engine()))
+
+def _client_prop_shard(months):
+    return proposal_partials(_load_shard("propostas", months))
+
+def _load_counts_shard(months):
+    # Cada partição tem meses inteiros: os agregados mensais já saem prontos
+    return monthly_load(minute_counts(with_agency(_load_shard("transacoes", months), _shard_engine())))
+
 
 # ---------------------------
-# 2) monthly_proposals
+# 1) Carga por dia da semana, hora e agência (dimensionamento de infraestrutura)
 # ---------------------------
-monthly_proposals = prop.groupby(prop["data_entrada_proposta"].dt.to_period("M")).agg(
-    qtd_propostas=("cod_proposta", "count"),
-    ticket_medio=("valor_proposta", "mean")
-).rename_axis("year_month").reset_index()
+def with_agency(trans, engine) -> pd.DataFrame:
+    return engine.lookup(trans, "num_conta", "contas", ["cod_agencia"])
+
+def load_partials(trans, engine, months_trans=None, pool=None, stream=None) -> dict:
+    """
+    Agregados mensais de carga (peak_load.monthly_load) dos meses pedidos: sobre
+    trans já carregado, por partição (pool) ou bloco a bloco, acumulando só as
+    contagens por minuto (stream).
+    """
+    with step("contagem_minutos") as span:
+        if pool is not None:
+            results = run_shards(pool, _load_counts_shard, "transacoes", months_trans)
+            loads = {name: pd.concat([r[name] for r in results], ignore_index=True)
+                     for name in LOAD_AGGREGATES}
+        else:
+            if stream is not None:
+                running = stream.aggregate(merge_minute_counts)
+                for chunk in stream_fact(stream, "transacoes", months_trans):
+                    running.add(minute_counts(with_agency(chunk, engine)))
+                counts = running.result()
+            else:
+                span.rows_in = len(trans)
+                counts = minute_counts(with_agency(trans, engine))
+            loads = monthly_load(counts)
+        span.rows_out = len(loads["carga_hora"])
+    return loads
 
-monthly_proposals["year_month"] = monthly_proposals["year_month"].astype(str)
-monthly_proposals.to_csv(FINAL_DIR / "monthly_proposals.csv", index=False)
+def export_peak_load(loads, engine, months_trans=None) -> dict:
+    # Exports compactos no lugar da cópia integral das transações
+    with step("carga"):
+        loads = {name: merge_partials(name, loads[name], months_trans) for name in LOAD_AGGREGATES}
+
+        export_table(weekday_hour_heatmap(loads["carga_hora"]), FINAL_DIR, "carga_dia_hora")
+        export_table(hourly_series(loads["carga_hora"]), FINAL_DIR, "carga_por_hora")
+        export_table(monthly_peaks(loads["carga_hora"], loads["carga_picos"]), FINAL_DIR, "picos_mensais")
+
+        agencias = engine.lookup(agency_percentiles(loads["carga_agencia"]), "cod_agencia", "agencias",
+                                 {"nome": "nome_agencia"})
+        cols = list(agencias.columns)
+        agencias = agencias[cols[:1] + cols[-1:] + cols[1:-1]]
+        export_table(agencias, FINAL_DIR, "carga_agencias")
+    return {"horas": len(loads["carga_hora"])}
 
 # ---------------------------
-# 3) Criar base detalhada com contas, agências e colaboradores
+# 2) monthly_proposals
 # ---------------------------
-trans_detalhado = trans.merge(contas[["num_conta", "cod_agencia"]], on="num_conta", how="left")
-trans_detalhado = trans_detalhado.merge(agencias[["cod_agencia", "nome"]], on="cod_agencia", how="left")
-trans_detalhado = trans_detalhado.rename(columns={"nome": "nome_agencia"})
-trans_detalhado = trans_detalhado.merge(colab_ag, on="cod_agencia", how="left")
-trans_detalhado = trans_detalhado.merge(colab, on="cod_colaborador", how="left")
+def export_monthly_proposals(prop, months_prop=None, pool=None, stream=None) -> dict:
+    # Com pool ou stream, prop não é usado: as propostas são lidas por mês ou em blocos
+    with step("propostas_mensais"):
+        with step("groupby") as span:
+            if pool is not None:
+                prop_partials = pd.concat(run_shards(pool, _monthly_shard, "propostas", months_prop),
+                                          ignore_index=True)
+            elif stream is not None:
+                running = stream.aggregate(partial(fold_partials, keys=["year_month"]))
+                for chunk in stream_fact(stream, "propostas", months_prop):
+                    running.add(monthly_partials(chunk))
+                prop_partials = running.result()
+            else:
+                span.rows_in = len(prop)
+                prop_partials = monthly_partials(prop)
+            span.rows_out = len(prop_partials)
+        prop_partials = merge_partials("monthly_proposals", prop_partials, months_prop)
+
+        monthly_proposals = prop_partials[prop_partials["year_month"] != NULL_PARTITION].sort_values("year_month")
+        monthly_proposals = monthly_proposals.assign(
+            ticket_medio=monthly_proposals["soma_valor"] / monthly_proposals["qtd_valor"]
+        )[["year_month", "qtd_propostas", "ticket_medio"]].reset_index(drop=True)
 
-# 🔗 Verificação de integridade
-missing_conta = trans_detalhado["cod_agencia"].isna().sum()
-print(f"🔍 Transações sem conta/agência correspondente: {missing_conta}")
-missing_colab = trans_detalhado["cod_colaborador"].isna().sum()
-print(f"🔍 Transações sem colaborador correspondente: {missing_colab}")
+        monthly_proposals["year_month"] = monthly_proposals["year_month"].astype(str)
+        export_table(monthly_proposals, FINAL_DIR, "monthly_proposals")
+    return {"linhas": len(monthly_proposals)}
 
 # ---------------------------
-# 4) Top e Bottom 3 Agências
+# 3) Criar base detalhada com contas, agências e colaboradores
 # ---------------------------
-ag_stats = trans_detalhado.groupby(["cod_agencia", "nome_agencia"]).agg(
-    total_transacoes=("cod_transacao", "count"),
-    valor_total=("valor_transacao", "sum")
-).reset_index().sort_values("total_transacoes", ascending=False)
+def enrich_transactions(trans, engine) -> pd.DataFrame:
+    # Cada transação é resolvida pela própria conta (num_conta → conta → agência/colaborador):
+    # uma linha de saída por transação, sem multiplicar pelos colaboradores da agência
+    trans_detalhado = trans
+    with step("joins"):
+        for dim, fk, cols in TRANS_JOINS:
+            with step(dim, rows_in=len(trans_detalhado)) as span:
+                trans_detalhado = engine.lookup(trans_detalhado, fk, dim, cols)
+                span.rows_out = len(trans_detalhado) - engine.misses[dim]
 
-ag_stats.head(3).to_csv(FINAL_DIR / "top3_agencias.csv", index=False)
-ag_stats.tail(3).to_csv(FINAL_DIR / "bottom3_agencias.csv", index=False)
+    print_misses(engine.misses)
+    return trans_detalhado
+
+def cube_partials(trans, engine, months_trans=None, pool=None, stream=None) -> pd.DataFrame:
+    """
+    Cubo dos meses pedidos: sobre trans já carregado, mês a mês em paralelo
+    (pool) ou bloco a bloco, acumulando só o cubo (stream).
+    """
+    if pool is None and stream is None:
+        trans_detalhado = enrich_transactions(trans, engine)
+        with step("montagem_cubo", rows_in=len(trans_detalhado)) as span:
+            cube = build_cube(trans_detalhado)
+            span.rows_out = len(cube)
+        return cube
+
+    misses = {dim: 0 for dim, _, _ in TRANS_JOINS}
+    with step("montagem_cubo") as span:
+        span.rows_in = 0
+        if pool is not None:
+            results = run_shards(pool, _cube_shard, "transacoes", months_trans)
+            cube = merge_cubes([r[0] for r in results])
+        else:
+            # Um bloco por vez; os cubos parciais ficam compactos até a junção final
+            running = stream.aggregate(merge_cubes)
+            results = []
+            for chunk in stream_fact(stream, "transacoes", months_trans):
+                part, part_misses, rows = cube_chunk(chunk, engine)
+                running.add(compact_cube(part))
+                results.append((None, part_misses, rows))
+            cube = canonical_cube(running.result())
+
+        for _, part_misses, rows in results:
+            for dim, n in part_misses.items():
+                misses[dim] += n
+            span.rows_in += rows
+        span.rows_out = len(cube)
+    print_misses(misses)
+    return cube
 
 # ---------------------------
-# 5) Top colaboradores por agência
+# 4) Cubo de transações (base dos rankings de agências e colaboradores)
 # ---------------------------
-colab_stats = trans_detalhado.groupby(
-    ["cod_agencia", "nome_agencia", "primeiro_nome", "ultimo_nome"]
-).agg(
-    total_transacoes=("cod_transacao", "count"),
-    valor_total=("valor_transacao", "sum")
-).reset_index()
+def export_cube_rankings(cube_delta, engine, months_trans=None) -> dict:
+    with step("cubo", rows_in=len(cube_delta)) as span:
+        cube = TransactionCube(merge_partials(CUBE_NAME, cube_delta, months_trans))
+        span.rows_out = len(cube.df)
+        cube.save(FINAL_DIR)
+        print(f"🧊 Cubo de transações: {len(cube.df)} células")
+
+    com_agencia = cube.slice(cod_agencia=lambda c: c != MISSING_KEY)
+
+    def with_agency_names(df):
+        return engine.lookup(df, "cod_agencia", "agencias", {"nome": "nome_agencia"})
+
+    # ---------------------------
+    # 5) Top e Bottom 3 Agências
+    # ---------------------------
+    with step("rankings/agencias"):
+        top3 = with_agency_names(com_agencia.top_n(["cod_agencia"], n=3)).rename(columns=AG_COLS)
+        bottom3 = with_agency_names(com_agencia.bottom_n(["cod_agencia"], n=3)).rename(columns=AG_COLS)
+        bottom3 = bottom3.sort_values("total_transacoes", ascending=False)
 
-colab_stats["full_name"] = colab_stats["primeiro_nome"] + " " + colab_stats["ultimo_nome"]
-colab_stats.to_csv(FINAL_DIR / "top_colabs_per_agency.csv", index=False)
+        ag_cols = ["cod_agencia", "nome_agencia", "total_transacoes", "valor_total"]
+        export_table(top3[ag_cols], FINAL_DIR, "top3_agencias")
+        export_table(bottom3[ag_cols], FINAL_DIR, "bottom3_agencias")
+
+    # ---------------------------
+    # 5b) Top colaboradores por agência (ranking dentro de cada agência)
+    # ---------------------------
+    with step("rankings/colaboradores"):
+        colab_stats = com_agencia.slice(cod_colaborador=lambda c: c != MISSING_KEY).top_n(
+            ["cod_colaborador"], per=["cod_agencia"]
+        ).rename(columns=AG_COLS)
+        colab_stats = with_agency_names(colab_stats)
+        colab_stats = engine.lookup(colab_stats, "cod_colaborador", "colaboradores", ["primeiro_nome", "ultimo_nome"])
+
+        colab_stats["full_name"] = colab_stats["primeiro_nome"] + " " + colab_stats["ultimo_nome"]
+        colab_stats = colab_stats[[
+            "cod_agencia", "nome_agencia", "ranking", "cod_colaborador", "primeiro_nome", "ultimo_nome",
+            "total_transacoes", "valor_total", "full_name"
+        ]]
+        export_table(colab_stats, FINAL_DIR, "top_colabs_per_agency")
+    return {"celulas": len(cube.df)}
 
 # ---------------------------
 # 6) Desempenho de colaboradores (Propostas e Financiamentos)
 # ---------------------------
-colab_performance = (
-    prop.merge(colab, on="cod_colaborador", how="left")
-        .merge(colab_ag, on="cod_colaborador", how="left")
-        .merge(agencias, on="cod_agencia", how="left")
-        .groupby(["cod_colaborador", "primeiro_nome", "ultimo_nome", "nome"])
-        .agg(
-            num_propostas=("cod_proposta", "count"),
-            valor_total_financiado=("valor_proposta", "sum")
+def export_colab_performance(prop, engine, months_prop=None, pool=None, stream=None) -> dict:
+    with step("desempenho_colaboradores"):
+        with step("joins_groupby") as span:
+            if pool is not None:
+                perf_partials = pd.concat(run_shards(pool, _performance_shard, "propostas", months_prop),
+                                          ignore_index=True)
+            elif stream is not None:
+                running = stream.aggregate(partial(fold_partials, keys=PERF_KEYS))
+                for chunk in stream_fact(stream, "propostas", months_prop):
+                    running.add(performance_partials(chunk, engine))
+                perf_partials = running.result()
+            else:
+                span.rows_in = len(prop)
+                perf_partials = performance_partials(prop, engine)
+            span.rows_out = len(perf_partials)
+        perf_partials = merge_partials("colab_performance", perf_partials, months_prop)
+
+        colab_performance = (
+            perf_partials.groupby(["cod_colaborador", "primeiro_nome", "ultimo_nome", "nome"])
+                .agg(
+                    num_propostas=("num_propostas", "sum"),
+                    valor_total_financiado=("valor_total_financiado", "sum")
+                )
+                .reset_index()
         )
-        .reset_index()
-)
 
-colab_performance["colaborador"] = colab_performance["primeiro_nome"] + " " + colab_performance["ultimo_nome"]
-colab_performance = colab_performance.rename(columns={"nome": "nome_agencia"})
+        colab_performance["colaborador"] = colab_performance["primeiro_nome"] + " " + colab_performance["ultimo_nome"]
+        colab_performance = colab_performance.rename(columns={"nome": "nome_agencia"})
+
+        colab_performance = colab_performance[[
+            "colaborador", "nome_agencia", "num_propostas", "valor_total_financiado"
+        ]]
+
+        export_table(colab_performance, FINAL_DIR, "colab_performance")
+    return {"linhas": len(colab_performance)}
+
+
+# ---------------------------
+# 7) Carteira de crédito: fluxo projetado e exposição (Price e SAC)
+# ---------------------------
+def export_credit_exposure(prop, engine, months_prop=None, pool=None, stream=None) -> dict:
+    with step("carteira_credito"):
+        with step("cronogramas") as span:
+            if pool is not None:
+                flow = concat_frames(run_shards(pool, _credit_shard, "propostas", months_prop))
+            elif stream is not None:
+                running = stream.aggregate(partial(fold_partials, keys=FLOW_KEYS))
+                for chunk in stream_fact(stream, "propostas", months_prop):
+                    running.add(credit_flow(chunk))
+                flow = running.result()
+            else:
+                span.rows_in = len(prop)
+                flow = credit_flow(prop)
+            span.rows_out = len(flow)
+        # Meses como category em ordem alfabética (= cronológica) e linhas em ordem fixa:
+        # as somas por mês não dependem da ordem em que os meses foram mesclados
+        flow = merge_partials("fluxo_credito", flow, months_prop)
+        flow = flow.astype({col: pd.CategoricalDtype(sorted(flow[col].unique()))
+                            for col in ["sistema", "year_month", "mes"]})
+        flow = flow.sort_values(FLOW_KEYS, ignore_index=True)
+        flow = flow.rename(columns={"year_month": "mes_entrada", "mes": "year_month"})
+
+        carteira = flow.groupby(["sistema", "year_month"], observed=True)[FLOW_MEASURES].sum().reset_index()
+        export_table(carteira, FINAL_DIR, "fluxo_carteira")
+
+        # Uma agência por colaborador (home_agency): a soma por agência fecha com a carteira
+        por_colab = (flow.groupby(["sistema", "year_month", "cod_colaborador"], observed=True)[FLOW_MEASURES]
+                     .sum().reset_index())
+        por_colab = with_colab(por_colab, engine).rename(columns={"nome": "nome_agencia"})
+        agencias = (por_colab.groupby(["sistema", "year_month", "cod_agencia", "nome_agencia"],
+                                      observed=True, dropna=False)
+                    [FLOW_MEASURES].sum().reset_index())
+        export_table(agencias, FINAL_DIR, "exposicao_agencias")
+
+        por_colab["colaborador"] = por_colab["primeiro_nome"] + " " + por_colab["ultimo_nome"]
+        por_colab = por_colab[["sistema", "year_month", "cod_agencia", "nome_agencia", "cod_colaborador",
+                               "colaborador", *FLOW_MEASURES]]
+        export_table(por_colab, FINAL_DIR, "exposicao_colaboradores")
+    return {"meses": int(carteira["year_month"].nunique())}
+
+
+# ---------------------------
+# 8) Visão 360 do cliente (atributos por cliente e segmentos)
+# ---------------------------
+def with_client(trans, engine) -> pd.DataFrame:
+    return engine.lookup(trans, "num_conta", "contas", ["cod_cliente"])
+
+def export_customer_360(trans, prop, engine, dims, months_trans=None, months_prop=None,
+                        pool=None, stream=None) -> dict:
+    """
+    Parciais por (mês, cliente) das duas fatos; no modo incremental só os
+    clientes com linhas nos meses alterados têm os atributos recalculados.
+    """
+    with step("clientes_360"):
+        with step("parciais") as span:
+            if pool is not None:
+                trans_parts = concat_frames(run_shards(pool, _client_trans_shard, "transacoes", months_trans))
+                prop_parts = concat_frames(run_shards(pool, _client_prop_shard, "propostas", months_prop))
+            elif stream is not None:
+                running = stream.aggregate(partial(merge_client_partials, keys=TRANS_KEYS, measures=TRANS_MEASURES))
+                for chunk in stream_fact(stream, "transacoes", months_trans):
+                    running.add(transaction_partials(with_client(chunk, engine)))
+                trans_parts = running.result()
+                running = stream.aggregate(partial(merge_client_partials, keys=PROP_KEYS, measures=PROP_MEASURES))
+                for chunk in stream_fact(stream, "propostas", months_prop):
+                    running.add(proposal_partials(chunk))
+                prop_parts = running.result()
+            else:
+                span.rows_in = len(trans) + len(prop)
+                trans_parts = transaction_partials(with_client(trans, engine))
+                prop_parts = proposal_partials(prop)
+            span.rows_out = len(trans_parts) + len(prop_parts)
+
+        trans_parts, touched_trans = merge_client_partials_store("clientes_transacoes", trans_parts, months_trans)
+        prop_parts, touched_prop = merge_client_partials_store("clientes_propostas", prop_parts, months_prop)
+
+        with step("atributos") as span:
+            if touched_trans is None or touched_prop is None:
+                facts = customer_facts(trans_parts, prop_parts)
+            else:
+                touched = np.union1d(touched_trans, touched_prop)
+                print(f"⏩ Clientes 360: {len(touched)} cliente(s) recalculado(s)")
+                fresh = customer_facts(trans_parts, prop_parts, touched)
+                facts = refresh_facts(load_table(AGG_DIR, "clientes_fatos"), fresh, touched)
+            span.rows_out = len(facts)
+            save_table(facts, AGG_DIR, "clientes_fatos")
+
+        c360 = customer_360(dims["clientes"], dims["contas"], dims["agencias"], facts)
+        export_table(c360, FINAL_DIR, "clientes_360")
+        export_table(customer_segments(c360), FINAL_DIR, "clientes_segmentos")
+    return {"clientes": len(c360)}
+
+
+# ---------------------------
+# Tarefas isoladas (DAG): leem só o que cada export usa
+# ---------------------------
+def peak_load_task() -> dict:
+    tables = prepare({"transacoes": load_fact("transacoes"),
+                      **load_dimensions(["contas", "agencias", "colaboradores"])})
+    engine = star_join()
+    return export_peak_load(load_partials(tables["transacoes"], engine), engine)
+
+def monthly_proposals_task() -> dict:
+    tables = prepare({"propostas": load_fact("propostas")})
+    return export_monthly_proposals(tables["propostas"])
+
+def cube_rankings_task() -> dict:
+    tables = prepare({"transacoes": load_fact("transacoes"),
+                      **load_dimensions(["contas", "agencias", "colaboradores"])})
+    engine = star_join()
+    return export_cube_rankings(cube_partials(tables["transacoes"], engine), engine)
+
+def colab_performance_task() -> dict:
+    tables = prepare({"propostas": load_fact("propostas"),
+                      **load_dimensions(["agencias", "colaboradores", "colab_agencia"])})
+    return export_colab_performance(tables["propostas"], colab_join())
+
+def customer_360_task() -> dict:
+    tables = prepare({"transacoes": load_fact("transacoes"), "propostas": load_fact("propostas"),
+                      **load_dimensions(["contas", "agencias", "colaboradores", "clientes"])})
+    engine = star_join()
+    return export_customer_360(tables["transacoes"], tables["propostas"], engine, tables)
+
+def credit_exposure_task() -> dict:
+    tables = prepare({"propostas": load_fact("propostas"),
+                      **load_dimensions(["agencias", "colaboradores", "colab_agencia"])})
+    return export_credit_exposure(tables["propostas"], colab_join())
+
+
+# ---------------------------
+# Execução completa
+# ---------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports de dashboards a partir de data/processed")
+    parser.add_argument("--incremental", action="store_true",
+                        help="recalcula apenas os meses alterados desde a última execução")
+    parser.add_argument("--processos", type=int, default=1,
+                        help="processos para os agregados mensais (1 = tudo no processo principal)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="lê as tabelas fato em blocos, sem carregá-las inteiras")
+    parser.add_argument("--memoria-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help=f"orçamento de memória do modo streaming (padrão: {BUDGET_ENV} ou 1024)")
+    args = parser.parse_args(argv)
+    parallel = args.processos > 1
+    if parallel and args.streaming:
+        parser.error("--streaming e --processos > 1 não podem ser usados juntos")
+
+    # ---------------------------
+    # Carregar dados processados
+    # ---------------------------
+    with step("carga"):
+        state = load_state(STATE_DIR)
+        incremental = args.incremental and has_partials()
+        if incremental:
+            months_trans = pop_pending_months(state, "transacoes")
+            months_prop = pop_pending_months(state, "propostas")
+            print(f"⏩ Modo incremental: {len(months_trans)} mês(es) de transações, "
+                  f"{len(months_prop)} mês(es) de propostas")
+        else:
+            months_trans = months_prop = None
+            pop_pending_months(state, "transacoes")
+            pop_pending_months(state, "propostas")
+
+        # Em paralelo (ou em streaming) as tabelas fato são lidas por mês (ou em blocos) depois
+        facts = {} if parallel or args.streaming else {
+            "transacoes": load_fact("transacoes", months_trans),
+            "propostas": load_fact("propostas", months_prop),
+        }
+        tables = prepare({**facts, **load_dimensions(list(DIMENSION_COLS))})
+        dims = {name: tables[name] for name in DIMENSION_COLS}
+
+    stream = None
+    if args.streaming:
+        stream = ChunkStream(args.memoria_mb, reserved_mb=sum(memory_mb(df) for df in dims.values()))
+        rows = stream.chunk_rows(PROC_DIR, "transacoes", FACT_COLS["transacoes"][0], FACT_COPIES)
+        print(f"🌊 Streaming: blocos de {rows} linhas de transações "
+              f"(orçamento {stream.budget_mb} MB, {stream.reserved_mb:.1f} MB em dimensões)")
+
+    with ShardPool(args.processos) if parallel else nullcontext() as pool:
+        engine, colab_engine = star_join(), colab_join()
+        loads = load_partials(tables.get("transacoes"), engine, months_trans, pool, stream)
+        export_peak_load(loads, engine, months_trans)
+
+        export_monthly_proposals(tables.get("propostas"), months_prop, pool, stream)
+
+        cube_delta = cube_partials(tables.get("transacoes"), engine, months_trans, pool, stream)
+        export_cube_rankings(cube_delta, engine, months_trans)
+        export_colab_performance(tables.get("propostas"), colab_engine, months_prop, pool, stream)
+        export_credit_exposure(tables.get("propostas"), colab_engine, months_prop, pool, stream)
+        export_customer_360(tables.get("transacoes"), tables.get("propostas"), engine, tables,
+                            months_trans, months_prop, pool, stream)
+
+    # Meses pendentes só são consumidos depois que todos os exports foram gerados
+    save_state(STATE_DIR, state)
 
-colab_performance = colab_performance[[
-    "colaborador", "nome_agencia", "num_propostas", "valor_total_financiado"
-]]
+    print("✅ Exports gerados em /data/final")
 
-colab_performance.to_csv(FINAL_DIR / "colab_performance.csv", index=False)
 
-print("✅ Exports gerados em /data/final")
+if __name__ == "__main__":
+    main()
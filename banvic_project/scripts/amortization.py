@@ -0,0 +1,224 @@
+# ============================================================
+# amortization.py
+# Cronogramas de financiamento das propostas, calculados em lote:
+#  - Sistemas Price (prestação constante) e SAC (amortização constante)
+#  - Carência: nos primeiros `carencia` meses não há prestação e os juros
+#    são incorporados ao saldo (amortização negativa); as `quantidade_parcelas`
+#    prestações começam depois, sobre o saldo já corrigido
+#  - Período t = 0 é o mês de entrada da proposta (saldo = valor_financiamento);
+#    a parcela k vence no mês de entrada + carencia + k
+#
+# Cada lote vira matrizes (propostas × períodos) calculadas com NumPy, sem
+# laço por proposta. O tamanho do lote é limitado por BATCH_CELLS; os lotes
+# seguem os meses de entrada (um mês só é dividido se não couber sozinho),
+# então o resultado de um mês não depende de quais outros meses foram lidos.
+#
+# Exemplo:
+#   proposal_summary(propostas, "sac")                # totais e taxa efetiva por proposta
+#   amortization_schedule(propostas.head(5), "price") # parcela a parcela
+#   portfolio_flow(contracted(propostas), "price")    # fluxo projetado por mês e colaborador
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from cube import MISSING_KEY
+
+SYSTEMS = ["price", "sac"]
+CONTRACTED_STATUS = "Aprovada"
+
+# Células (propostas × períodos) por lote: cada matriz do lote ocupa 8 bytes por célula
+BATCH_CELLS = 1_000_000
+FLOW_MEASURES = ["prestacao", "juros", "amortizacao", "saldo_devedor", "contratos_ativos"]
+SCHEDULE_COLS = ["taxa_juros_mensal", "valor_financiamento", "quantidade_parcelas", "carencia"]
+
+
+def contracted(prop) -> pd.DataFrame:
+    """Propostas que viraram contrato (entram na carteira)"""
+    return prop[(prop["status_proposta"] == CONTRACTED_STATUS).to_numpy()]
+
+def _valid(prop) -> np.ndarray:
+    return (prop["data_entrada_proposta"].notna()
+            & prop[SCHEDULE_COLS].notna().all(axis=1)
+            & (prop["quantidade_parcelas"] >= 1)).to_numpy()
+
+def _start_months(prop) -> np.ndarray:
+    """Mês de entrada como nº de meses desde 1970-01"""
+    return prop["data_entrada_proposta"].to_numpy().astype("datetime64[M]").astype(np.int64)
+
+def _month_keys(months) -> np.ndarray:
+    return np.datetime_as_string(np.asarray(months).astype("datetime64[M]"), unit="M")
+
+def _month_categories(months) -> pd.Categorical:
+    """Meses (nº desde 1970-01) como category AAAA-MM, com as categorias em ordem cronológica"""
+    values, codes = np.unique(months, return_inverse=True)
+    return pd.Categorical.from_codes(codes, categories=_month_keys(values))
+
+
+def _batches(prop):
+    """
+    Lotes de até BATCH_CELLS células, em ordem de mês de entrada. Meses
+    pequenos são agrupados; um mês grande é dividido em pedaços de tamanho fixo.
+    """
+    periods = int((prop["carencia"].astype(np.int64) + prop["quantidade_parcelas"].astype(np.int64)).max()) + 1
+    rows = max(1, BATCH_CELLS // periods)
+    months = _start_months(prop)
+    order = np.argsort(months, kind="stable")
+    bounds = np.flatnonzero(np.diff(months[order])) + 1
+    pieces = [piece for block in np.split(order, bounds)
+              for piece in np.array_split(block, -(-len(block) // rows))]
+
+    batch, size = [], 0
+    for piece in pieces:
+        if batch and size + len(piece) > rows:
+            yield prop.iloc[np.concatenate(batch)]
+            batch, size = [], 0
+        batch.append(piece)
+        size += len(piece)
+    if batch:
+        yield prop.iloc[np.concatenate(batch)]
+
+def _schedule(batch, system) -> dict:
+    """
+    Matrizes (propostas × períodos t = 0..T) do lote: prestação, juros,
+    amortização e saldo devedor ao fim de cada período.
+    """
+    if system not in SYSTEMS:
+        raise ValueError(f"Sistema desconhecido: {system} (use {', '.join(SYSTEMS)})")
+    principal = batch["valor_financiamento"].to_numpy(dtype=float)[:, None]
+    rate = batch["taxa_juros_mensal"].to_numpy(dtype=float)[:, None]
+    n = batch["quantidade_parcelas"].to_numpy(dtype=np.int64)[:, None]
+    grace = batch["carencia"].to_numpy(dtype=np.int64)[:, None]
+    t = np.arange(int((grace + n).max()) + 1)[None, :]
+
+    growth = 1 + rate
+    # Saldo no fim da carência: juros capitalizados mês a mês
+    base = principal * growth ** grace
+    paid = np.clip(t - grace, 0, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if system == "price":
+            payment = np.where(rate > 0, base * rate / (1 - growth ** -n), base / n)
+            after = np.where(rate > 0, base * growth ** paid - payment * (growth ** paid - 1) / rate,
+                             base - payment * paid)
+        else:
+            after = base * (1 - paid / n)
+    balance = np.where(t <= grace, principal * growth ** np.minimum(t, grace), after)
+    balance[paid >= n] = 0.0
+
+    previous = np.concatenate([np.zeros_like(balance[:, :1]), balance[:, :-1]], axis=1)
+    active = (t >= 1) & (t <= grace + n)
+    interest = np.where(active, previous * rate, 0.0)
+    due = (t > grace) & active
+    if system == "price":
+        installment = np.where(due, payment, 0.0)
+    else:
+        installment = np.where(due, base / n + interest, 0.0)
+    return {
+        "prestacao": installment,
+        "juros": interest,
+        # Na carência a amortização é negativa: os juros entram no saldo
+        "amortizacao": installment - interest,
+        "saldo_devedor": balance,
+    }
+
+
+def proposal_summary(prop, system="price") -> pd.DataFrame:
+    """Por proposta: saldo após a carência, primeira/última prestação, totais pagos e taxa efetiva"""
+    prop = prop[_valid(prop)]
+    parts = []
+    for batch in _batches(prop) if len(prop) else []:
+        m = _schedule(batch, system)
+        grace = batch["carencia"].to_numpy(dtype=np.int64)
+        last = grace + batch["quantidade_parcelas"].to_numpy(dtype=np.int64)
+        rows = np.arange(len(batch))
+        total = m["prestacao"].sum(axis=1)
+        parts.append(pd.DataFrame({
+            "cod_proposta": batch["cod_proposta"].to_numpy(),
+            "sistema": system,
+            "saldo_pos_carencia": m["saldo_devedor"][rows, grace],
+            "primeira_prestacao": m["prestacao"][rows, grace + 1],
+            "ultima_prestacao": m["prestacao"][rows, last],
+            "total_pago": total,
+            "total_juros": m["juros"].sum(axis=1),
+            "taxa_efetiva_anual": (1 + batch["taxa_juros_mensal"].to_numpy(dtype=float)) ** 12 - 1,
+            "custo_total_pct": (total / batch["valor_financiamento"].to_numpy(dtype=float) - 1) * 100,
+        }, index=batch.index))
+    if not parts:
+        return pd.DataFrame(columns=["cod_proposta", "sistema", "saldo_pos_carencia", "primeira_prestacao",
+                                     "ultima_prestacao", "total_pago", "total_juros", "taxa_efetiva_anual",
+                                     "custo_total_pct"])
+    return pd.concat(parts).loc[prop.index].reset_index(drop=True)
+
+def amortization_schedule(prop, system="price") -> pd.DataFrame:
+    """Cronograma parcela a parcela (uma linha por proposta e mês); para seleções pequenas"""
+    prop = prop[_valid(prop)]
+    parts = []
+    for batch in _batches(prop) if len(prop) else []:
+        m = _schedule(batch, system)
+        periods = m["saldo_devedor"].shape[1]
+        t = np.tile(np.arange(periods), len(batch))
+        grace = batch["carencia"].to_numpy(dtype=np.int64)
+        keep = t <= np.repeat(grace + batch["quantidade_parcelas"].to_numpy(dtype=np.int64), periods)
+        starts = np.repeat(_start_months(batch), periods)
+        parts.append(pd.DataFrame({
+            "cod_proposta": np.repeat(batch["cod_proposta"].to_numpy(), periods)[keep],
+            "sistema": system,
+            "periodo": t[keep],
+            "mes": _month_keys(starts + t)[keep],
+            **{name: m[name].ravel()[keep] for name in ["prestacao", "juros", "amortizacao", "saldo_devedor"]},
+        }))
+    if not parts:
+        return pd.DataFrame(columns=["cod_proposta", "sistema", "periodo", "mes",
+                                     "prestacao", "juros", "amortizacao", "saldo_devedor"])
+    return pd.concat(parts, ignore_index=True).sort_values(["cod_proposta", "periodo"], kind="stable",
+                                                           ignore_index=True)
+
+def portfolio_flow(prop, system="price", by="cod_colaborador") -> pd.DataFrame:
+    """
+    Fluxo projetado da carteira por (mês de entrada, mês do fluxo, `by`):
+    prestações, juros, amortização, saldo devedor ao fim do mês e contratos
+    ativos (saldo > 0). year_month é o mês de entrada das propostas.
+    by: chave de agrupamento de baixa cardinalidade (colaborador, agência...).
+    """
+    prop = prop[_valid(prop)]
+    parts, split, last_origin = [], False, None
+    for batch in _batches(prop) if len(prop) else []:
+        m = _schedule(batch, system)
+        periods = m["saldo_devedor"].shape[1]
+        starts = _start_months(batch)
+        owners = batch[by].fillna(MISSING_KEY).to_numpy(dtype=np.int64)
+
+        # Célula = (mês de entrada, período, `by`), nessa ordem: as linhas já saem
+        # ordenadas por mês de entrada, mês do fluxo e `by`. Somas com bincount.
+        codes, owner_idx = np.unique(owners, return_inverse=True)
+        months, month_idx = np.unique(starts, return_inverse=True)
+        cells = ((month_idx[:, None] * periods + np.arange(periods)[None, :]) * len(codes)
+                 + owner_idx[:, None]).ravel()
+        size = len(months) * periods * len(codes)
+        sums = {name: np.bincount(cells, weights=m[name].ravel(), minlength=size)
+                for name in ["prestacao", "juros", "amortizacao", "saldo_devedor"]}
+        sums["contratos_ativos"] = np.bincount(cells, weights=(m["saldo_devedor"] > 0).ravel(),
+                                               minlength=size).astype(np.int64)
+
+        keep = np.flatnonzero((sums["saldo_devedor"] > 0) | (sums["prestacao"] != 0))
+        origin = months[keep // (periods * len(codes))]
+        split |= len(origin) > 0 and origin[0] == last_origin
+        last_origin = origin[-1] if len(origin) else last_origin
+        parts.append(pd.DataFrame({
+            "year_month": origin,
+            "mes": origin + (keep // len(codes)) % periods,
+            by: codes[keep % len(codes)].astype(np.int32),
+            **{name: sums[name][keep] for name in FLOW_MEASURES},
+        }))
+    if not parts:
+        return pd.DataFrame(columns=["year_month", "mes", by, *FLOW_MEASURES])
+
+    flow = pd.concat(parts, ignore_index=True)
+    del parts
+    # Um mês dividido em lotes seguidos tem os mesmos grupos em duas partes: soma de novo.
+    # Os meses ainda são inteiros aqui e viram AAAA-MM no fim
+    if split:
+        flow = flow.groupby(["year_month", "mes", by], sort=True).sum().reset_index()
+    for col in ["year_month", "mes"]:
+        flow[col] = _month_categories(flow[col].to_numpy())
+    return flow
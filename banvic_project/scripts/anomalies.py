@@ -0,0 +1,411 @@
+# ============================================================
+# anomalies.py
+# Detecção de anomalias e de drift nas transações, lote a lote:
+#  - Estatísticas móveis persistidas em data/state/anomalias/:
+#      por conta e por agência: média e desvio de valor_transacao
+#      por agência: volume diário (transações por dia com movimento)
+#      por agência e tipo: mix de nome_transacao e fração de valores negativos
+#      por tipo: histograma de valor_transacao (escala log com sinal)
+#  - Cada lote (transações com data > marca d'água do detector) é pontuado
+#    contra o histórico anterior a ele, sem reler o histórico:
+#      z-score do valor na conta (ou na agência, se a conta tem pouco
+#      histórico), caudas do histograma do tipo (quantis 0,1% / 99,9%),
+#      tipo nunca visto e z-score do volume diário de cada agência
+#  - Drift: o lote é comparado ao lote da execução anterior (volume por
+#    dia, média/desvio do valor, PSI do histograma, mix de tipos, fração
+#    de negativos por tipo) e o mix de cada agência ao seu histórico
+#
+# As estatísticas são somadas ao histórico no fim do lote (média e M2
+# combinadas, método de Chan), com peso do histórico decaindo pela metade
+# a cada HALF_LIFE_DAYS: estatísticas móveis, não do período inteiro.
+# O primeiro lote só cria a linha de base. Linhas com data anterior à marca
+# d'água (atrasadas) não são pontuadas. Apagar data/state/anomalias/
+# recomeça a linha de base.
+#
+# Saídas em data/reports/: anomalias_transacoes (linhas sinalizadas e
+# motivo), anomalias_volume (agência × dia) e drift_resumo.
+#
+# Exemplo (02):
+#   detector = AnomalyDetector(contas)
+#   for bloco in blocos:
+#       detector.update(bloco)
+#   detector.finish(REPORTS_DIR)
+# ============================================================
+
+from functools import reduce
+from pathlib import Path
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+from cube import MISSING_KEY
+from joins import DimensionIndex
+from paths import STATE_DIR
+from storage import load_table, save_table
+
+DETECTOR_DIR = STATE_DIR / "anomalias"
+STATE_FILE = "estado.json"
+
+ROW_COLS = ["cod_transacao", "num_conta", "data_transacao", "nome_transacao", "valor_transacao"]
+DATE_COL = "data_transacao"
+NO_TYPE = "sem_tipo"
+
+Z_THRESHOLD = 4.0
+# Observações (com decaimento) mínimas para usar as estatísticas de uma conta, agência ou tipo
+MIN_HISTORY = 30
+# Dias com movimento mínimos para o teste de volume diário da agência
+MIN_DAYS = 14
+TAIL_QUANTILES = (0.001, 0.999)
+HALF_LIFE_DAYS = 365
+
+# Histograma: sinal(v) · log10(1 + |v|) em faixas de BIN_WIDTH entre ±LOG_LIMIT;
+# o PSI usa faixas de uma década (PSI_GROUP faixas finas)
+BIN_WIDTH = 0.1
+LOG_LIMIT = 8
+N_BINS = int(2 * LOG_LIMIT / BIN_WIDTH)
+PSI_GROUP = 10
+PSI_EPSILON = 1e-4
+
+# Limites de alerta do resumo de drift
+PSI_ALERT = 0.2
+SHARE_ALERT = 0.10
+RATIO_ALERT = 0.5
+MEAN_SHIFT_ALERT = 0.25
+
+DRIFT_COLS = ["metrica", "escopo", "base", "referencia", "atual", "variacao", "alerta"]
+MOMENT_COLS = ["n", "media", "m2"]
+STATE_TABLES = {
+    "contas": ["num_conta", *MOMENT_COLS],
+    "agencias": ["cod_agencia", *MOMENT_COLS],
+    "agencias_dia": ["cod_agencia", *MOMENT_COLS],
+    "tipos": ["cod_agencia", "nome_transacao", "transacoes", "negativas"],
+    "histograma": ["nome_transacao", "faixa", "transacoes"],
+}
+
+
+# ------------------------------
+# Estatísticas combináveis
+# ------------------------------
+def _empty(name) -> pd.DataFrame:
+    return pd.DataFrame({col: pd.Series(dtype=object if col == "nome_transacao" else
+                                        np.int64 if col in ("num_conta", "cod_agencia", "faixa") else float)
+                         for col in STATE_TABLES[name]})
+
+def value_bins(values) -> np.ndarray:
+    """Faixa do histograma de cada valor (escala log com sinal)"""
+    scaled = np.sign(values) * np.log10(1 + np.abs(values))
+    return np.clip(np.floor((scaled + LOG_LIMIT) / BIN_WIDTH), 0, N_BINS - 1).astype(np.int64)
+
+def moments(keys, values, key) -> pd.DataFrame:
+    """n, média e M2 (soma dos quadrados dos desvios) de values por chave"""
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    n = np.bincount(inverse, minlength=len(uniq)).astype(float)
+    mean = np.bincount(inverse, weights=values, minlength=len(uniq)) / np.maximum(n, 1)
+    m2 = np.bincount(inverse, weights=(values - mean[inverse]) ** 2, minlength=len(uniq))
+    return pd.DataFrame({key: uniq.astype(np.int64), "n": n, "media": mean, "m2": m2})
+
+def merge_moments(a, b, key) -> pd.DataFrame:
+    """Combina dois conjuntos de momentos por chave (Chan et al.), sem os dados originais"""
+    m = a.merge(b, on=key, how="outer", suffixes=("_a", "_b")).fillna({
+        f"{c}_{s}": 0.0 for c in MOMENT_COLS for s in "ab"})
+    n = m["n_a"] + m["n_b"]
+    delta = m["media_b"] - m["media_a"]
+    safe = n.where(n > 0, 1)
+    return pd.DataFrame({
+        key: m[key].to_numpy(dtype=np.int64),
+        "n": n,
+        "media": m["media_a"] + delta * m["n_b"] / safe,
+        "m2": m["m2_a"] + m["m2_b"] + delta ** 2 * m["n_a"] * m["n_b"] / safe,
+    }).sort_values(key, ignore_index=True)
+
+def _std(stats) -> np.ndarray:
+    n = stats["n"].to_numpy()
+    return np.sqrt(stats["m2"].to_numpy() / np.where(n > 1, n - 1, np.nan))
+
+def _sum_parts(parts, keys, name) -> pd.DataFrame:
+    if not parts:
+        return _empty(name) if name in STATE_TABLES else pd.DataFrame(columns=[*keys, "transacoes"])
+    return pd.concat(parts, ignore_index=True).groupby(keys, sort=True).sum().reset_index()
+
+def _merge_counts(history, batch, keys, weight) -> pd.DataFrame:
+    history = history.assign(**{c: history[c] * weight for c in history.columns if c not in keys})
+    return _sum_parts([history, batch], keys, None)
+
+def _decay(stats, weight) -> pd.DataFrame:
+    # Média preservada; n e M2 pesam menos: o histórico antigo perde influência
+    return stats.assign(n=stats["n"] * weight, m2=stats["m2"] * weight)
+
+def _psi(expected, actual) -> float:
+    """Population Stability Index entre dois histogramas (contagens nas mesmas faixas)"""
+    e = np.asarray(expected, dtype=float)
+    a = np.asarray(actual, dtype=float)
+    if not e.sum() or not a.sum():
+        return np.nan
+    e = np.maximum(e / e.sum(), PSI_EPSILON)
+    a = np.maximum(a / a.sum(), PSI_EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+# ------------------------------
+# Estado persistido
+# ------------------------------
+def load_detector_state(directory=DETECTOR_DIR) -> dict:
+    directory = Path(directory)
+    path = directory / STATE_FILE
+    if not path.exists():
+        return {"meta": {"marca_dagua": None, "execucoes": 0, "ultimo_lote": None},
+                **{name: _empty(name) for name in STATE_TABLES}}
+    with open(path, encoding="utf-8") as f:
+        meta = json.load(f)
+    return {"meta": meta, **{name: load_table(directory, name) for name in STATE_TABLES}}
+
+def save_detector_state(state, directory=DETECTOR_DIR):
+    # Grava tudo numa pasta nova e troca a pasta inteira: tabelas e marca d'água andam juntas
+    directory = Path(directory)
+    tmp = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name in STATE_TABLES:
+        save_table(state[name], tmp, name)
+    with open(tmp / STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(state["meta"], f, ensure_ascii=False, indent=2, default=str)
+    shutil.rmtree(directory, ignore_errors=True)
+    tmp.replace(directory)
+
+
+# ------------------------------
+# Detector
+# ------------------------------
+class AnomalyDetector:
+    """Pontua blocos de transações contra o histórico e acumula as estatísticas do lote"""
+
+    def __init__(self, contas, directory=DETECTOR_DIR):
+        self.directory = Path(directory)
+        self.state = load_detector_state(self.directory)
+        meta = self.state["meta"]
+        self.watermark = pd.Timestamp(meta["marca_dagua"]) if meta["marca_dagua"] else None
+        self.baseline = self.watermark is None
+
+        # Conta → agência, pelo mesmo índice das junções do 03
+        self.accounts = DimensionIndex(contas[["num_conta", "cod_agencia"]], "num_conta")
+        self.account_agency = contas["cod_agencia"].fillna(MISSING_KEY).to_numpy(dtype=np.int64)
+        self.indexes = {name: DimensionIndex(self.state[name], key)
+                        for name, key in [("contas", "num_conta"), ("agencias", "cod_agencia"),
+                                          ("agencias_dia", "cod_agencia")]}
+        self.tails, self.known_types = self._type_tails(self.state["histograma"])
+
+        self.rows = 0
+        self.latest = None
+        self.batch = {"contas": _empty("contas"), "agencias": _empty("agencias")}
+        self.parts = {"tipos": [], "histograma": [], "dias": []}
+        self.flags = []
+
+    @staticmethod
+    def _type_tails(hist) -> tuple:
+        """Faixas do histograma que contêm os quantis de cauda de cada tipo com histórico suficiente"""
+        tails = {}
+        for tipo, group in hist.groupby("nome_transacao", sort=True):
+            counts = np.bincount(group["faixa"], weights=group["transacoes"], minlength=N_BINS)
+            if counts.sum() < MIN_HISTORY:
+                continue
+            cdf = np.cumsum(counts) / counts.sum()
+            tails[tipo] = (int(np.searchsorted(cdf, TAIL_QUANTILES[0])),
+                           int(np.searchsorted(cdf, TAIL_QUANTILES[1])))
+        return tails, set(hist["nome_transacao"])
+
+    def _zscore(self, name, keys, values, minimum=MIN_HISTORY) -> np.ndarray:
+        stats = self.state[name]
+        positions = self.indexes[name].find(keys)
+        n = take(stats["n"].to_numpy(), positions, allow_fill=True)
+        mean = take(stats["media"].to_numpy(), positions, allow_fill=True)
+        std = take(_std(stats), positions, allow_fill=True)
+        ok = (n >= minimum) & (std > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(ok, (values - mean) / std, np.nan)
+
+    def update(self, chunk):
+        """Pontua as transações novas do bloco e soma suas estatísticas às do lote"""
+        dates = chunk[DATE_COL]
+        keep = dates.notna().to_numpy()
+        if self.watermark is not None:
+            keep &= (dates > self.watermark).to_numpy()
+        if not keep.any():
+            return
+        batch = chunk.loc[keep, ROW_COLS].reset_index(drop=True)
+        self.rows += len(batch)
+        latest = batch[DATE_COL].max()
+        self.latest = latest if self.latest is None else max(self.latest, latest)
+
+        accounts = batch["num_conta"].to_numpy(dtype=np.int64)
+        agencies = take(self.account_agency, self.accounts.find(accounts), allow_fill=True, fill_value=MISSING_KEY)
+        values = batch["valor_transacao"].to_numpy(dtype=float, na_value=np.nan)
+        valid = ~np.isnan(values)
+        types = batch["nome_transacao"].astype(object).fillna(NO_TYPE).to_numpy()
+        bins = value_bins(np.nan_to_num(values))
+
+        if not self.baseline:
+            self._score(batch, accounts, agencies, values, valid, types, bins)
+
+        # Estatísticas do lote (somadas ao histórico só no fim)
+        for name, keys, key in [("contas", accounts, "num_conta"), ("agencias", agencies, "cod_agencia")]:
+            self.batch[name] = merge_moments(self.batch[name], moments(keys[valid], values[valid], key), key)
+        frame = pd.DataFrame({"cod_agencia": agencies, "nome_transacao": types, "faixa": bins,
+                              "dia": batch[DATE_COL].to_numpy().astype("datetime64[D]"),
+                              "transacoes": 1.0, "negativas": (values < 0).astype(float)})
+        self.parts["tipos"].append(frame.groupby(["cod_agencia", "nome_transacao"], sort=False)
+                                   [["transacoes", "negativas"]].sum().reset_index())
+        self.parts["histograma"].append(frame[valid].groupby(["nome_transacao", "faixa"], sort=False)
+                                        [["transacoes"]].sum().reset_index())
+        self.parts["dias"].append(frame.groupby(["cod_agencia", "dia"], sort=False)[["transacoes"]].sum()
+                                  .reset_index())
+
+    def _score(self, batch, accounts, agencies, values, valid, types, bins):
+        z_account = self._zscore("contas", accounts, values)
+        z_agency = self._zscore("agencias", agencies, values)
+        uniq, inverse = np.unique(types, return_inverse=True)
+        low = np.array([self.tails.get(t, (-1, N_BINS))[0] for t in uniq], dtype=np.int64)[inverse]
+        high = np.array([self.tails.get(t, (-1, N_BINS))[1] for t in uniq], dtype=np.int64)[inverse]
+
+        reasons = {
+            "valor_conta": np.abs(z_account) > Z_THRESHOLD,
+            "valor_agencia": np.isnan(z_account) & (np.abs(z_agency) > Z_THRESHOLD),
+            "cauda_tipo": valid & ((bins < low) | (bins > high)),
+            "tipo_novo": ~np.isin(types, list(self.known_types)),
+        }
+        flagged = reduce(np.logical_or, reasons.values())
+        if not flagged.any():
+            return
+        reason = reduce(np.char.add, [np.where(mask[flagged], f"{name};", "") for name, mask in reasons.items()])
+        self.flags.append(batch[flagged].assign(
+            cod_agencia=agencies[flagged], z_conta=z_account[flagged], z_agencia=z_agency[flagged],
+            motivo=np.char.rstrip(reason, ";")))
+
+    # ------------------------------
+    # Fim do lote
+    # ------------------------------
+    def _volume(self, days) -> pd.DataFrame:
+        """Agência × dia com volume fora do padrão da agência (z-score do nº de transações)"""
+        z = self._zscore("agencias_dia", days["cod_agencia"].to_numpy(), days["transacoes"].to_numpy(),
+                         minimum=MIN_DAYS)
+        out = days.assign(dia=pd.to_datetime(days["dia"]), z_volume=z)
+        out = out[np.abs(z) > Z_THRESHOLD]
+        return out.astype({"transacoes": np.int64}).reset_index(drop=True)
+
+    @staticmethod
+    def _summary(tipos, hist, days, agencies) -> dict:
+        by_type = tipos.groupby("nome_transacao")[["transacoes", "negativas"]].sum()
+        coarse = np.bincount(hist["faixa"] // PSI_GROUP, weights=hist["transacoes"],
+                             minlength=-(-N_BINS // PSI_GROUP))
+        n = float(agencies["n"].sum())
+        mean = float((agencies["media"] * agencies["n"]).sum() / n) if n else np.nan
+        # Variância total = dentro das agências + entre agências
+        m2 = float(agencies["m2"].sum() + (agencies["n"] * (agencies["media"] - mean) ** 2).sum()) if n else np.nan
+        return {
+            "transacoes": int(by_type["transacoes"].sum()),
+            "transacoes_por_dia": float(by_type["transacoes"].sum() / max(days["dia"].nunique(), 1)),
+            "valor_medio": mean,
+            "valor_desvio": float(np.sqrt(m2 / (n - 1))) if n > 1 else np.nan,
+            "histograma": coarse.tolist(),
+            "participacao": (by_type["transacoes"] / by_type["transacoes"].sum()).to_dict(),
+            "negativas": (by_type["negativas"] / by_type["transacoes"]).to_dict(),
+        }
+
+    @staticmethod
+    def _drift(previous, current, history_types, batch_types) -> pd.DataFrame:
+        rows = []
+
+        def add(metric, scope, base, reference, value, change, limit):
+            alert = bool(np.isfinite(change) and abs(change) > limit)
+            rows.append({"metrica": metric, "escopo": scope, "base": base, "referencia": reference,
+                         "atual": value, "variacao": change, "alerta": alert})
+
+        if previous:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ref, cur = previous["transacoes_por_dia"], current["transacoes_por_dia"]
+                add("transacoes_por_dia", "geral", "execucao_anterior", ref, cur, cur / ref - 1, RATIO_ALERT)
+                # Deslocamento da média em desvios da execução anterior (a média pode ser ~0)
+                ref, cur = previous["valor_medio"], current["valor_medio"]
+                add("valor_medio", "geral", "execucao_anterior", ref, cur,
+                    (cur - ref) / previous["valor_desvio"], MEAN_SHIFT_ALERT)
+                ref, cur = previous["valor_desvio"], current["valor_desvio"]
+                add("valor_desvio", "geral", "execucao_anterior", ref, cur, cur / ref - 1, RATIO_ALERT)
+            psi = _psi(previous["histograma"], current["histograma"])
+            add("psi_valor", "geral", "execucao_anterior", 0.0, psi, psi, PSI_ALERT)
+            # Participação de um tipo ausente é 0; a fração de negativos de um tipo ausente não existe
+            for key, missing in [("participacao", 0.0), ("negativas", np.nan)]:
+                for tipo in sorted(set(previous[key]) | set(current[key])):
+                    ref, cur = previous[key].get(tipo, missing), current[key].get(tipo, missing)
+                    add(key, tipo, "execucao_anterior", ref, cur, cur - ref, SHARE_ALERT)
+
+        # Mix de tipos de cada agência contra o próprio histórico (distância de variação total)
+        if history_types.empty or batch_types.empty:
+            return pd.DataFrame(rows, columns=DRIFT_COLS)
+        mix = {}
+        for label, frame in [("historico", history_types), ("lote", batch_types)]:
+            table = frame.pivot_table(index="cod_agencia", columns="nome_transacao", values="transacoes",
+                                      aggfunc="sum", fill_value=0.0, observed=True)
+            mix[label] = table[table.sum(axis=1) >= MIN_HISTORY]
+        agencies = mix["historico"].index.intersection(mix["lote"].index)
+        if len(agencies):
+            columns = mix["historico"].columns.union(mix["lote"].columns)
+            shares = {label: t.reindex(index=agencies, columns=columns, fill_value=0.0) for label, t in mix.items()}
+            shares = {label: t.div(t.sum(axis=1), axis=0) for label, t in shares.items()}
+            distance = (shares["lote"] - shares["historico"]).abs().sum(axis=1) / 2
+            for agency, value in distance.items():
+                add("mix_tipos", f"agencia {agency}", "historico", 0.0, float(value), float(value), SHARE_ALERT)
+
+        return pd.DataFrame(rows, columns=DRIFT_COLS)
+
+    def finish(self, reports_dir) -> dict:
+        """Volume diário, resumo de drift, gravação dos relatórios e do histórico atualizado"""
+        meta = self.state["meta"]
+        tipos = _sum_parts(self.parts["tipos"], ["cod_agencia", "nome_transacao"], "tipos")
+        hist = _sum_parts(self.parts["histograma"], ["nome_transacao", "faixa"], "histograma")
+        days = _sum_parts(self.parts["dias"], ["cod_agencia", "dia"], "dias")
+
+        if not self.rows:
+            print(f"⏭️ Anomalias: nenhuma transação nova desde {self.watermark}")
+            return {"lote": 0, "sinalizadas": 0, "volume": 0, "alertas": 0}
+
+        flags = pd.concat(self.flags, ignore_index=True) if self.flags else \
+            pd.DataFrame(columns=[*ROW_COLS, "cod_agencia", "z_conta", "z_agencia", "motivo"])
+        volume = self._volume(days) if not self.baseline else \
+            pd.DataFrame(columns=["cod_agencia", "dia", "transacoes", "z_volume"])
+        summary = self._summary(tipos, hist, days, self.batch["agencias"])
+        drift = self._drift(meta["ultimo_lote"], summary, self.state["tipos"], tipos)
+
+        # Histórico com decaimento pelo tempo desde a marca d'água anterior, somado ao lote
+        elapsed = (self.latest - self.watermark).days if self.watermark is not None else 0
+        weight = 0.5 ** (max(elapsed, 0) / HALF_LIFE_DAYS)
+        daily = moments(days["cod_agencia"].to_numpy(), days["transacoes"].to_numpy(dtype=float), "cod_agencia")
+        state = {
+            "contas": merge_moments(_decay(self.state["contas"], weight), self.batch["contas"], "num_conta"),
+            "agencias": merge_moments(_decay(self.state["agencias"], weight), self.batch["agencias"], "cod_agencia"),
+            "agencias_dia": merge_moments(_decay(self.state["agencias_dia"], weight), daily, "cod_agencia"),
+            "tipos": _merge_counts(self.state["tipos"], tipos, ["cod_agencia", "nome_transacao"], weight),
+            "histograma": _merge_counts(self.state["histograma"], hist, ["nome_transacao", "faixa"], weight),
+            "meta": {"marca_dagua": str(self.latest), "execucoes": meta["execucoes"] + 1, "ultimo_lote": summary},
+        }
+        save_detector_state(state, self.directory)
+
+        save_table(flags, reports_dir, "anomalias_transacoes")
+        save_table(volume, reports_dir, "anomalias_volume")
+        save_table(drift, reports_dir, "drift_resumo")
+
+        alerts = drift[drift["alerta"]]
+        if self.baseline:
+            print(f"🆕 Anomalias: linha de base criada com {self.rows} transações (nada pontuado)")
+        else:
+            print(f"🚨 Anomalias: {len(flags)} de {self.rows} transações sinalizadas, "
+                  f"{len(volume)} agência-dia(s) com volume atípico")
+            if len(flags):
+                print(flags["motivo"].str.split(";").explode().value_counts().to_string())
+        if len(alerts):
+            print(f"⚠️ Drift: {len(alerts)} alerta(s)")
+            print(alerts[["metrica", "escopo", "referencia", "atual", "variacao"]].to_string(index=False))
+        elif len(drift):
+            print("✅ Drift: nenhuma métrica fora dos limites")
+        return {"lote": self.rows, "sinalizadas": len(flags), "volume": len(volume), "alertas": len(alerts)}
@@ -0,0 +1,246 @@
+# ============================================================
+# benchmark.py
+# Benchmark ponta a ponta do pipeline (01 → 02 → 03) em tamanhos fixos.
+#
+#  - Gera (uma vez) a base de cada faixa com o gerador fake em modo escala
+#  - Roda cada script em um subprocesso com BANVIC_DATA_DIR apontando para
+#    a base da faixa e mede tempo de relógio, tempo de CPU e pico de RSS
+#  - As etapas internas (datas, numéricos, derivadas, qualidade, gravação,
+#    joins, agregações...) vêm de instrumentation.step; uma etapa que roda
+#    várias vezes no mesmo script (um span por bloco, por tarefa...) entra
+#    somada: tempos somados, pico de RSS máximo e nº de ocorrências
+#  - Tempo de CPU e pico de RSS do processo filho vêm de os.wait4 (POSIX);
+#    no Windows esses dois campos ficam nulos e só o tempo de relógio é medido
+#  - Cada execução é anexada ao histórico (JSON lines) e comparada com a
+#    baseline gravada; regressões fazem o script sair com código 1
+#
+# Uso:
+#  python scripts/benchmark.py --faixas 10k 1m
+#  python scripts/benchmark.py --faixas 10k --salvar-baseline
+# ============================================================
+
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = Path(__file__).resolve().parent
+PROJECT_ROOT = HERE.parent
+BENCH_DIR = PROJECT_ROOT / "data" / "benchmark"
+HISTORY_FILE = BENCH_DIR / "history.jsonl"
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+GENERATOR = PROJECT_ROOT / "scriptsdatafake" / "generate_fake_data.py"
+
+TIERS = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "100m": 100_000_000,
+}
+STAGES = ["01_ingest_inspect.py", "02_clean_transform.py", "03_eda_and_exports.py"]
+
+# Regressão: mais lento que a baseline em TOLERANCE e em pelo menos MIN_DELTA_S
+# (a folga absoluta evita alarmes em etapas de milissegundos)
+TOLERANCE = 0.15
+MIN_DELTA_S = 0.5
+METRICS = ["wall_s", "cpu_s", "pico_rss_mb"]
+SUMMED = ["wall_s", "cpu_s"]
+
+
+# ---------------------------
+# Bases por faixa
+# ---------------------------
+def tier_data_dir(tier) -> Path:
+    return BENCH_DIR / tier / "data"
+
+def build_dataset(tier, processes):
+    """Gera data/raw da faixa (reaproveitada se já existir com o mesmo tamanho)"""
+    raw = tier_data_dir(tier) / "raw"
+    marker = raw / ".linhas"
+    if marker.exists() and marker.read_text().strip() == str(TIERS[tier]):
+        return raw
+
+    print(f"🏗️ Gerando base da faixa {tier} ({TIERS[tier]:,} transações)...".replace(",", "."))
+    raw.mkdir(parents=True, exist_ok=True)
+    subprocess.run([sys.executable, str(GENERATOR), "--transacoes", str(TIERS[tier]),
+                    "--saida", str(raw), "--processos", str(processes)],
+                   check=True, stdout=subprocess.DEVNULL)
+    # O 01 espera os nomes sem o sufixo _fake
+    for path in raw.glob("*_fake.csv"):
+        path.replace(raw / path.name.replace("_fake", ""))
+    marker.write_text(str(TIERS[tier]))
+    return raw
+
+
+# ---------------------------
+# Execução medida
+# ---------------------------
+def run_stage(script, data_dir, log_path, metrics_path) -> dict:
+    """Roda um script e mede o próprio processo filho (wait4 devolve o rusage dele)"""
+    env = dict(os.environ, BANVIC_DATA_DIR=str(data_dir), BANVIC_METRICS_FILE=str(metrics_path))
+    usage = None
+    with open(log_path, "w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, str(HERE / script)], cwd=PROJECT_ROOT,
+                                env=env, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            # Windows: sem rusage do filho, só o tempo de relógio
+            proc.wait()
+        wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} falhou (código {proc.returncode}); ver {log_path}")
+
+    rss_div = 1024 ** 2 if sys.platform == "darwin" else 1024
+    return {
+        "wall_s": round(wall, 4),
+        "cpu_s": None if usage is None else round(usage.ru_utime + usage.ru_stime, 4),
+        "pico_rss_mb": None if usage is None else round(usage.ru_maxrss / rss_div, 1),
+        "ocorrencias": 1,
+    }
+
+def add_span(measures, record):
+    """Acumula um span do metricas.jsonl na etapa de mesmo nome"""
+    name = record["etapa"]
+    m = measures.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "pico_rss_mb": None, "ocorrencias": 0})
+    for key in SUMMED:
+        m[key] += record[key]
+    if record["pico_rss_mb"] is not None:
+        m["pico_rss_mb"] = max(m["pico_rss_mb"] or 0.0, record["pico_rss_mb"])
+    m["ocorrencias"] += 1
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+def run_tier(tier, repetitions, processes) -> dict:
+    """Roda o pipeline completo `repetitions` vezes; cada medida é a mediana"""
+    build_dataset(tier, processes)
+    data_dir = tier_data_dir(tier)
+    runs = []
+    for rep in range(repetitions):
+        metrics_path = data_dir / "metrics.jsonl"
+        metrics_path.unlink(missing_ok=True)
+        measures = {}
+        for script in STAGES:
+            stage = Path(script).stem
+            measures[stage] = run_stage(script, data_dir, data_dir / f"{stage}.log", metrics_path)
+            print(f"   {tier} #{rep + 1} {stage}: {measures[stage]['wall_s']:.2f}s")
+        with open(metrics_path, encoding="utf-8") as f:
+            for line in f:
+                add_span(measures, json.loads(line))
+        runs.append(measures)
+
+    # Etapas ausentes em alguma repetição entram com a mediana das que as têm
+    names = dict.fromkeys(name for run in runs for name in run)
+    return {
+        name: {m: _median(run[name][m] for run in runs if name in run) for m in METRICS + ["ocorrencias"]}
+        for name in names
+    }
+
+
+# ---------------------------
+# Histórico e baseline
+# ---------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def append_history(record):
+    HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def load_baseline() -> dict:
+    if not BASELINE_FILE.exists():
+        return {}
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(results):
+    baseline = load_baseline()
+    baseline.update(results)
+    BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+def find_regressions(tier, measures, baseline, tolerance=TOLERANCE) -> list:
+    """Etapas cujo tempo de relógio piorou além da tolerância em relação à baseline"""
+    regressions = []
+    for name, m in measures.items():
+        base = baseline.get(tier, {}).get(name)
+        if not base:
+            continue
+        delta = m["wall_s"] - base["wall_s"]
+        if delta > MIN_DELTA_S and m["wall_s"] > base["wall_s"] * (1 + tolerance):
+            regressions.append({"etapa": name, "baseline_s": base["wall_s"], "atual_s": m["wall_s"],
+                                "variacao_%": round(100 * delta / base["wall_s"], 1)})
+    return regressions
+
+def print_tier(tier, measures):
+    print(f"\n⏱️ Faixa {tier}:")
+    print(f"   {'etapa':<50} {'vezes':>6} {'wall_s':>9} {'cpu_s':>9} {'pico_rss_mb':>12}")
+    for name, m in measures.items():
+        print(f"   {name:<50} {m['ocorrencias']:>6g} {m['wall_s']:>9.2f} {_fmt(m['cpu_s'], 9, 2)} "
+              f"{_fmt(m['pico_rss_mb'], 12, 1)}")
+
+def _fmt(value, width, decimals) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{decimals}f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline em faixas de tamanho")
+    parser.add_argument("--faixas", nargs="+", default=["10k"], choices=list(TIERS))
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1,
+                        help="processos usados pelo gerador de dados")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCE)
+    parser.add_argument("--salvar-baseline", action="store_true",
+                        help="grava os resultados como nova baseline das faixas executadas")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline()
+    results, regressions = {}, []
+    for tier in args.faixas:
+        results[tier] = run_tier(tier, args.repeticoes, args.processos)
+        print_tier(tier, results[tier])
+        regressions += [dict(r, faixa=tier)
+                        for r in find_regressions(tier, results[tier], baseline, args.tolerancia)]
+
+    append_history({
+        "quando": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "host": socket.gethostname(),
+        "repeticoes": args.repeticoes,
+        "faixas": results,
+        "regressoes": regressions,
+    })
+    print(f"\n📝 Histórico: {HISTORY_FILE}")
+
+    if args.salvar_baseline:
+        save_baseline(results)
+        print(f"📌 Baseline atualizada: {BASELINE_FILE}")
+    elif regressions:
+        print("\n⚠️ Regressões em relação à baseline:")
+        for r in regressions:
+            print(f"   [{r['faixa']}] {r['etapa']}: {r['baseline_s']:.2f}s → {r['atual_s']:.2f}s "
+                  f"(+{r['variacao_%']}%)")
+        return 1
+    else:
+        print("✅ Nenhuma regressão em relação à baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# ============================================================
+# calendar_dim.py
+# Dimensão de datas (calendário) gerada uma vez para o período dos dados:
+#  - estação do ano, dia da semana em português, fim de semana
+#  - feriados nacionais (fixos e móveis, a partir da Páscoa)
+#  - dia útil e índice de dias úteis
+#  - chaves de mês e trimestre
+#
+# As tabelas fato recebem esses atributos por uma única busca pela chave
+# inteira do dia (nada de .apply linha a linha).
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+DAY_NAMES = np.array([
+    "Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+    "Sexta-feira", "Sábado", "Domingo",
+], dtype=object)
+
+SEASONS = np.array(["Verão", "Outono", "Inverno", "Primavera"], dtype=object)
+
+# Feriados nacionais de data fixa: (mês, dia, nome, primeiro ano de vigência)
+FIXED_HOLIDAYS = [
+    (1, 1, "Confraternização Universal", None),
+    (4, 21, "Tiradentes", None),
+    (5, 1, "Dia do Trabalho", None),
+    (9, 7, "Independência do Brasil", None),
+    (10, 12, "Nossa Senhora Aparecida", None),
+    (11, 2, "Finados", None),
+    (11, 15, "Proclamação da República", None),
+    (11, 20, "Dia Nacional de Zumbi e da Consciência Negra", 2024),
+    (12, 25, "Natal", None),
+]
+
+# Feriados móveis: deslocamento em dias a partir do domingo de Páscoa.
+# Carnaval e Corpus Christi são pontos facultativos, mas não há expediente bancário.
+EASTER_HOLIDAYS = [
+    (-48, "Carnaval (segunda-feira)"),
+    (-47, "Carnaval (terça-feira)"),
+    (-2, "Sexta-feira Santa"),
+    (60, "Corpus Christi"),
+]
+
+
+# ------------------------------
+# Feriados
+# ------------------------------
+def easter_sunday(years) -> pd.DatetimeIndex:
+    """Domingo de Páscoa (algoritmo gregoriano de Meeus/Jones/Butcher), vetorizado"""
+    y = np.asarray(years, dtype=np.int64)
+    a = y % 19
+    b, c = y // 100, y % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return pd.to_datetime(pd.DataFrame({"year": y, "month": month, "day": day}))
+
+def brazilian_holidays(years) -> pd.Series:
+    """Feriados nacionais dos anos pedidos: Series data → nome"""
+    years = np.asarray(sorted(set(years)), dtype=np.int64)
+    frames = []
+    for month, day, name, since in FIXED_HOLIDAYS:
+        ys = years if since is None else years[years >= since]
+        dates = pd.to_datetime(pd.DataFrame({"year": ys, "month": month, "day": day}))
+        frames.append(pd.Series(name, index=dates))
+
+    easter = easter_sunday(years)
+    for offset, name in EASTER_HOLIDAYS:
+        frames.append(pd.Series(name, index=easter + pd.Timedelta(days=offset)))
+
+    holidays = pd.concat(frames).sort_index()
+    return holidays[~holidays.index.duplicated()]
+
+
+# ------------------------------
+# Dimensão de datas
+# ------------------------------
+def season_of(month, day) -> np.ndarray:
+    """Estação do ano (hemisfério sul) a partir de arrays de mês e dia"""
+    md = np.asarray(month) * 100 + np.asarray(day)
+    idx = np.select(
+        [(md >= 1221) | (md < 321), md < 621, md < 923],
+        [0, 1, 2],
+        default=3,
+    )
+    return SEASONS[idx]
+
+def build_date_dim(start, end) -> pd.DataFrame:
+    """Uma linha por dia entre start e end (inclusive), com os atributos de calendário"""
+    if pd.isna(start) or pd.isna(end):
+        days = pd.DatetimeIndex([])
+    else:
+        days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+    year, month, day = days.year.to_numpy(), days.month.to_numpy(), days.day.to_numpy()
+    weekday = days.weekday.to_numpy()
+    quarter = days.quarter.to_numpy()
+
+    holidays = brazilian_holidays(np.unique(year)) if len(days) else pd.Series(dtype=object)
+    holiday_name = holidays.reindex(days).to_numpy()
+    is_holiday = pd.notna(holiday_name)
+    is_weekend = weekday >= 5
+    is_business_day = ~is_weekend & ~is_holiday
+
+    dim = pd.DataFrame({
+        "date_key": year * 10000 + month * 100 + day,
+        "date": days,
+        "year": year,
+        "quarter": quarter,
+        "month": month,
+        "day": day,
+        "month_key": year * 100 + month,
+        "quarter_key": year * 10 + quarter,
+        "weekday": weekday,
+        "day_name": DAY_NAMES[weekday],
+        "is_weekend": is_weekend,
+        "is_month_even": month % 2 == 0,
+        "is_holiday": is_holiday,
+        "holiday_name": holiday_name,
+        "is_business_day": is_business_day,
+        # Nº do dia útil desde o início da dimensão (dias não úteis repetem o último)
+        "business_day_index": np.cumsum(is_business_day),
+        "season": season_of(month, day),
+    })
+    # Tipos anuláveis: quem recebe os atributos mantém o tipo mesmo com datas nulas
+    return dim.convert_dtypes(convert_string=False, convert_floating=False)
+
+def attach_date_dim(df, date_col, date_dim, columns) -> pd.DataFrame:
+    """
+    Acrescenta ao DataFrame os atributos de calendário de `date_col`.
+    A posição na dimensão é o nº de dias desde o seu primeiro dia, então a
+    busca é uma indexação inteira; datas nulas ou fora do período ficam nulas.
+    """
+    positions = np.full(len(df), -1, dtype=np.int64)
+    if len(date_dim):
+        start = date_dim["date"].iloc[0].to_datetime64().astype("datetime64[D]")
+        dates = df[date_col].to_numpy().astype("datetime64[D]")
+        valid = ~np.isnat(dates)
+        positions[valid] = (dates[valid] - start).astype(np.int64)
+        positions[(positions < 0) | (positions >= len(date_dim))] = -1
+
+    out = df.copy()
+    for col in columns:
+        out[col] = pd.api.extensions.take(date_dim[col].values, positions, allow_fill=True)
+    return out
@@ -0,0 +1,59 @@
+# ============================================================
+# compaction.py
+# Política de tipos compactos usada por 01, 02 e 03:
+#  - textos de baixa cardinalidade → category (dicionário + códigos)
+#  - inteiros → menor largura suficiente (int8/int16/int32; Int* se anulável)
+#  - flags is_* → boolean anulável
+#  - valores monetários continuam float64 (float32 perderia centavos)
+# ============================================================
+
+import pandas as pd
+
+from schema import category_columns, tables
+
+# Tabela → colunas categóricas (do registro de esquemas, mais a dimensão de datas)
+CATEGORICAL_COLUMNS = {
+    **{name: category_columns(name) for name in tables() if category_columns(name)},
+    "dim_calendario": ["day_name", "season", "holiday_name"],
+}
+
+BOOL_PREFIX = "is_"
+
+
+def compact_frame(df, table) -> pd.DataFrame:
+    """Aplica a política de tipos às colunas presentes (altera e devolve o próprio df)"""
+    categorical = set(CATEGORICAL_COLUMNS.get(table, []))
+    for col in df.columns:
+        s = df[col]
+        if col in categorical:
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                df[col] = s.astype("category")
+        elif col.startswith(BOOL_PREFIX):
+            if pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+                # Flags relidas de CSV podem chegar como texto "True"/"False"
+                s = s.astype(str).str.lower().map({"true": True, "false": False})
+            if not isinstance(s.dtype, pd.BooleanDtype):
+                df[col] = s.astype("boolean")
+        elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            df[col] = pd.to_numeric(s, downcast="integer")
+    return df
+
+def memory_mb(df) -> float:
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def compact_tables(tables: dict) -> dict:
+    """
+    Compacta um dicionário {tabela: DataFrame} e exibe a memória antes/depois.
+    Devolve o mesmo dicionário, com os DataFrames compactados.
+    """
+    rows = []
+    for name, df in tables.items():
+        before = memory_mb(df)
+        tables[name] = compact_frame(df, name)
+        after = memory_mb(tables[name])
+        rows.append({"tabela": name, "antes_mb": round(before, 3), "depois_mb": round(after, 3),
+                     "reducao_%": round(100 * (1 - after / before), 1) if before else 0.0})
+
+    print("\n🗜️ Memória por tabela (tipos compactos):")
+    print(pd.DataFrame(rows).set_index("tabela"))
+    return tables
@@ -0,0 +1,297 @@
+# ============================================================
+# constraints.py
+# Validação declarativa de chaves das sete tabelas:
+#  - unicidade de chave primária
+#  - integridade referencial (chave estrangeira → chave primária do pai)
+#
+# O índice de chaves de cada tabela pai é montado uma única vez (arrays
+# ordenados) e as tabelas filhas são validadas bloco a bloco, então a
+# validação funciona para tabelas filhas maiores que a memória.
+# A unicidade da chave primária de tabelas em memória usa um KeyIndex das
+# chaves já vistas; para tabelas relidas do disco em blocos, cada bloco vira
+# um run ordenado (chave, posição) gravado em disco e os runs são fundidos
+# por faixas de chave, então a memória fica limitada ao porte de um bloco.
+# Linhas violadas podem ser gravadas em quarentena (arquivo à parte).
+# ============================================================
+
+from contextlib import nullcontext
+from pathlib import Path
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from schema import foreign_keys, primary_keys
+from storage import TableWriter
+
+SAMPLE_ROWS = 5
+DEFAULT_CHUNK = 500_000
+
+# Tabela → coluna(s) da chave primária e (tabela filha, coluna, tabela pai,
+# coluna no pai), declaradas no registro de esquemas
+PRIMARY_KEYS = primary_keys()
+FOREIGN_KEYS = foreign_keys()
+
+
+# ------------------------------
+# Índice de chaves
+# ------------------------------
+def _column_keys(series):
+    """
+    (chaves, inválidas). Chaves numéricas viram o próprio inteiro (1, 1.0 e
+    Int64 batem entre pai e filho); as demais, hash do texto. Nulo, infinito
+    ou valor não inteiro (1.5) é inválido, nunca truncado: a posição vale 0
+    em chaves e deve ser tratada como violação por quem chama.
+    """
+    invalid = series.isna().to_numpy()
+    if pd.api.types.is_integer_dtype(series):
+        keys = series.to_numpy(dtype=np.int64, na_value=0)
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            invalid |= ~np.isfinite(values) | (values != np.floor(values))
+        keys = np.where(invalid, 0, values).astype(np.int64)
+    else:
+        return pd.util.hash_array(series.astype(str).to_numpy(dtype=object)), invalid
+    return keys.view(np.uint64), invalid
+
+def key_hashes(df, columns):
+    """Chave (simples ou composta) como inteiro de 64 bits e a máscara de chaves inválidas"""
+    if len(columns) == 1:
+        return _column_keys(df[columns[0]])
+    keys, invalid = {}, np.zeros(len(df), dtype=bool)
+    for c in columns:
+        keys[c], bad = _column_keys(df[c])
+        invalid |= bad
+    return pd.util.hash_pandas_object(pd.DataFrame(keys), index=False).to_numpy(), invalid
+
+class KeyIndex:
+    """
+    Conjunto de chaves com busca binária vetorizada. As chaves ficam em
+    poucos arrays ordenados de tamanhos decrescentes (cada bloco novo só é
+    fundido com arrays do mesmo porte), então montar o índice custa
+    O(n log n) no total em vez de refundir tudo a cada bloco.
+    """
+
+    def __init__(self, keys=None):
+        self.runs = []
+        if keys is not None:
+            self.add(keys)
+
+    def add(self, keys):
+        run = np.unique(np.asarray(keys, dtype=np.uint64))
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.union1d(self.runs.pop(), run)
+        if len(run):
+            self.runs.append(run)
+
+    def contains(self, keys) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[pos] == keys
+        return found
+
+
+class SortedRuns:
+    """
+    Chaves gravadas em disco como runs ordenados (um por bloco), cada chave
+    com a posição da linha na tabela. duplicates() funde os runs por faixas
+    de chave: cada faixa lê só o trecho correspondente de cada run (arquivos
+    mapeados em memória), então nenhuma etapa carrega mais que ~um run.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.runs = []
+        self.rows = 0
+        self.largest = 0
+
+    def add(self, keys, positions):
+        if not len(keys):
+            return
+        order = np.argsort(keys, kind="stable")
+        path = self.directory / f"run-{len(self.runs):05d}"
+        np.save(path.with_suffix(".keys.npy"), np.asarray(keys, dtype=np.uint64)[order])
+        np.save(path.with_suffix(".pos.npy"), np.asarray(positions, dtype=np.int64)[order])
+        self.runs.append(path)
+        self.rows += len(keys)
+        self.largest = max(self.largest, len(keys))
+
+    def duplicates(self) -> np.ndarray:
+        """Posições repetidas (todas as ocorrências de uma chave, menos a primeira), ordenadas"""
+        if not self.runs:
+            return np.array([], dtype=np.int64)
+        keys = [np.load(p.with_suffix(".keys.npy"), mmap_mode="r") for p in self.runs]
+        positions = [np.load(p.with_suffix(".pos.npy"), mmap_mode="r") for p in self.runs]
+
+        # Limites das faixas: amostra de cada run, ~16 pontos por faixa
+        blocks = -(-self.rows // max(self.largest, 1))
+        stride = max(1, self.rows // (blocks * 16))
+        sample = np.sort(np.concatenate([k[::stride] for k in keys]))
+        bounds = np.unique(sample[len(sample) * np.arange(1, blocks) // blocks])
+        edges = [None, *bounds, None]
+
+        repeated = []
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            k_parts, p_parts = [], []
+            for k, p in zip(keys, positions):
+                start = 0 if lo is None else np.searchsorted(k, lo)
+                end = len(k) if hi is None else np.searchsorted(k, hi)
+                k_parts.append(np.asarray(k[start:end]))
+                p_parts.append(np.asarray(p[start:end]))
+            k, p = np.concatenate(k_parts), np.concatenate(p_parts)
+            order = np.lexsort((p, k))
+            k, p = k[order], p[order]
+            repeated.append(p[1:][k[1:] == k[:-1]])
+        return np.sort(np.concatenate(repeated))
+
+
+def iter_chunks(data, chunksize=DEFAULT_CHUNK):
+    """
+    Aceita um DataFrame (fatiado em blocos), um iterável de blocos ou uma
+    função que devolve os blocos (fonte que pode ser relida)
+    """
+    if callable(data):
+        data = data()
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start:start + chunksize]
+    else:
+        yield from data
+
+
+# ------------------------------
+# Validador
+# ------------------------------
+class ConstraintValidator:
+    """
+    Uso:
+        validator = ConstraintValidator(quarantine_dir=Path("data/quarantine"))
+        validator.add_parent("contas", contas)
+        results = validator.validate("transacoes", transacoes)
+    """
+
+    def __init__(self, primary_keys=None, foreign_keys=None, quarantine_dir=None):
+        self.primary_keys = primary_keys or PRIMARY_KEYS
+        self.foreign_keys = foreign_keys or FOREIGN_KEYS
+        self.quarantine_dir = quarantine_dir
+        self.parents = {}
+
+    def add_parent(self, table, data):
+        """Monta o índice da chave primária de uma tabela pai (uma única vez)"""
+        columns = self.primary_keys[table]
+        index = KeyIndex()
+        for chunk in iter_chunks(data):
+            hashes, invalid = key_hashes(chunk, columns)
+            index.add(hashes[~invalid])
+        self.parents[table] = index
+        return index
+
+    def validate(self, table, data) -> list:
+        """
+        Valida a chave primária e as chaves estrangeiras da tabela, bloco a bloco.
+        Pais ainda não indexados são ignorados (informados no resultado).
+        Com data = função que devolve os blocos (tabela relida do disco), a
+        unicidade da PK usa runs ordenados em disco (SortedRuns) e a tabela só
+        é relida uma segunda vez se houver chaves repetidas.
+        Retorna uma lista de resultados:
+          {"restricao", "tabela", "colunas", "violacoes", "exemplos"}
+        """
+        pk = self.primary_keys.get(table)
+        fks = [fk for fk in self.foreign_keys if fk[0] == table]
+
+        results = {}
+        if pk:
+            results["pk"] = self._result(f"PK {table}({', '.join(pk)})", table, pk)
+        for _, col, parent, parent_col in fks:
+            name = f"FK {table}.{col} → {parent}.{parent_col}"
+            results[col] = self._result(name, table, [col])
+            if parent not in self.parents:
+                results[col]["ignorada"] = f"índice de '{parent}' não carregado"
+
+        spill = bool(pk) and callable(data)
+        seen = KeyIndex()
+        writers = {}
+        try:
+            with tempfile.TemporaryDirectory(prefix=f"pk_{table}_") if spill else nullcontext() as tmp:
+                runs = SortedRuns(tmp) if spill else None
+                offset = 0
+                for chunk in iter_chunks(data):
+                    if pk:
+                        # nula ou não inteira, repetida dentro do bloco ou já vista em blocos anteriores
+                        hashes, bad = key_hashes(chunk, pk)
+                        ok = np.flatnonzero(~bad)
+                        if runs is not None:
+                            # repetições só aparecem na fusão dos runs, depois do último bloco
+                            runs.add(hashes[ok], offset + ok)
+                        else:
+                            bad[ok] = pd.Series(hashes[ok]).duplicated().to_numpy() | seen.contains(hashes[ok])
+                            seen.add(hashes[~bad])
+                        self._collect(results["pk"], chunk, bad, writers, f"{table}_pk")
+
+                    for _, col, parent, _ in fks:
+                        if parent not in self.parents:
+                            continue
+                        hashes, bad = key_hashes(chunk, [col])
+                        bad |= ~self.parents[parent].contains(hashes)
+                        self._collect(results[col], chunk, bad, writers, f"{table}_{col}")
+                    offset += len(chunk)
+
+                if runs is not None:
+                    repeated = runs.duplicates()
+                    if len(repeated):
+                        self._collect_positions(results["pk"], data, repeated, writers, f"{table}_pk")
+        except BaseException:
+            # Quarentena parcial descartada: a versão anterior não é substituída
+            for writer in writers.values():
+                writer.abort()
+            raise
+        for writer in writers.values():
+            writer.close()
+
+        out = list(results.values())
+        for r in out:
+            r["exemplos"] = pd.concat(r["exemplos"]).head(SAMPLE_ROWS) if r["exemplos"] else None
+        return out
+
+    @staticmethod
+    def _result(name, table, columns):
+        return {"restricao": name, "tabela": table, "colunas": columns, "violacoes": 0, "exemplos": []}
+
+    def _collect_positions(self, result, data, positions, writers, quarantine_name):
+        """Relê a tabela e coleta as linhas nas posições (ordenadas) informadas"""
+        offset = 0
+        for chunk in iter_chunks(data):
+            lo, hi = np.searchsorted(positions, [offset, offset + len(chunk)])
+            if lo < hi:
+                bad = np.zeros(len(chunk), dtype=bool)
+                bad[positions[lo:hi] - offset] = True
+                self._collect(result, chunk, bad, writers, quarantine_name)
+            offset += len(chunk)
+            if hi == len(positions):
+                break
+
+    def _collect(self, result, chunk, bad, writers, quarantine_name):
+        n = int(bad.sum())
+        if not n:
+            return
+        result["violacoes"] += n
+        rows = chunk[bad]
+        if sum(len(e) for e in result["exemplos"]) < SAMPLE_ROWS:
+            result["exemplos"].append(rows.head(SAMPLE_ROWS))
+        if self.quarantine_dir is not None:
+            if quarantine_name not in writers:
+                writers[quarantine_name] = TableWriter(self.quarantine_dir, quarantine_name)
+            writers[quarantine_name].write(rows)
+
+
+def print_results(results):
+    for r in results:
+        if "ignorada" in r:
+            print(f"⏭️ {r['restricao']}: ignorada ({r['ignorada']})")
+        elif r["violacoes"] == 0:
+            print(f"✅ {r['restricao']}: ok")
+        else:
+            print(f"⚠️ {r['restricao']}: {r['violacoes']} violação(ões). Exemplos:")
+            print(r["exemplos"])
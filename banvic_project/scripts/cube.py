@@ -0,0 +1,133 @@
+# ============================================================
+# cube.py
+# Cubo materializado de transações para dashboards.
+#  Dimensões: year_month, date_key, hour, weekday, cod_agencia,
+#             cod_colaborador, nome_transacao
+#  Medidas:   count, sum, min, max de valor_transacao
+#
+# É montado uma vez por execução (no 03) e gravado em Parquet. As perguntas
+# de dashboard (roll-up, fatias, top/bottom N) são respondidas a partir
+# dele, sem voltar às transações.
+#
+# Exemplo:
+#   cube = TransactionCube.load(FINAL_DIR)
+#   cube.slice(weekday=[5, 6]).rollup(["hour"])
+#   cube.top_n(["cod_colaborador"], n=3, per=["cod_agencia"])
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from storage import concat_frames, load_table, save_table
+
+CUBE_NAME = "cubo_transacoes"
+DIMENSIONS = ["year_month", "date_key", "hour", "weekday",
+              "cod_agencia", "cod_colaborador", "nome_transacao"]
+MEASURES = {"count": "sum", "sum": "sum", "min": "min", "max": "max"}
+TEXT_DIMENSIONS = ["year_month", "nome_transacao"]
+
+# Chaves de agência/colaborador ausentes (transação sem conta) ficam como -1
+MISSING_KEY = -1
+
+
+def build_cube(trans) -> pd.DataFrame:
+    """
+    Agrega transações já enriquecidas (cod_agencia, cod_colaborador) no grão do cubo.
+    Colunas usadas: year_month, date_key, data_transacao, cod_agencia,
+    cod_colaborador, nome_transacao, valor_transacao.
+    """
+    keys = pd.DataFrame({
+        "year_month": trans["year_month"].astype(str),
+        "date_key": trans["date_key"].fillna(MISSING_KEY).astype(np.int32),
+        "hour": trans["data_transacao"].dt.hour.fillna(MISSING_KEY).astype(np.int8),
+        "weekday": trans["data_transacao"].dt.weekday.fillna(MISSING_KEY).astype(np.int8),
+        "cod_agencia": trans["cod_agencia"].fillna(MISSING_KEY).astype(np.int32),
+        "cod_colaborador": trans["cod_colaborador"].fillna(MISSING_KEY).astype(np.int32),
+        "nome_transacao": trans["nome_transacao"].astype("category"),
+        "valor_transacao": trans["valor_transacao"],
+    })
+    cube = keys.groupby(DIMENSIONS, observed=True, dropna=False).agg(
+        count=("valor_transacao", "size"),
+        sum=("valor_transacao", "sum"),
+        min=("valor_transacao", "min"),
+        max=("valor_transacao", "max"),
+    ).reset_index()
+    cube["nome_transacao"] = cube["nome_transacao"].astype(str)
+    return cube
+
+def merge_cubes(parts) -> pd.DataFrame:
+    """
+    Junta cubos parciais (ex.: um por mês, montados em processos diferentes).
+    Células repetidas entre partes são reagregadas; a ordem final é a do build_cube.
+    """
+    cube = concat_frames([p for p in parts if p is not None])
+    for dim in TEXT_DIMENSIONS:
+        if isinstance(cube[dim].dtype, pd.CategoricalDtype):
+            # Categorias em ordem alfabética: o groupby sai na mesma ordem que sairia com texto
+            cube[dim] = cube[dim].cat.reorder_categories(sorted(cube[dim].cat.categories))
+    return cube.groupby(DIMENSIONS, observed=True, dropna=False).agg(MEASURES).reset_index()
+
+def compact_cube(cube) -> pd.DataFrame:
+    """Dimensões de texto como category: cubos parciais acumulados ocupam bem menos memória"""
+    return cube.astype({dim: "category" for dim in TEXT_DIMENSIONS})
+
+def canonical_cube(cube) -> pd.DataFrame:
+    """Volta as dimensões de texto de um cubo montado por merge_cubes para str"""
+    return cube.astype({dim: str for dim in TEXT_DIMENSIONS})
+
+
+class TransactionCube:
+    """API de consulta sobre o cubo materializado"""
+
+    def __init__(self, df):
+        self.df = df
+
+    @classmethod
+    def load(cls, directory, name=CUBE_NAME):
+        return cls(load_table(directory, name))
+
+    def save(self, directory, name=CUBE_NAME):
+        return save_table(self.df, directory, name, fmt="parquet")
+
+    def slice(self, **filters) -> "TransactionCube":
+        """Fatia o cubo: valor único, lista de valores ou função (ex.: date_key=lambda d: d >= 20230101)"""
+        mask = np.ones(len(self.df), dtype=bool)
+        for dim, value in filters.items():
+            col = self.df[dim]
+            if callable(value):
+                mask &= np.asarray(value(col), dtype=bool)
+            elif isinstance(value, (list, tuple, set, np.ndarray, pd.Index)):
+                mask &= col.isin(list(value)).to_numpy()
+            else:
+                mask &= (col == value).to_numpy()
+        return TransactionCube(self.df[mask])
+
+    def rollup(self, by, measures=None) -> pd.DataFrame:
+        """Agrega as medidas pelas dimensões pedidas; inclui a média (sum / count)"""
+        measures = measures or list(MEASURES)
+        out = self.df.groupby(list(by), observed=True).agg(
+            {m: MEASURES[m] for m in measures}
+        ).reset_index()
+        if "sum" in out and "count" in out:
+            out["mean"] = out["sum"] / out["count"]
+        return out
+
+    def top_n(self, by, n=None, measure="count", per=None, ascending=False) -> pd.DataFrame:
+        """
+        Maiores (ou menores, com ascending=True) N combinações de `by` pela medida.
+        per: dimensões de grupo para ranking dentro de cada grupo (ex.: por agência).
+        n=None devolve o ranking completo. A coluna 'ranking' começa em 1.
+        """
+        per = list(per or [])
+        out = self.rollup(per + list(by))
+        out = out.sort_values(per + [measure], ascending=[True] * len(per) + [ascending], kind="stable")
+        if per:
+            out["ranking"] = out.groupby(per, observed=True).cumcount() + 1
+        else:
+            out["ranking"] = np.arange(1, len(out) + 1)
+        if n is not None:
+            out = out[out["ranking"] <= n]
+        return out.reset_index(drop=True)
+
+    def bottom_n(self, by, n=None, measure="count", per=None) -> pd.DataFrame:
+        return self.top_n(by, n, measure, per, ascending=True)
@@ -0,0 +1,279 @@
+# ============================================================
+# customer360.py
+# Visão 360 do cliente: uma linha por cod_cliente com
+#  - faixa etária (data_nascimento) e tipo de cliente
+#  - contas: quantidade, saldos e cidade/UF da agência da conta mais antiga
+#  - transações: quantidade, valor e última data, no total e por tipo
+#  - propostas: quantidade, aprovadas, taxa de aprovação e valor financiado
+#
+# Cada tabela fato é agregada com uma única ordenação (np.lexsort) e somas
+# por trecho (np.add.reduceat), sem groupby sobre texto. As junções são
+# pela chave inteira cod_cliente com DimensionIndex (chave única: nenhuma
+# linha é multiplicada).
+#
+# Etapas:
+#   transaction_partials / proposal_partials → parciais por (mês, cliente);
+#                             persistidos pelo 03 e substituídos mês a mês
+#   customer_facts(parciais, clientes)      → atributos vindos das fatos,
+#                             só para os clientes pedidos (refresh incremental)
+#   customer_360(clientes, contas, agencias, fatos) / customer_segments
+#                           → exports
+#
+# A idade e a recência são calculadas na data mais recente dos dados (última
+# transação ou proposta), não na data de execução: o export é reprodutível.
+# ============================================================
+
+import unicodedata
+import re
+
+import numpy as np
+import pandas as pd
+
+from amortization import CONTRACTED_STATUS
+from joins import DimensionIndex
+from storage import concat_frames
+
+CUSTOMER_AGGREGATES = ["clientes_transacoes", "clientes_propostas", "clientes_fatos"]
+
+TRANS_KEYS = ["year_month", "cod_cliente", "nome_transacao"]
+TRANS_MEASURES = {"transacoes": "sum", "valor_transacoes": "sum", "ultima_transacao": "max"}
+PROP_KEYS = ["year_month", "cod_cliente"]
+PROP_MEASURES = {"propostas": "sum", "aprovadas": "sum", "valor_financiado": "sum", "ultima_proposta": "max"}
+
+AGE_BINS = [0, 18, 25, 35, 45, 60, np.inf]
+AGE_LABELS = ["0-17", "18-24", "25-34", "35-44", "45-59", "60+"]
+NO_AGE = "sem_data"
+TYPE_PREFIX = "tipo_"
+
+
+# ------------------------------
+# Agrupamento por ordenação
+# ------------------------------
+def _runs(keys, dates):
+    """
+    Ordena as linhas pelas chaves (na ordem dada) e, dentro de cada grupo, pela
+    data. Retorna (ordem, início de cada grupo, chaves de cada grupo).
+    """
+    order = np.lexsort((dates, *reversed(keys)))
+    ordered = [k[order] for k in keys]
+    change = np.zeros(len(order), dtype=bool)
+    change[:1] = True
+    for k in ordered:
+        change[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(change)
+    return order, starts, [k[starts] for k in ordered]
+
+def _sums(values, order, starts) -> np.ndarray:
+    return np.add.reduceat(values[order], starts) if len(starts) else np.zeros(0, dtype=values.dtype)
+
+def _last(dates, order, starts) -> np.ndarray:
+    """Última data de cada grupo (NaT só se o grupo inteiro não tiver data)"""
+    ends = np.append(starts[1:], len(order)) - 1
+    return dates[order][ends] if len(starts) else dates[:0]
+
+def _counts(order, starts) -> np.ndarray:
+    return np.diff(np.append(starts, len(order))).astype(np.int64)
+
+def _codes(series):
+    """Códigos em ordem alfabética dos valores (nulo = -1) e os valores distintos"""
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes.astype(np.int64), np.append(np.asarray(uniques, dtype=object), None)
+
+
+# ------------------------------
+# Parciais por mês
+# ------------------------------
+def transaction_partials(trans) -> pd.DataFrame:
+    """
+    Por (year_month, cod_cliente, nome_transacao): quantidade, valor e última
+    data. trans precisa de cod_cliente (resolvido pela conta); transações sem
+    cliente ficam de fora.
+    """
+    trans = trans[trans["cod_cliente"].notna().to_numpy()]
+    month_idx, months = _codes(trans["year_month"])
+    type_idx, types = _codes(trans["nome_transacao"])
+    clients = trans["cod_cliente"].to_numpy(dtype=np.int64)
+    dates = trans["data_transacao"].to_numpy(dtype="datetime64[ns]")
+
+    order, starts, (m, c, t) = _runs([month_idx, clients, type_idx], dates)
+    return pd.DataFrame({
+        "year_month": months[m],
+        "cod_cliente": c,
+        "nome_transacao": types[t],
+        "transacoes": _counts(order, starts),
+        "valor_transacoes": _sums(trans["valor_transacao"].fillna(0).to_numpy(dtype=float), order, starts),
+        "ultima_transacao": _last(dates, order, starts),
+    })
+
+def proposal_partials(prop) -> pd.DataFrame:
+    """Por (year_month, cod_cliente): propostas, aprovadas, valor financiado (aprovadas) e última data"""
+    prop = prop[prop["cod_cliente"].notna().to_numpy()]
+    month_idx, months = _codes(prop["year_month"])
+    clients = prop["cod_cliente"].to_numpy(dtype=np.int64)
+    dates = prop["data_entrada_proposta"].to_numpy(dtype="datetime64[ns]")
+    approved = (prop["status_proposta"] == CONTRACTED_STATUS).to_numpy()
+    financed = np.where(approved, prop["valor_financiamento"].fillna(0).to_numpy(dtype=float), 0.0)
+
+    order, starts, (m, c) = _runs([month_idx, clients], dates)
+    return pd.DataFrame({
+        "year_month": months[m],
+        "cod_cliente": c,
+        "propostas": _counts(order, starts),
+        "aprovadas": _sums(approved.astype(np.int64), order, starts),
+        "valor_financiado": _sums(financed, order, starts),
+        "ultima_proposta": _last(dates, order, starts),
+    })
+
+def merge_client_partials(parts, keys, measures) -> pd.DataFrame:
+    """Junta parciais de blocos diferentes (o mesmo mês pode estar em dois blocos)"""
+    merged = concat_frames([p for p in parts if p is not None])
+    return merged.groupby(keys, sort=True, dropna=False).agg(measures).reset_index()
+
+
+# ------------------------------
+# Atributos por cliente vindos das fatos
+# ------------------------------
+def _slug(text) -> str:
+    nfkd = unicodedata.normalize("NFKD", str(text))
+    no_accent = "".join(c for c in nfkd if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", "_", no_accent.lower()).strip("_")
+
+def _type_columns(facts, suffix="") -> list:
+    """Colunas por tipo de transação (tipo_<tipo>_qtd / tipo_<tipo>_valor), em ordem alfabética"""
+    return sorted(c for c in facts.columns if c.startswith(TYPE_PREFIX) and c.endswith(suffix))
+
+def _attach(base, features) -> pd.DataFrame:
+    """Atributos de `features` (uma linha por cod_cliente) nas linhas de base, na mesma ordem"""
+    index = DimensionIndex(features, "cod_cliente")
+    columns = [c for c in features.columns if c != "cod_cliente"]
+    attrs = index.take(index.find(base["cod_cliente"]), columns)
+    attrs.index = base.index
+    return pd.concat([base, attrs], axis=1)
+
+def _transaction_facts(partials) -> pd.DataFrame:
+    # Meses em ordem dentro de cada grupo: as somas não dependem da ordem de gravação dos parciais
+    partials = partials.sort_values(["cod_cliente", "nome_transacao", "year_month"], kind="stable")
+    by_type = partials.groupby(["cod_cliente", "nome_transacao"], sort=True, dropna=False).agg(TRANS_MEASURES)
+    totals = by_type.groupby(level="cod_cliente").agg(TRANS_MEASURES).rename(
+        columns={"transacoes": "qtd_transacoes"})
+
+    typed = by_type[by_type.index.get_level_values("nome_transacao").notna()]
+    wide = typed[["transacoes", "valor_transacoes"]].unstack("nome_transacao", fill_value=0)
+    wide.columns = [f"{TYPE_PREFIX}{_slug(tipo)}_{'qtd' if measure == 'transacoes' else 'valor'}"
+                    for measure, tipo in wide.columns]
+    return totals.join(wide).reset_index()
+
+def _proposal_facts(partials) -> pd.DataFrame:
+    partials = partials.sort_values(["cod_cliente", "year_month"], kind="stable")
+    facts = partials.groupby("cod_cliente", sort=True).agg(PROP_MEASURES).rename(
+        columns={"propostas": "qtd_propostas", "aprovadas": "qtd_aprovadas"})
+    return facts.reset_index()
+
+def customer_facts(trans_partials, prop_partials, clients=None) -> pd.DataFrame:
+    """
+    Uma linha por cliente com transações ou propostas. clients: só esses
+    clientes (refresh incremental); None = todos.
+    """
+    if clients is not None:
+        trans_partials = trans_partials[trans_partials["cod_cliente"].isin(clients).to_numpy()]
+        prop_partials = prop_partials[prop_partials["cod_cliente"].isin(clients).to_numpy()]
+    trans, prop = _transaction_facts(trans_partials), _proposal_facts(prop_partials)
+    base = pd.DataFrame({"cod_cliente": np.union1d(trans["cod_cliente"].to_numpy(dtype=np.int64),
+                                                   prop["cod_cliente"].to_numpy(dtype=np.int64))})
+    return canonical_facts(_attach(_attach(base, trans), prop))
+
+def canonical_facts(facts) -> pd.DataFrame:
+    """Contagens sem movimento = 0 e colunas por tipo em ordem fixa"""
+    counts = ["qtd_transacoes", "qtd_propostas", "qtd_aprovadas", *_type_columns(facts, "_qtd")]
+    sums = ["valor_transacoes", "valor_financiado", *_type_columns(facts, "_valor")]
+    facts = facts.astype({c: float for c in sums})
+    facts[counts] = facts[counts].fillna(0).astype(np.int64)
+    facts[sums] = facts[sums].fillna(0.0)
+    cols = ["cod_cliente", "qtd_transacoes", "valor_transacoes", "ultima_transacao",
+            "qtd_propostas", "qtd_aprovadas", "valor_financiado", "ultima_proposta", *_type_columns(facts)]
+    return facts[cols].sort_values("cod_cliente", ignore_index=True)
+
+def refresh_facts(stored, fresh, clients) -> pd.DataFrame:
+    """Substitui, na tabela de atributos persistida, as linhas dos clientes recalculados"""
+    stored = stored[~stored["cod_cliente"].isin(clients).to_numpy()]
+    return canonical_facts(concat_frames([stored, fresh]))
+
+
+# ------------------------------
+# Exports
+# ------------------------------
+def _age(birth, reference) -> np.ndarray:
+    """Idade em anos completos na data de referência"""
+    years = reference.year - birth.dt.year
+    before_birthday = (birth.dt.month > reference.month) | (
+        (birth.dt.month == reference.month) & (birth.dt.day > reference.day))
+    return (years - before_birthday.astype(int)).where(birth.notna())
+
+def _account_features(contas, agencias) -> pd.DataFrame:
+    """Por cliente: contas, saldos e a agência da conta mais antiga (uma ordenação)"""
+    contas = contas[contas["cod_cliente"].notna().to_numpy()]
+    opened = contas["data_abertura"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    # Sem data de abertura: vai para o fim do grupo
+    opened = np.where(contas["data_abertura"].isna().to_numpy(), np.iinfo(np.int64).max, opened)
+    clients = contas["cod_cliente"].to_numpy(dtype=np.int64)
+    order = np.lexsort((contas["num_conta"].to_numpy(dtype=np.int64), opened, clients))
+    starts = np.flatnonzero(np.r_[True, clients[order][1:] != clients[order][:-1]]) if len(order) else order
+
+    accounts = pd.DataFrame({
+        "cod_cliente": clients[order][starts],
+        "qtd_contas": _counts(order, starts),
+        "saldo_total": _sums(contas["saldo_total"].fillna(0).to_numpy(dtype=float), order, starts),
+        "saldo_disponivel": _sums(contas["saldo_disponivel"].fillna(0).to_numpy(dtype=float), order, starts),
+        "cod_agencia": contas["cod_agencia"].to_numpy()[order][starts],
+    })
+    index = DimensionIndex(agencias, "cod_agencia")
+    attrs = index.take(index.find(accounts["cod_agencia"]), ["cidade", "uf"])
+    return pd.concat([accounts, attrs], axis=1)
+
+def reference_date(facts):
+    """Data mais recente dos dados (última transação ou proposta)"""
+    return pd.Series([facts["ultima_transacao"].max(), facts["ultima_proposta"].max()]).max()
+
+def customer_360(clientes, contas, agencias, facts) -> pd.DataFrame:
+    """Tabela de atributos: uma linha por cliente cadastrado, na ordem de cod_cliente"""
+    reference = reference_date(facts)
+    out = clientes[["cod_cliente", "tipo_cliente"]].copy()
+    out["idade"] = _age(clientes["data_nascimento"], reference) if pd.notna(reference) else np.nan
+    faixa = pd.cut(out["idade"], AGE_BINS, right=False, labels=AGE_LABELS)
+    out["faixa_etaria"] = faixa.cat.add_categories(NO_AGE).fillna(NO_AGE)
+
+    out = _attach(out, _account_features(contas, agencias))
+    out["qtd_contas"] = out["qtd_contas"].fillna(0).astype(np.int64)
+    out["cod_agencia"] = out["cod_agencia"].astype("Int64")
+    out = _attach(out, facts)
+    # Clientes sem conta, transação ou proposta: contagens e valores zerados
+    for col in ["qtd_transacoes", "qtd_propostas", "qtd_aprovadas", *_type_columns(facts, "_qtd")]:
+        out[col] = out[col].fillna(0).astype(np.int64)
+    for col in ["saldo_total", "saldo_disponivel", "valor_transacoes", "valor_financiado",
+                *_type_columns(facts, "_valor")]:
+        out[col] = out[col].fillna(0.0)
+
+    out["dias_sem_transacao"] = (reference - out["ultima_transacao"]).dt.days
+    out["taxa_aprovacao"] = out["qtd_aprovadas"] / out["qtd_propostas"].where(out["qtd_propostas"] > 0)
+    cols = ["cod_cliente", "tipo_cliente", "idade", "faixa_etaria", "cidade", "uf", "cod_agencia", "qtd_contas",
+            "saldo_total", "saldo_disponivel", "qtd_transacoes", "valor_transacoes", "ultima_transacao",
+            "dias_sem_transacao", "qtd_propostas", "qtd_aprovadas", "taxa_aprovacao", "valor_financiado",
+            "ultima_proposta", *_type_columns(facts)]
+    return out[cols].sort_values("cod_cliente", ignore_index=True)
+
+def customer_segments(c360) -> pd.DataFrame:
+    """Clientes por cidade e faixa etária: uso de crédito, transações e saldos"""
+    seg = c360.assign(com_proposta=(c360["qtd_propostas"] > 0).astype(np.int64)).groupby(
+        ["cidade", "uf", "faixa_etaria"], observed=True, dropna=False, sort=True).agg(
+        clientes=("cod_cliente", "size"),
+        clientes_com_proposta=("com_proposta", "sum"),
+        qtd_propostas=("qtd_propostas", "sum"),
+        qtd_aprovadas=("qtd_aprovadas", "sum"),
+        valor_financiado=("valor_financiado", "sum"),
+        qtd_transacoes=("qtd_transacoes", "sum"),
+        saldo_medio=("saldo_total", "mean"),
+    ).reset_index()
+    seg["taxa_aprovacao"] = seg["qtd_aprovadas"] / seg["qtd_propostas"].where(seg["qtd_propostas"] > 0)
+    seg["financiado_por_cliente"] = seg["valor_financiado"] / seg["clientes"]
+    seg["transacoes_por_cliente"] = seg["qtd_transacoes"] / seg["clientes"]
+    return seg
@@ -0,0 +1,310 @@
+# ============================================================
+# dag.py
+# Executor de tarefas com dependências (DAG) e cache por hash.
+#
+#  - A chave de cada tarefa é o hash de: nome, parâmetros, código-fonte dos
+#    módulos declarados, conteúdo dos arquivos de origem e chaves das
+#    tarefas de que depende. Mudou algo a montante → muda a chave.
+#  - Tarefa com a mesma chave da última execução bem-sucedida (e com as
+#    saídas ainda no disco) é pulada; o resultado guardado é reaproveitado.
+#  - Tarefas independentes rodam em paralelo (threads); a saída de console
+#    de cada tarefa é acumulada e exibida inteira quando ela termina.
+#  - Falha em uma tarefa cancela só as que dependem dela.
+#  - map_tables: a mesma ideia para etapas internas do 01/02 (uma função
+#    por tabela em threads, saída de console na ordem das tabelas).
+#
+# Uso:
+#   dag = DAG(cache_file)
+#   dag.add(Task("limpar:contas", clean_table, args=("contas",), deps=["ingestao:contas"]))
+#   results = dag.run(workers=4)
+# ============================================================
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import hashlib
+import inspect
+import io
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+HASH_BLOCK = 8 * 1024 * 1024
+
+# Threads por etapa do 01/02 (leituras e gravações são limitadas por I/O)
+IO_WORKERS_ENV = "BANVIC_IO_WORKERS"
+DEFAULT_IO_WORKERS = int(os.environ.get(IO_WORKERS_ENV, 4))
+
+
+# ------------------------------
+# Hashes
+# ------------------------------
+def _digest(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+def file_hash(path: Path, memo: dict) -> str:
+    """
+    Hash do conteúdo do arquivo (ou de todos os arquivos de uma pasta).
+    memo guarda o hash por (tamanho, mtime): arquivos não tocados não são relidos.
+    """
+    path = Path(path)
+    if not path.exists():
+        return "ausente"
+    if path.is_dir():
+        return _digest([(str(p.relative_to(path)), file_hash(p, memo))
+                        for p in sorted(path.rglob("*")) if p.is_file()])
+
+    stat = path.stat()
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+    cached = memo.get(str(path))
+    if cached and cached["stamp"] == stamp:
+        return cached["hash"]
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            h.update(block)
+    memo[str(path)] = {"stamp": stamp, "hash": h.hexdigest()}
+    return memo[str(path)]["hash"]
+
+
+# ------------------------------
+# Saída de console por tarefa
+# ------------------------------
+class _ThreadOutput(io.TextIOBase):
+    """Substitui sys.stdout: cada thread de tarefa escreve no próprio buffer"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def map_tables(func, names, workers=DEFAULT_IO_WORKERS, initializer=None, initargs=()):
+    """
+    Executa func(nome) para cada tabela em até `workers` threads.
+    A saída de console de cada tabela é exibida inteira, na ordem de `names`
+    (cada uma assim que ela e as anteriores terminam). Uma falha não
+    interrompe as demais tabelas: é exibida com o traceback e devolvida.
+    Retorna ({nome: resultado} das que deram certo, {nome: traceback}).
+    """
+    names = list(names)
+    stdout = sys.stdout
+    # Dentro de uma tarefa do DAG a saída já é por thread: a desta tarefa recebe tudo no fim
+    output = stdout if isinstance(stdout, _ThreadOutput) else _ThreadOutput(stdout)
+
+    def run(name):
+        buffer = io.StringIO()
+        output.local.buffer = buffer
+        try:
+            return func(name), None, buffer.getvalue()
+        except Exception:
+            return None, traceback.format_exc(), buffer.getvalue()
+        finally:
+            output.local.buffer = None
+
+    results, errors = {}, {}
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names) or 1)),
+                                initializer=initializer, initargs=initargs) as pool:
+            futures = [pool.submit(run, name) for name in names]
+            for name, future in zip(names, futures):
+                result, error, text = future.result()
+                stdout.write(text)
+                if error:
+                    errors[name] = error
+                    print(f"❌ {name} falhou:\n{error}", file=stdout)
+                else:
+                    results[name] = result
+    finally:
+        sys.stdout = stdout
+    return results, errors
+
+
+# ------------------------------
+# Tarefas e DAG
+# ------------------------------
+class Task:
+    """
+    func(*args, upstream=...) é chamada com os resultados das dependências
+    (dicionário nome → resultado) se aceitar o parâmetro `upstream`.
+    sources: arquivos/pastas de entrada cujo conteúdo entra na chave.
+    code: arquivos de código cujo conteúdo entra na chave.
+    outputs: caminhos (ou funções que devolvem o caminho) que precisam existir
+             para o cache valer; FileNotFoundError conta como saída ausente.
+    O resultado deve ser pequeno e serializável em JSON (fica no cache).
+    """
+
+    def __init__(self, name, func, args=(), deps=(), sources=(), code=(), outputs=(), params=None):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.deps = list(deps)
+        self.sources = [Path(p) for p in sources]
+        self.code = [Path(p) for p in code]
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+    def call(self, upstream):
+        if "upstream" in inspect.signature(self.func).parameters:
+            return self.func(*self.args, upstream=upstream)
+        return self.func(*self.args)
+
+
+class DAG:
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        self.tasks = {}
+        self.cache = self._load_cache()
+        self._lock = threading.Lock()
+
+    def add(self, task):
+        if task.name in self.tasks:
+            raise ValueError(f"Tarefa duplicada: {task.name}")
+        self.tasks[task.name] = task
+        return task
+
+    # ---- cache
+    def _load_cache(self):
+        if not self.cache_file.exists():
+            return {"tarefas": {}, "arquivos": {}}
+        with open(self.cache_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_cache(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f, ensure_ascii=False, indent=2, default=str)
+        tmp.replace(self.cache_file)
+
+    # ---- ordem e chaves
+    def order(self, targets=None) -> list:
+        """Ordem topológica das tarefas necessárias para os alvos (todas se None)"""
+        order, state = [], {}
+
+        def visit(name):
+            if name not in self.tasks:
+                raise KeyError(f"Dependência desconhecida: {name}")
+            if state.get(name) == "feito":
+                return
+            if state.get(name) == "visitando":
+                raise ValueError(f"Ciclo no DAG envolvendo '{name}'")
+            state[name] = "visitando"
+            for dep in self.tasks[name].deps:
+                visit(dep)
+            state[name] = "feito"
+            order.append(name)
+
+        for name in targets or self.tasks:
+            visit(name)
+        return order
+
+    def task_keys(self, order) -> dict:
+        memo = self.cache["arquivos"]
+        code_hashes = {}
+        keys = {}
+        for name in order:
+            task = self.tasks[name]
+            for path in task.code:
+                if path not in code_hashes:
+                    code_hashes[path] = file_hash(path, memo)
+            keys[name] = _digest(
+                name, task.args, task.params,
+                [code_hashes[p] for p in task.code],
+                [(str(p), file_hash(p, memo)) for p in task.sources],
+                [keys[d] for d in task.deps],
+            )
+        return keys
+
+    def is_cached(self, name, key):
+        entry = self.cache["tarefas"].get(name)
+        if not entry or entry["chave"] != key:
+            return False
+        try:
+            return all(Path(out() if callable(out) else out).exists() for out in self.tasks[name].outputs)
+        except FileNotFoundError:
+            return False
+
+    # ---- execução
+    def _execute(self, name, upstream):
+        buffer = io.StringIO()
+        sys.stdout.local.buffer = buffer
+        start = time.perf_counter()
+        try:
+            result = self.tasks[name].call(upstream)
+            return result, None, buffer.getvalue(), time.perf_counter() - start
+        except Exception:
+            return None, traceback.format_exc(), buffer.getvalue(), time.perf_counter() - start
+        finally:
+            sys.stdout.local.buffer = None
+
+    def run(self, targets=None, workers=4, force=False) -> dict:
+        """
+        Executa as tarefas necessárias. Retorna {tarefa: status}, com status
+        'executada', 'cache', 'falhou' ou 'cancelada'.
+        """
+        order = self.order(targets)
+        keys = self.task_keys(order)
+        status, results = {}, {}
+        for name in order:
+            if not force and self.is_cached(name, keys[name]):
+                status[name] = "cache"
+                results[name] = self.cache["tarefas"][name].get("resultado")
+
+        pending = [n for n in order if n not in status]
+        print(f"🧭 DAG: {len(order)} tarefa(s), {len(pending)} a executar, "
+              f"{len(order) - len(pending)} do cache")
+
+        stdout = sys.stdout
+        sys.stdout = _ThreadOutput(stdout)
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                while pending or running:
+                    # Dependência que falhou → cancela; dependências prontas → submete
+                    for name in list(pending):
+                        deps = self.tasks[name].deps
+                        if any(status.get(d) in ("falhou", "cancelada") for d in deps):
+                            status[name] = "cancelada"
+                            pending.remove(name)
+                            print(f"⏭️ {name}: cancelada (dependência falhou)", file=stdout)
+                        elif all(status.get(d) in ("executada", "cache") for d in deps):
+                            upstream = {d: results.get(d) for d in deps}
+                            running[pool.submit(self._execute, name, upstream)] = name
+                            pending.remove(name)
+                    if not running:
+                        continue
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        result, error, output, elapsed = future.result()
+                        print(f"\n── {name} ({elapsed:.2f}s) " + "─" * 30, file=stdout)
+                        stdout.write(output)
+                        if error:
+                            status[name] = "falhou"
+                            print(f"❌ {name} falhou:\n{error}", file=stdout)
+                            continue
+                        status[name] = "executada"
+                        results[name] = result
+                        with self._lock:
+                            self.cache["tarefas"][name] = {"chave": keys[name], "resultado": result,
+                                                           "segundos": round(elapsed, 3)}
+                            self._save_cache()
+        finally:
+            sys.stdout = stdout
+            self._save_cache()
+        return status
@@ -0,0 +1,98 @@
+# ============================================================
+# date_parsing.py
+# Conversão das colunas de data dos extratos para datetime.
+# Os extratos trazem poucos formatos conhecidos (ver gerar_data em
+# scriptsdatafake/generate_fake_data.py):
+#   2023-12-12
+#   2023-12-12 14:44:50 UTC
+#   2023-12-12 14:44:50.000000 UTC
+#
+#  - Cada valor distinto é convertido uma única vez (datas se repetem muito)
+#  - Os formatos presentes são detectados por coluna e cada um é convertido
+#    com formato explícito; só o que sobrar passa pela inferência do pandas
+#  - O relatório traz nulos, formatos encontrados e exemplos inválidos
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+# (nome, regex do valor inteiro, formato strptime)
+KNOWN_FORMATS = [
+    ("data", r"\d{4}-\d{2}-\d{2}", "%Y-%m-%d"),
+    ("data_hora_utc", r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} UTC", "%Y-%m-%d %H:%M:%S UTC"),
+    ("data_hora_micro_utc", r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{1,6} UTC", "%Y-%m-%d %H:%M:%S.%f UTC"),
+    ("data_hora", r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", "%Y-%m-%d %H:%M:%S"),
+    ("data_hora_micro", r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{1,6}", "%Y-%m-%d %H:%M:%S.%f"),
+]
+INVALID_SAMPLES = 5
+
+
+def _parse_unique(values: pd.Series, allowed=None):
+    """Converte valores distintos (strings) detectando o formato de cada um"""
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    formats = {}
+    pending = np.ones(len(values), dtype=bool)
+
+    for name, pattern, fmt in KNOWN_FORMATS:
+        if allowed is not None and name not in allowed:
+            continue
+        match = pending & values.str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+        if match.any():
+            parsed[match] = pd.to_datetime(values[match], format=fmt, errors="coerce")
+            formats[name] = int(match.sum())
+            pending &= ~match
+
+    # Formatos inesperados: inferência do pandas, valor a valor
+    if pending.any():
+        stripped = values[pending].str.replace(r"(\.\d+)?\s?UTC$", "", regex=True)
+        parsed[pending] = pd.to_datetime(stripped, errors="coerce", format="mixed")
+        formats["outros"] = int(pending.sum())
+    return parsed, formats
+
+def parse_timestamps(series: pd.Series, formats=None):
+    """
+    Converte uma coluna de datas para datetime64 sem fuso.
+    formats: nomes de KNOWN_FORMATS esperados na coluna (None = todos); valores
+    em outros formatos vão para a inferência e aparecem como "outros".
+    Retorna (série convertida, relatório).
+    relatório = {"nulos": int, "formatos": {formato: nº de valores distintos},
+                 "invalidos": int, "exemplos_invalidos": [valores originais]}
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        return series, {"nulos": int(series.isna().sum()), "formatos": {"datetime": 1},
+                        "invalidos": 0, "exemplos_invalidos": []}
+
+    # Memoização: converte cada valor distinto uma vez e espalha pelos códigos
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    parsed_uniques, found = _parse_unique(uniques, formats)
+
+    values = parsed_uniques.to_numpy(dtype="datetime64[ns]")
+    out = np.where(codes >= 0, values[np.maximum(codes, 0)], np.datetime64("NaT"))
+    result = pd.Series(out, index=series.index, name=series.name, dtype="datetime64[ns]")
+
+    bad = parsed_uniques.isna().to_numpy()
+    invalid_codes = np.flatnonzero(bad)
+    invalid_rows = int(np.isin(codes, invalid_codes).sum()) if len(invalid_codes) else 0
+    report = {
+        "nulos": int(result.isna().sum()),
+        "formatos": found,
+        "invalidos": invalid_rows,
+        "exemplos_invalidos": uniques[bad].head(INVALID_SAMPLES).tolist(),
+    }
+    return result, report
+
+def merge_reports(total, report):
+    """Acumula relatórios de parse_timestamps de blocos da mesma coluna (modo streaming)"""
+    if total is None:
+        return {**report, "formatos": dict(report["formatos"]),
+                "exemplos_invalidos": list(report["exemplos_invalidos"])}
+    total["nulos"] += report["nulos"]
+    total["invalidos"] += report["invalidos"]
+    for name, n in report["formatos"].items():
+        total["formatos"][name] = total["formatos"].get(name, 0) + n
+    examples = total["exemplos_invalidos"]
+    examples += [v for v in report["exemplos_invalidos"] if v not in examples][:INVALID_SAMPLES - len(examples)]
+    return total
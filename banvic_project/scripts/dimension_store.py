@@ -0,0 +1,259 @@
+# ============================================================
+# dimension_store.py
+# Repositório persistido das dimensões (contas, agências, colaboradores,
+# colab_agencia, clientes) em data/state/dimensoes/:
+#  - Cada coluna é um array .npy aberto por memory-map (somente leitura):
+#    abrir a dimensão não lê nada do disco, e processos diferentes
+#    compartilham as mesmas páginas pelo SO
+#  - Textos e category viram códigos inteiros + dicionário (JSON)
+#  - A chave primária inteira ganha um índice persistido chave → linha
+#    (denso ou por busca binária, como em joins.DimensionIndex)
+#  - Cada tabela é regravada só quando o arquivo de origem em
+#    data/processed/ muda (hash do conteúdo; ver dag.file_hash)
+#
+# Versões ficam em pastas <tabela>/<versão>/ e o arquivo ATUAL aponta a
+# vigente: quem já abriu a versão anterior continua lendo-a até o fim.
+#
+# Exemplo (03 ou notebook):
+#   store = DimensionStore()
+#   store.refresh(PROCESSED_DIR, ["contas", "agencias"])
+#   contas = store["contas"]                        # índice de joins.DimensionIndex
+#   attrs = contas.take(contas.find(trans["num_conta"]), ["cod_agencia"])
+#   engine = StarJoin().add_index("contas", contas)
+# ============================================================
+
+from pathlib import Path
+import hashlib
+import json
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+from compaction import compact_frame
+from dag import file_hash
+from joins import DimensionIndex
+from paths import STATE_DIR
+from schema import primary_keys
+from storage import find_table, load_table
+
+STORE_DIR = STATE_DIR / "dimensoes"
+STORE_TABLES = ["contas", "agencias", "colaboradores", "colab_agencia", "clientes"]
+# Sobe quando o layout gravado muda: força a regravação de todas as tabelas
+FORMAT_VERSION = 1
+
+CURRENT_FILE = "ATUAL"
+META_FILE = "_meta.json"
+HASHES_FILE = "_hashes.json"
+POSITIONS_FILE = "_posicoes.npy"
+ORDER_FILE = "_ordem.npy"
+SORTED_KEYS_FILE = "_chaves.npy"
+
+# Threads do DAG atualizando o mesmo repositório
+_lock = threading.Lock()
+
+
+# ------------------------------
+# Gravação
+# ------------------------------
+def _version(source_hash, key) -> str:
+    """Versão gravada: muda com o conteúdo da origem, a chave indexada ou o layout"""
+    return hashlib.blake2b(f"{FORMAT_VERSION}:{key}:{source_hash}".encode("utf-8"), digest_size=8).hexdigest()
+
+def _dictionary(values) -> list:
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+def _write_column(s: pd.Series, directory: Path) -> dict:
+    """Grava uma coluna e devolve sua descrição no _meta.json"""
+    col = s.name
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        np.save(directory / f"{col}.npy", s.cat.codes.to_numpy(dtype=np.int32))
+        return {"tipo": "category", "dicionario": _dictionary(s.cat.categories), "ordenada": bool(s.cat.ordered)}
+    if pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+        codes, uniques = pd.factorize(s)
+        np.save(directory / f"{col}.npy", codes.astype(np.int32))
+        return {"tipo": "texto", "dicionario": _dictionary(uniques)}
+    if pd.api.types.is_extension_array_dtype(s) and s.dtype.kind in "biuf":
+        # Anuláveis (Int*, boolean): valores + máscara de nulos
+        np.save(directory / f"{col}.npy", s.to_numpy(dtype=s.dtype.numpy_dtype, na_value=0))
+        np.save(directory / f"{col}.nulos.npy", s.isna().to_numpy())
+        return {"tipo": "anulavel", "dtype": str(s.dtype)}
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biufmM":
+        np.save(directory / f"{col}.npy", s.to_numpy())
+        return {"tipo": "numpy"}
+    raise TypeError(f"Coluna '{col}' com tipo sem suporte no repositório de dimensões: {s.dtype}")
+
+def _write_index(df, key, directory: Path) -> dict:
+    # Mesmo índice (e mesmas validações) das junções em memória
+    index = DimensionIndex(df, key)
+    if index.dense:
+        np.save(directory / POSITIONS_FILE, index.positions)
+    else:
+        np.save(directory / ORDER_FILE, index.order)
+        np.save(directory / SORTED_KEYS_FILE, index.sorted_keys)
+    return {"chave": key, "denso": bool(index.dense)}
+
+def write_dimension(df, directory, key=None) -> Path:
+    """Grava o DataFrame como colunas .npy (+ índice da chave) na pasta indicada"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    df = df.reset_index(drop=True)
+    meta = {
+        "formato": FORMAT_VERSION,
+        "linhas": len(df),
+        "colunas": {col: _write_column(df[col], directory) for col in df.columns},
+        "indice": _write_index(df, key, directory) if key else None,
+    }
+    with open(directory / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return directory
+
+
+# ------------------------------
+# Leitura
+# ------------------------------
+class MappedDimension(DimensionIndex):
+    """
+    Dimensão aberta por memory-map. Mesma interface de joins.DimensionIndex
+    (find/take), sem montar o índice: ele também vem do disco.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.rows = meta["linhas"]
+        self.specs = meta["colunas"]
+        self.columns = list(self.specs)
+        self.key = meta["indice"]["chave"] if meta["indice"] else None
+        self.dense = bool(meta["indice"] and meta["indice"]["denso"])
+        self._arrays = {}
+
+        if self.key is not None:
+            if self.dense:
+                self.positions = self._load(POSITIONS_FILE)
+            else:
+                self.order = self._load(ORDER_FILE)
+                self.sorted_keys = self._load(SORTED_KEYS_FILE)
+
+    def __len__(self):
+        return self.rows
+
+    def _load(self, filename) -> np.ndarray:
+        # np.asarray tira a subclasse memmap: as fatias continuam apontando para o mapeamento
+        return np.asarray(np.load(self.directory / filename, mmap_mode="r"))
+
+    def _array(self, col) -> np.ndarray:
+        if col not in self._arrays:
+            if col not in self.specs:
+                raise KeyError(f"Coluna '{col}' fora do repositório ({self.directory.parent.name})")
+            self._arrays[col] = self._load(f"{col}.npy")
+        return self._arrays[col]
+
+    def find(self, values) -> np.ndarray:
+        if self.key is None:
+            raise ValueError(f"Dimensão {self.directory.parent.name} sem chave única indexada")
+        return super().find(values)
+
+    @staticmethod
+    def _pick(values, positions, fill=None) -> np.ndarray:
+        # Coluna inteira: cópia em memória; senão só as linhas pedidas
+        if positions is None:
+            return np.array(values)
+        return take(values, positions, allow_fill=True, fill_value=fill)
+
+    def _decode(self, col, positions=None):
+        """Coluna inteira (positions=None) ou só as linhas indicadas (-1 = nulo)"""
+        spec = self.specs[col]
+        values = self._array(col)
+        if spec["tipo"] == "category":
+            dtype = pd.CategoricalDtype(spec["dicionario"], ordered=spec["ordenada"])
+            return pd.Categorical.from_codes(self._pick(values, positions, -1), dtype=dtype)
+        if spec["tipo"] == "texto":
+            # Código -1 (nulo ou posição inexistente) cai no NaN do fim do dicionário
+            dictionary = np.array(spec["dicionario"] + [np.nan], dtype=object)
+            return dictionary[self._pick(values, positions, -1)]
+        if spec["tipo"] == "anulavel":
+            array = pd.array(np.array(values), dtype=spec["dtype"])
+            array[self._load(f"{col}.nulos.npy")] = pd.NA
+            return array if positions is None else take(array, positions, allow_fill=True)
+        return self._pick(values, positions)
+
+    def take(self, positions, columns) -> pd.DataFrame:
+        """Atributos das linhas indicadas, lidos direto do mapeamento; posições -1 viram nulos"""
+        return pd.DataFrame({col: self._decode(col, positions) for col in columns},
+                            index=pd.RangeIndex(len(positions)))
+
+    def frame(self, columns=None) -> pd.DataFrame:
+        """Cópia em memória da dimensão (ou das colunas pedidas), nos tipos compactos"""
+        return pd.DataFrame({col: self._decode(col) for col in columns or self.columns},
+                            index=pd.RangeIndex(self.rows))
+
+
+class DimensionStore:
+    """Dimensões persistidas em colunas mapeadas, regravadas só quando a origem muda"""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self._open = {}
+
+    def _current(self, name):
+        path = self.root / name / CURRENT_FILE
+        return path.read_text(encoding="utf-8").strip() if path.exists() else None
+
+    def __getitem__(self, name) -> MappedDimension:
+        version = self._current(name)
+        if version is None:
+            raise FileNotFoundError(f"Dimensão '{name}' ausente do repositório {self.root} (rode refresh)")
+        if self._open.get(name, (None,))[0] != version:
+            self._open[name] = (version, MappedDimension(self.root / name / version))
+        return self._open[name][1]
+
+    def _publish(self, name, version, df, key):
+        table_dir = self.root / name
+        tmp = table_dir / f"{version}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        write_dimension(df, tmp, key)
+        shutil.rmtree(table_dir / version, ignore_errors=True)
+        tmp.replace(table_dir / version)
+
+        # ATUAL trocado por rename: leitores veem a versão antiga ou a nova, nunca meia
+        pointer = table_dir / f"{CURRENT_FILE}.tmp"
+        pointer.write_text(version, encoding="utf-8")
+        pointer.replace(table_dir / CURRENT_FILE)
+        # Versões antigas: arquivos já mapeados continuam válidos depois de apagados
+        for old in table_dir.iterdir():
+            if old.is_dir() and old.name != version:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def refresh(self, source_dir, names=STORE_TABLES) -> list:
+        """
+        Regrava as tabelas cuja origem (data/processed/) mudou desde a última
+        gravação. Devolve as tabelas regravadas.
+        """
+        keys = primary_keys()
+        rebuilt = []
+        with _lock:
+            memo_path = self.root / HASHES_FILE
+            memo = json.loads(memo_path.read_text(encoding="utf-8")) if memo_path.exists() else {}
+            for name in names:
+                key = keys[name][0] if len(keys[name]) == 1 else None
+                version = _version(file_hash(find_table(source_dir, name), memo), key)
+                if self._current(name) == version:
+                    continue
+                df = compact_frame(load_table(source_dir, name), name)
+                self._publish(name, version, df, key)
+                rebuilt.append(name)
+
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = memo_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(memo, indent=2), encoding="utf-8")
+            tmp.replace(memo_path)
+
+        if rebuilt:
+            print(f"🗄️ Dimensões regravadas no repositório mapeado: {', '.join(rebuilt)}")
+        else:
+            print(f"♻️ Dimensões reaproveitadas do repositório mapeado ({len(names)} tabelas, origem inalterada)")
+        return rebuilt
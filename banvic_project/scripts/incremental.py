@@ -0,0 +1,130 @@
+# ============================================================
+# incremental.py
+# Estado do processamento incremental (data/state/):
+#  - Marca d'água (high-water mark) por tabela fato:
+#      transacoes.data_transacao e propostas.data_entrada_proposta
+#  - Meses alterados pelo 02 e ainda não consumidos pelo 03
+#
+# Regras:
+#  - Linhas com data > marca d'água são novas e viram uma nova parte do mês
+#  - Linhas com data <= marca d'água cuja chave ainda não foi processada são
+#    atrasadas: o mês inteiro delas é reprocessado e reescrito
+#  - As chaves já processadas só são lidas do disco nos meses em que o
+#    manifesto (linhas e min/max da chave) não basta para decidir
+# ============================================================
+
+from pathlib import Path
+import json
+
+import pandas as pd
+
+from schema import fact_tables, primary_keys
+from storage import month_partition_keys
+
+STATE_FILE = "incremental_state.json"
+
+# Tabelas fato processadas de forma incremental: coluna de data e chave primária
+INCREMENTAL_TABLES = {
+    name: {"date_col": date_col, "key_col": primary_keys()[name][0]}
+    for name, date_col in fact_tables().items()
+}
+
+
+# ------------------------------
+# Estado persistido
+# ------------------------------
+def load_state(state_dir: Path) -> dict:
+    path = Path(state_dir) / STATE_FILE
+    if not path.exists():
+        return {"watermarks": {}, "pending_months": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state_dir: Path, state: dict):
+    path = Path(state_dir) / STATE_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Grava em arquivo temporário e renomeia: uma falha no meio não corrompe o estado
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+def get_watermark(state: dict, table: str):
+    value = state["watermarks"].get(table)
+    return pd.Timestamp(value) if value else None
+
+def set_watermark(state: dict, table: str, latest):
+    """Avança a marca d'água para a maior data vista (nunca retrocede)"""
+    current = get_watermark(state, table)
+    if pd.isna(latest):
+        return
+    if current is None or latest > current:
+        state["watermarks"][table] = latest.isoformat()
+
+def add_pending_months(state: dict, table: str, months):
+    """Acumula meses alterados até o 03 consumi-los"""
+    pending = set(state["pending_months"].get(table, [])) | set(months)
+    state["pending_months"][table] = sorted(pending)
+
+def pop_pending_months(state: dict, table: str) -> list:
+    return state["pending_months"].pop(table, [])
+
+
+# ------------------------------
+# Seleção do incremento
+# ------------------------------
+def months_to_check(df, date_col, key_col, watermark, manifest):
+    """
+    Usa o manifesto da tabela processada para decidir, mês a mês, se as linhas
+    com data <= marca d'água já foram processadas, sem ler as chaves do disco.
+    `df[date_col]` já deve estar convertido para datetime.
+
+    Retorna (chaves_conhecidas, meses_a_ler):
+     - mês sem partição ou com chave fora do min/max gravado: tem atrasados
+       (as chaves ficam fora de chaves_conhecidas e o mês é reescrito)
+     - mesmas chaves distintas, mínimo e máximo do manifesto: nada atrasado
+       (as bases intermediárias só crescem, então as chaves são as mesmas)
+     - demais meses (ou tabela sem manifesto): chaves lidas da partição
+    """
+    old = df[~(df[date_col] > watermark)]
+    months = month_partition_keys(old[date_col])
+    if manifest is None:
+        return old[key_col].iloc[0:0], sorted(months.unique())
+
+    known, to_read = [], []
+    for month, keys in old[key_col].groupby(months.to_numpy(), sort=True):
+        stats = manifest["particoes"].get(month)
+        if stats is None:
+            continue
+        bounds = stats["colunas"].get(key_col)
+        if bounds is None:
+            to_read.append(month)
+        elif keys.min() < bounds["min"] or keys.max() > bounds["max"]:
+            continue
+        elif (keys.nunique() == stats["linhas"]
+              and keys.min() == bounds["min"] and keys.max() == bounds["max"]):
+            known.append(keys)
+        else:
+            to_read.append(month)
+    known_keys = pd.concat(known) if known else old[key_col].iloc[0:0]
+    return known_keys, to_read
+
+def split_increment(df, date_col, key_col, watermark, known_keys):
+    """
+    Separa as linhas que precisam ser processadas nesta execução.
+    `df[date_col]` já deve estar convertido para datetime.
+
+    Retorna (incremento, meses_append, meses_reescrever):
+     - incremento: linhas novas + todas as linhas dos meses com atrasados
+     - meses_append: meses que só receberam linhas novas (nova parte)
+     - meses_reescrever: meses com linhas atrasadas (partição reescrita)
+    """
+    months = month_partition_keys(df[date_col])
+    is_new = df[date_col] > watermark
+    is_late = ~is_new & ~df[key_col].isin(known_keys)
+
+    rewrite = set(months[is_late].unique())
+    in_rewrite = months.isin(rewrite)
+    append = set(months[is_new & ~in_rewrite].unique())
+
+    return df[is_new | in_rewrite].copy(), append, rewrite
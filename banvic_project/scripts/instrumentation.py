@@ -0,0 +1,202 @@
+# ============================================================
+# instrumentation.py
+# Medição das etapas dos scripts 01, 02 e 03.
+#
+#   with step("carga") as s:
+#       df = load_table(...)
+#       s.rows_out = len(df)
+#
+# Cada etapa (span) vira uma linha JSON com:
+#   etapa, execucao, inicio, wall_s, cpu_s, linhas_entrada, linhas_saida,
+#   bytes_lidos, bytes_escritos, rss_mb, memoria_delta_mb, pico_rss_mb
+# Etapas aninhadas têm o nome composto ("02_clean_transform/datas/contas.data_abertura").
+#
+# Destino: BANVIC_METRICS_FILE ou data/reports/metricas.jsonl (acumulado,
+# uma "execucao" por rodada do script).
+# Com BANVIC_PROFILE_DIR definida, cada etapa de primeiro nível roda sob
+# cProfile e, ao final do script, o perfil da mais lenta é gravado nessa
+# pasta (.prof para snakeviz/pstats e .txt com as 30 funções mais caras).
+# Só um perfil fica ativo por vez: etapas que começam em outras threads
+# enquanto ele está ligado rodam sem cProfile (mas continuam medidas).
+#
+# Memória e E/S vêm do /proc e do módulo resource (Linux/macOS). No Windows,
+# com o pacote opcional psutil instalado, RSS e pico vêm dele; sem psutil
+# esses campos ficam None e o resto da medição segue igual.
+# ============================================================
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from paths import REPORTS_DIR
+
+METRICS_ENV = "BANVIC_METRICS_FILE"
+PROFILE_ENV = "BANVIC_PROFILE_DIR"
+STAGE = Path(sys.argv[0]).stem or "interativo"
+RUN_ID = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}"
+PROFILE_TOP = 30
+
+_local = threading.local()   # pilha de etapas abertas, por thread (tarefas do DAG)
+_slowest = {"wall_s": -1.0, "name": None, "profiler": None}
+# Um cProfile ativo por vez no processo: a partir do Python 3.12 um segundo
+# enable() simultâneo (outra thread do DAG ou de map_tables) levanta ValueError
+_profile_slot = threading.Lock()
+
+
+# ------------------------------
+# Leituras do processo
+# ------------------------------
+def peak_rss_mb():
+    if resource is not None:
+        # ru_maxrss: KB no Linux, bytes no macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    # Windows: pico do working set (psutil); sem psutil, None
+    peak = getattr(psutil.Process().memory_info(), "peak_wset", None) if psutil else None
+    return None if peak is None else peak / 1024 ** 2
+
+def current_rss_mb():
+    # /proc só existe no Linux; fora dele psutil, se instalado, ou None
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return psutil.Process().memory_info().rss / 1024 ** 2 if psutil else None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+def io_bytes():
+    """(bytes lidos, bytes escritos) pelo processo via read/write; None fora do Linux"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None, None
+    return int(fields["rchar"]), int(fields["wchar"])
+
+
+# ------------------------------
+# Spans
+# ------------------------------
+class Span:
+    """Medidas de uma etapa; quem chama preenche as contagens de linhas"""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+def metrics_path() -> Path:
+    return Path(os.environ.get(METRICS_ENV) or REPORTS_DIR / "metricas.jsonl")
+
+def emit(record):
+    path = metrics_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+def _delta(after, before):
+    return None if after is None or before is None else after - before
+
+def current_steps() -> list:
+    """Etapas abertas na thread atual"""
+    return list(getattr(_local, "stack", []))
+
+def inherit_steps(steps):
+    """Inicializador de threads auxiliares: as etapas medidas nelas ficam sob `steps`"""
+    _local.stack = list(steps)
+
+def _start_profiler():
+    """cProfile ligado se o espaço estiver livre; senão a etapa só não é perfilada"""
+    if not _profile_slot.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Outra ferramenta de profiling já ativa (ex.: python -m cProfile no 3.12+)
+        _profile_slot.release()
+        return None
+    return profiler
+
+@contextmanager
+def step(name, rows_in=None):
+    """Mede um bloco do script; o nome final é '<script>/<etapas externas>/<name>'"""
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    _stack = _local.stack
+    _stack.append(name)
+    span = Span("/".join([STAGE] + _stack), rows_in)
+    profiler = _start_profiler() if os.environ.get(PROFILE_ENV) and len(_stack) == 1 else None
+
+    started = datetime.now(timezone.utc)
+    rss0, (read0, written0) = current_rss_mb(), io_bytes()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield span
+    finally:
+        if profiler:
+            profiler.disable()
+            _profile_slot.release()
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        rss1, (read1, written1) = current_rss_mb(), io_bytes()
+        _stack.pop()
+
+        memory_delta, peak = _delta(rss1, rss0), peak_rss_mb()
+        emit({
+            "etapa": span.name,
+            "execucao": RUN_ID,
+            "inicio": started.isoformat(timespec="milliseconds"),
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "linhas_entrada": span.rows_in,
+            "linhas_saida": span.rows_out,
+            "bytes_lidos": _delta(read1, read0),
+            "bytes_escritos": _delta(written1, written0),
+            "rss_mb": None if rss1 is None else round(rss1, 1),
+            "memoria_delta_mb": None if memory_delta is None else round(memory_delta, 1),
+            "pico_rss_mb": None if peak is None else round(peak, 1),
+        })
+        if profiler and wall > _slowest["wall_s"]:
+            _slowest.update(wall_s=wall, name=span.name, profiler=profiler)
+
+
+# ------------------------------
+# Perfil da etapa mais lenta
+# ------------------------------
+def dump_slowest_profile():
+    """Grava o cProfile da etapa de primeiro nível mais lenta (chamado ao sair do script)"""
+    directory = os.environ.get(PROFILE_ENV)
+    if not directory or _slowest["profiler"] is None:
+        return None
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    base = directory / f"{RUN_ID}_{_slowest['name'].replace('/', '__')}"
+
+    _slowest["profiler"].dump_stats(base.with_suffix(".prof"))
+    text = io.StringIO()
+    stats = pstats.Stats(_slowest["profiler"], stream=text).sort_stats("cumulative")
+    stats.print_stats(PROFILE_TOP)
+    base.with_suffix(".txt").write_text(text.getvalue(), encoding="utf-8")
+    print(f"🔬 Perfil da etapa mais lenta ({_slowest['name']}, {_slowest['wall_s']:.2f}s): "
+          f"{base.with_suffix('.prof')}")
+    return base.with_suffix(".prof")
+
+atexit.register(dump_slowest_profile)
@@ -0,0 +1,104 @@
+# ============================================================
+# joins.py
+# Junções estrela (fato → dimensões) sem multiplicação de linhas.
+#  - Cada dimensão ganha um índice chave inteira → posição da linha,
+#    construído uma única vez
+#  - A busca devolve exatamente uma linha de atributos por linha do fato
+#  - Chaves sem correspondência são contadas por dimensão
+#
+# Exemplo (03):
+#   engine = StarJoin()
+#   engine.add_dimension("contas", contas, "num_conta")
+#   trans = engine.lookup(trans, "num_conta", "contas", ["cod_agencia", "cod_colaborador"])
+#
+# O 03 usa índices já persistidos (dimension_store.py) via add_index.
+# ============================================================
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+# Acima desta razão (maior chave / nº de linhas) o índice denso desperdiçaria
+# memória e a busca passa a ser binária sobre as chaves ordenadas
+MAX_DENSE_RATIO = 4
+
+
+class DimensionIndex:
+    """Índice de uma tabela de dimensão pela sua chave primária inteira"""
+
+    def __init__(self, df, key):
+        keys = pd.to_numeric(df[key], errors="raise")
+        if keys.isna().any():
+            raise ValueError(f"Chave '{key}' com valores nulos")
+        keys = keys.to_numpy(dtype=np.int64)
+        if len(np.unique(keys)) != len(keys):
+            raise ValueError(f"Chave '{key}' não é única: a junção multiplicaria linhas")
+
+        self.df = df.reset_index(drop=True)
+        self.key = key
+        self.dense = len(keys) > 0 and keys.min() >= 0 and keys.max() <= MAX_DENSE_RATIO * len(keys) + 1024
+
+        if self.dense:
+            # positions[chave] = linha (-1 = inexistente)
+            self.positions = np.full(keys.max() + 1, -1, dtype=np.int64)
+            self.positions[keys] = np.arange(len(keys))
+        else:
+            self.order = np.argsort(keys, kind="stable")
+            self.sorted_keys = keys[self.order]
+
+    def find(self, values) -> np.ndarray:
+        """Posição de cada chave procurada na dimensão (-1 quando não existe)"""
+        values = pd.to_numeric(pd.Series(values), errors="coerce")
+        valid = values.notna().to_numpy()
+        keys = values.fillna(-1).to_numpy(dtype=np.int64)
+        out = np.full(len(keys), -1, dtype=np.int64)
+
+        if self.dense:
+            ok = valid & (keys >= 0) & (keys < len(self.positions))
+            out[ok] = self.positions[keys[ok]]
+        elif len(self.sorted_keys):
+            idx = np.searchsorted(self.sorted_keys, keys)
+            idx = np.minimum(idx, len(self.sorted_keys) - 1)
+            ok = valid & (self.sorted_keys[idx] == keys)
+            out[ok] = self.order[idx[ok]]
+        return out
+
+    def take(self, positions, columns) -> pd.DataFrame:
+        """Atributos das linhas indicadas; posições -1 viram nulos"""
+        return pd.DataFrame({
+            col: take(self.df[col].values, positions, allow_fill=True)
+            for col in columns
+        }, index=pd.RangeIndex(len(positions)))
+
+
+class StarJoin:
+    """Conjunto de dimensões indexadas e contagem de chaves sem correspondência"""
+
+    def __init__(self):
+        self.dimensions = {}
+        self.misses = {}
+
+    def add_dimension(self, name, df, key):
+        self.dimensions[name] = DimensionIndex(df, key)
+        return self
+
+    def add_index(self, name, index):
+        """Dimensão já indexada (ex.: dimension_store.MappedDimension, com o índice persistido)"""
+        self.dimensions[name] = index
+        return self
+
+    def lookup(self, fact, fk, dimension, columns) -> pd.DataFrame:
+        """
+        Acrescenta ao fato os atributos da dimensão, resolvidos pela chave `fk`.
+        columns: lista de colunas ou dict {coluna_dimensão: nome_no_fato}.
+        O resultado tem exatamente as mesmas linhas (e ordem) do fato.
+        """
+        index = self.dimensions[dimension]
+        rename = columns if isinstance(columns, dict) else {c: c for c in columns}
+
+        positions = index.find(fact[fk])
+        self.misses[dimension] = int((positions < 0).sum())
+
+        attrs = index.take(positions, list(rename)).rename(columns=rename)
+        attrs.index = fact.index
+        return pd.concat([fact.drop(columns=list(rename.values()), errors="ignore"), attrs], axis=1)
@@ -0,0 +1,22 @@
+# ============================================================
+# paths.py
+# Pastas de dados usadas pelos scripts 01, 02 e 03.
+# Por padrão ficam em banvic_project/data/; a variável de ambiente
+# BANVIC_DATA_DIR aponta tudo para outra pasta (usado pelo benchmark
+# para rodar o pipeline sobre bases geradas em outros tamanhos).
+# ============================================================
+
+from pathlib import Path
+import os
+
+HERE = Path(__file__).resolve().parent
+PROJECT_ROOT = HERE.parent
+DATA_DIR = Path(os.environ.get("BANVIC_DATA_DIR") or PROJECT_ROOT / "data")
+
+RAW_DIR = DATA_DIR / "raw"
+INTERIM_DIR = DATA_DIR / "interim"
+PROCESSED_DIR = DATA_DIR / "processed"
+FINAL_DIR = DATA_DIR / "final"
+STATE_DIR = DATA_DIR / "state"
+REPORTS_DIR = DATA_DIR / "reports"
+QUARANTINE_DIR = DATA_DIR / "quarantine"
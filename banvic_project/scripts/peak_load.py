@@ -0,0 +1,216 @@
+# ============================================================
+# peak_load.py
+# Carga de transações no tempo, para dimensionar a infraestrutura:
+#  - Mapa de calor dia da semana × hora
+#  - Série de transações por hora e picos mensais (minuto mais cheio,
+#    hora mais cheia e janela móvel de 60 minutos mais cheia)
+#  - Percentis de transações por hora em cada agência
+#
+# Tudo é calculado com aritmética inteira sobre os timestamps (minutos desde
+# 1970) e contagens com np.bincount / np.unique, sem groupby sobre texto.
+#
+# Etapas:
+#   minute_counts(trans)   → contagem por (minuto, agência); parciais de
+#                            blocos diferentes se somam com merge_minute_counts
+#   monthly_load(counts)   → agregados por mês (year_month), persistidos pelo 03
+#                            e substituídos mês a mês no modo incremental
+#   weekday_hour_heatmap / hourly_series / monthly_peaks / agency_percentiles
+#                          → exports a partir dos agregados mensais
+#
+# Os picos de minuto e de janela móvel são por mês: uma janela não atravessa
+# a virada do mês.
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from cube import MISSING_KEY
+
+LOAD_AGGREGATES = ["carga_hora", "carga_agencia", "carga_picos"]
+
+MINUTES_PER_HOUR = 60
+HOURS_PER_WEEK = 7 * 24
+MINUTES_PER_MONTH = 31 * 24 * MINUTES_PER_HOUR
+WINDOW_MINUTES = 60
+# 1970-01-01 foi uma quinta-feira (weekday 3)
+EPOCH_WEEKDAY = 3
+# Meses por grade de minutos (cada mês ocupa MINUTES_PER_MONTH posições)
+MONTH_BLOCK = 12
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+DAY_NAMES = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo"]
+
+
+def _epoch_minutes(dates: pd.Series) -> np.ndarray:
+    return dates.to_numpy().astype("datetime64[m]").astype(np.int64)
+
+def _month_keys(minutes) -> np.ndarray:
+    """AAAA-MM de cada minuto (mesma chave das partições do 02)"""
+    return np.datetime_as_string(minutes.astype("datetime64[m]").astype("datetime64[M]"), unit="M")
+
+def _hour_stamps(hours) -> pd.Series:
+    return pd.Series(pd.to_datetime(hours * MINUTES_PER_HOUR, unit="m"))
+
+
+def minute_counts(trans) -> pd.DataFrame:
+    """
+    Transações e valor por (minuto, agência). Colunas usadas: data_transacao,
+    cod_agencia (nulo = sem agência) e valor_transacao. Datas nulas ficam de fora.
+    """
+    valid = trans["data_transacao"].notna().to_numpy()
+    minutes = _epoch_minutes(trans["data_transacao"])[valid]
+    agencies = trans["cod_agencia"].fillna(MISSING_KEY).to_numpy(dtype=np.int64)[valid]
+    values = trans["valor_transacao"].fillna(0).to_numpy(dtype=float)[valid]
+
+    codes, agency_idx = np.unique(agencies, return_inverse=True)
+    keys, inverse = np.unique(minutes * max(len(codes), 1) + agency_idx, return_inverse=True)
+    return pd.DataFrame({
+        "minuto": keys // max(len(codes), 1),
+        "cod_agencia": codes[keys % max(len(codes), 1)].astype(np.int32),
+        "transacoes": np.bincount(inverse, minlength=len(keys)).astype(np.int64),
+        "valor_total": np.bincount(inverse, weights=values, minlength=len(keys)),
+    })
+
+def merge_minute_counts(parts) -> pd.DataFrame:
+    """Soma contagens por minuto de blocos diferentes (o mesmo minuto pode estar em dois blocos)"""
+    counts = pd.concat([p for p in parts if p is not None], ignore_index=True)
+    return counts.groupby(["minuto", "cod_agencia"], sort=True).sum().reset_index()
+
+
+# ------------------------------
+# Agregados mensais
+# ------------------------------
+def _hourly(counts) -> pd.DataFrame:
+    hours = counts["minuto"].to_numpy() // MINUTES_PER_HOUR
+    keys, inverse = np.unique(hours, return_inverse=True)
+    return pd.DataFrame({
+        "year_month": _month_keys(keys * MINUTES_PER_HOUR),
+        "hora": _hour_stamps(keys),
+        "transacoes": np.bincount(inverse, weights=counts["transacoes"].to_numpy(),
+                                  minlength=len(keys)).astype(np.int64),
+        "valor_total": np.bincount(inverse, weights=counts["valor_total"].to_numpy(), minlength=len(keys)),
+    })
+
+def _agency_histogram(counts) -> pd.DataFrame:
+    """Quantas horas cada agência teve com N transações, por mês (só horas com movimento)"""
+    counts = counts[counts["cod_agencia"] != MISSING_KEY]
+    hours = counts["minuto"].to_numpy() // MINUTES_PER_HOUR
+    codes, agency_idx = np.unique(counts["cod_agencia"].to_numpy(), return_inverse=True)
+    n = max(len(codes), 1)
+
+    # Transações por (hora, agência)
+    keys, inverse = np.unique(hours * n + agency_idx, return_inverse=True)
+    load = np.bincount(inverse, weights=counts["transacoes"].to_numpy(), minlength=len(keys)).astype(np.int64)
+    months, month_idx = np.unique(_month_keys((keys // n) * MINUTES_PER_HOUR), return_inverse=True)
+
+    # Histograma por (mês, agência, carga)
+    top = int(load.max()) + 1 if len(load) else 1
+    hist_keys, hours_count = np.unique((month_idx * n + keys % n) * top + load, return_counts=True)
+    return pd.DataFrame({
+        "year_month": months[hist_keys // top // n],
+        "cod_agencia": codes[(hist_keys // top) % n].astype(np.int32),
+        "carga": (hist_keys % top).astype(np.int64),
+        "horas": hours_count.astype(np.int64),
+    })
+
+def _minute_peaks(counts) -> pd.DataFrame:
+    """Minuto mais cheio e janela de WINDOW_MINUTES minutos mais cheia de cada mês"""
+    minutes = counts["minuto"].to_numpy()
+    month_starts = minutes.astype("datetime64[m]").astype("datetime64[M]")
+    months, month_idx = np.unique(month_starts, return_inverse=True)
+    offsets = minutes - months.astype("datetime64[m]").astype(np.int64)[month_idx]
+    weights = counts["transacoes"].to_numpy()
+
+    rows = []
+    for first in range(0, len(months), MONTH_BLOCK):
+        block = slice(first, first + MONTH_BLOCK)
+        n = len(months[block])
+        sel = (month_idx >= first) & (month_idx < first + n)
+        grid = np.bincount((month_idx[sel] - first) * MINUTES_PER_MONTH + offsets[sel], weights=weights[sel],
+                           minlength=n * MINUTES_PER_MONTH).reshape(n, MINUTES_PER_MONTH)
+        cumulative = np.zeros((n, MINUTES_PER_MONTH + 1))
+        np.cumsum(grid, axis=1, out=cumulative[:, 1:])
+        windows = cumulative[:, WINDOW_MINUTES:] - cumulative[:, :-WINDOW_MINUTES]
+
+        starts = months[block].astype("datetime64[m]").astype(np.int64)
+        peak_at, window_at = grid.argmax(axis=1), windows.argmax(axis=1)
+        rows.append(pd.DataFrame({
+            "year_month": np.datetime_as_string(months[block], unit="M"),
+            "pico_minuto": grid.max(axis=1).astype(np.int64),
+            "minuto_pico": pd.to_datetime(starts + peak_at, unit="m"),
+            "pico_janela": np.rint(windows.max(axis=1)).astype(np.int64),
+            "inicio_janela": pd.to_datetime(starts + window_at, unit="m"),
+        }))
+    if not rows:
+        return pd.DataFrame({"year_month": pd.Series(dtype=str), "pico_minuto": pd.Series(dtype=np.int64),
+                             "minuto_pico": pd.Series(dtype="datetime64[ns]"),
+                             "pico_janela": pd.Series(dtype=np.int64),
+                             "inicio_janela": pd.Series(dtype="datetime64[ns]")})
+    return pd.concat(rows, ignore_index=True)
+
+def monthly_load(counts) -> dict:
+    """Agregados por mês a partir das contagens por minuto (de meses completos)"""
+    return {
+        "carga_hora": _hourly(counts),
+        "carga_agencia": _agency_histogram(counts),
+        "carga_picos": _minute_peaks(counts),
+    }
+
+
+# ------------------------------
+# Exports
+# ------------------------------
+def weekday_hour_heatmap(carga_hora) -> pd.DataFrame:
+    """Transações e valor por dia da semana × hora do dia (168 linhas)"""
+    # Em ordem cronológica: as somas não dependem da ordem em que os meses foram mesclados
+    carga_hora = carga_hora.sort_values("hora")
+    hours = pd.to_datetime(carga_hora["hora"]).to_numpy().astype("datetime64[h]").astype(np.int64)
+    slot = ((hours // 24 + EPOCH_WEEKDAY) % 7) * 24 + hours % 24
+    count = np.bincount(slot, weights=carga_hora["transacoes"].to_numpy(), minlength=HOURS_PER_WEEK)
+    value = np.bincount(slot, weights=carga_hora["valor_total"].to_numpy(), minlength=HOURS_PER_WEEK)
+    weekday = np.repeat(np.arange(7), 24)
+    total = count.sum()
+    return pd.DataFrame({
+        "weekday": weekday,
+        "dia_semana": np.array(DAY_NAMES)[weekday],
+        "hour": np.tile(np.arange(24), 7),
+        "total_transacoes": count.astype(np.int64),
+        "valor_total": value,
+        "pct_transacoes": count / total * 100 if total else np.zeros(HOURS_PER_WEEK),
+    })
+
+def hourly_series(carga_hora) -> pd.DataFrame:
+    """Série de transações por hora (só horas com movimento), em ordem cronológica"""
+    return carga_hora.sort_values("hora")[["hora", "transacoes", "valor_total"]].reset_index(drop=True)
+
+def monthly_peaks(carga_hora, carga_picos) -> pd.DataFrame:
+    """Por mês: total, hora mais cheia, minuto mais cheio e janela de 60 minutos mais cheia"""
+    hourly = carga_hora.sort_values(["year_month", "hora"])
+    top = hourly.loc[hourly.groupby("year_month")["transacoes"].idxmax()]
+    months = pd.DataFrame({
+        "year_month": top["year_month"].to_numpy(),
+        "transacoes": hourly.groupby("year_month")["transacoes"].sum().to_numpy(),
+        "pico_hora": top["transacoes"].to_numpy(),
+        "hora_pico": top["hora"].to_numpy(),
+    })
+    return months.merge(carga_picos, on="year_month", how="left").sort_values("year_month").reset_index(drop=True)
+
+def agency_percentiles(carga_agencia) -> pd.DataFrame:
+    """
+    Transações por hora em cada agência: média, percentis (nearest-rank) e
+    pico, sobre as horas em que a agência teve movimento.
+    """
+    hist = (carga_agencia.groupby(["cod_agencia", "carga"])["horas"].sum()
+            .reset_index().sort_values(["cod_agencia", "carga"]))
+    hist["weighted"] = hist["carga"] * hist["horas"]
+    by_agency = hist.groupby("cod_agencia")
+    hours = by_agency["horas"].transform("sum")
+    cumulative = by_agency["horas"].cumsum()
+
+    out = by_agency.agg(horas_com_movimento=("horas", "sum"), total_transacoes=("weighted", "sum"),
+                        pico_hora=("carga", "max"))
+    out["media_por_hora"] = out["total_transacoes"] / out["horas_com_movimento"]
+    for name, q in PERCENTILES.items():
+        reached = hist[cumulative >= np.ceil(q * hours)]
+        out[name] = reached.groupby("cod_agencia")["carga"].first()
+    cols = ["horas_com_movimento", "total_transacoes", "media_por_hora", *PERCENTILES, "pico_hora"]
+    return out[cols].reset_index()
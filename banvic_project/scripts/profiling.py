@@ -0,0 +1,285 @@
+# ============================================================
+# profiling.py
+# Perfil de qualidade de uma tabela em uma única passada sobre blocos:
+#  - registros, nulos e tipo por coluna
+#  - numéricos: mínimo, máximo, média, desvio e quantis aproximados
+#    (amostra de reservatório de tamanho fixo)
+#  - datas: mínimo e máximo
+#  - nº aproximado de valores distintos (HyperLogLog)
+#  - valores mais frequentes (contador limitado, aproximado)
+#  - linhas duplicadas (por hash de 64 bits da linha inteira): contagem
+#    exata até EXACT_DUPLICATE_ROWS linhas distintas; acima disso o conjunto
+#    de hashes é descartado e a contagem passa a ser estimada pelo
+#    HyperLogLog das linhas (memória fixa, relatório marca "aproximada")
+#
+# Uso:
+#   profiler = TableProfiler("transacoes")
+#   for chunk in chunks:
+#       profiler.update(chunk)
+#   report = profiler.report()
+#   print_profile(report); save_profile(report, REPORTS_DIR)
+# ============================================================
+
+from pathlib import Path
+import json
+
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 14            # 2^14 registradores (~0,8% de erro)
+RESERVOIR_SIZE = 10_000       # amostra para quantis aproximados
+TOP_CAPACITY = 200            # valores acompanhados no contador de frequentes
+TOP_REPORTED = 5
+QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+EXACT_DUPLICATE_ROWS = 1_000_000   # hashes de linha guardados (8 MB) antes de passar à estimativa
+
+
+# ------------------------------
+# Estruturas aproximadas
+# ------------------------------
+class HyperLogLog:
+    """Contagem aproximada de distintos a partir de hashes de 64 bits"""
+
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # posição do primeiro bit 1 nos 64-p bits restantes
+        bits = np.zeros(len(rest), dtype=np.int64)
+        nz = rest > 0
+        bits[nz] = np.floor(np.log2(rest[nz].astype(np.float64))).astype(np.int64) + 1
+        rank = (64 - self.p) - bits + 1
+        np.maximum.at(self.registers, idx, rank.astype(np.uint8))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)   # correção para cardinalidades pequenas
+        return int(round(estimate))
+
+
+class Reservoir:
+    """Amostra uniforme de tamanho fixo de um fluxo de valores"""
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=42):
+        self.size = size
+        self.seen = 0
+        self.sample = np.empty(0, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray):
+        n = len(values)
+        if not n:
+            return
+        free = self.size - len(self.sample)
+        if free > 0:
+            self.sample = np.concatenate([self.sample, values[:free]])
+            values = values[free:]
+            self.seen += min(free, n)
+        if len(values):
+            # cada novo valor i entra com probabilidade size / (seen + i + 1)
+            positions = self.seen + np.arange(1, len(values) + 1)
+            slots = (self.rng.random(len(values)) * positions).astype(np.int64)
+            keep = slots < self.size
+            self.sample[slots[keep]] = values[keep]
+            self.seen += len(values)
+
+    def quantiles(self, qs):
+        if not len(self.sample):
+            return {str(q): None for q in qs}
+        return {str(q): float(v) for q, v in zip(qs, np.quantile(self.sample, qs))}
+
+
+class TopValues:
+    """Contador dos valores mais frequentes com memória limitada (aproximado)"""
+
+    def __init__(self, capacity=TOP_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+
+    def update(self, series: pd.Series):
+        counts = series.value_counts(dropna=True)
+        if not len(counts):
+            return
+        counts.index = counts.index.astype(str)
+        merged = self.counts.add(counts, fill_value=0)
+        self.counts = merged.nlargest(self.capacity).astype(np.int64)
+
+    def top(self, n=TOP_REPORTED):
+        return {k: int(v) for k, v in self.counts.nlargest(n).items()}
+
+
+# ------------------------------
+# Perfil por coluna
+# ------------------------------
+class ColumnProfile:
+
+    def __init__(self, name, dtype):
+        self.name = name
+        self.dtype = str(dtype)
+        self.kind = self._kind(dtype)
+        self.count = 0
+        self.nulls = 0
+        self.min = self.max = None
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.hll = HyperLogLog()
+        self.reservoir = Reservoir() if self.kind == "numeric" else None
+        self.top = TopValues() if self.kind in ("text", "bool") else None
+
+    @staticmethod
+    def _kind(dtype):
+        if pd.api.types.is_bool_dtype(dtype):
+            return "bool"
+        if pd.api.types.is_numeric_dtype(dtype):
+            return "numeric"
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return "datetime"
+        return "text"
+
+    def update(self, series: pd.Series):
+        self.count += len(series)
+        valid = series.dropna()
+        self.nulls += len(series) - len(valid)
+        if not len(valid):
+            return
+
+        self.hll.update(pd.util.hash_array(valid.to_numpy()))
+        if self.kind in ("numeric", "datetime"):
+            lo, hi = valid.min(), valid.max()
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+        if self.kind == "numeric":
+            values = valid.to_numpy(dtype=np.float64)
+            self.sum += values.sum()
+            self.sumsq += np.square(values).sum()
+            self.reservoir.update(values)
+        if self.top is not None:
+            self.top.update(valid)
+
+    def report(self) -> dict:
+        out = {
+            "dtype": self.dtype,
+            "registros": self.count,
+            "nulos": self.nulls,
+            "distintos_aprox": min(self.hll.count(), self.count - self.nulls),
+        }
+        if self.kind in ("numeric", "datetime"):
+            out["min"] = None if self.min is None else str(self.min) if self.kind == "datetime" else float(self.min)
+            out["max"] = None if self.max is None else str(self.max) if self.kind == "datetime" else float(self.max)
+        if self.kind == "numeric":
+            n = self.count - self.nulls
+            mean = self.sum / n if n else None
+            out["media"] = mean
+            out["desvio"] = float(np.sqrt(max(self.sumsq / n - mean * mean, 0.0))) if n else None
+            out["quantis_aprox"] = self.reservoir.quantiles(QUANTILES)
+        if self.top is not None:
+            out["mais_frequentes"] = self.top.top()
+        return out
+
+
+# ------------------------------
+# Perfil da tabela
+# ------------------------------
+class TableProfiler:
+
+    def __init__(self, name, exact_limit=EXACT_DUPLICATE_ROWS):
+        self.name = name
+        self.rows = 0
+        self.duplicates = 0
+        self.columns = {}
+        self.exact_limit = exact_limit
+        self.row_hll = HyperLogLog()
+        self._seen_rows = np.empty(0, dtype=np.uint64)   # hashes de linha já vistos (ordenados)
+
+    @property
+    def exact(self) -> bool:
+        return self._seen_rows is not None
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.columns:
+                self.columns[col] = ColumnProfile(col, chunk[col].dtype)
+            self.columns[col].update(chunk[col])
+
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        self.row_hll.update(hashes)
+        if not self.exact:
+            return self
+
+        # Duplicatas: repetidas dentro do bloco + já vistas em blocos anteriores
+        unique = np.unique(hashes)
+        self.duplicates += len(hashes) - len(unique)
+        self.duplicates += int(np.isin(unique, self._seen_rows, assume_unique=True).sum())
+        self._seen_rows = np.union1d(self._seen_rows, unique)
+        if len(self._seen_rows) > self.exact_limit:
+            # Limite atingido: daqui em diante só a estimativa (memória e custo por bloco fixos)
+            self._seen_rows = None
+        return self
+
+    def report(self) -> dict:
+        duplicates = self.duplicates if self.exact else max(self.rows - self.row_hll.count(), 0)
+        return {
+            "tabela": self.name,
+            "registros": self.rows,
+            "duplicatas": int(duplicates),
+            "duplicatas_aproximadas": not self.exact,
+            "colunas": {name: col.report() for name, col in self.columns.items()},
+        }
+
+
+def profile_frame(df, name, chunksize=500_000) -> dict:
+    """Perfil de um DataFrame já em memória, percorrido em fatias"""
+    profiler = TableProfiler(name)
+    for start in range(0, max(len(df), 1), chunksize):
+        profiler.update(df.iloc[start:start + chunksize])
+    return profiler.report()
+
+
+# ------------------------------
+# Saída
+# ------------------------------
+def save_profile(report, directory) -> Path:
+    path = Path(directory) / f"profile_{report['tabela']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    return path
+
+def profile_summary(report) -> pd.DataFrame:
+    """Tabela resumida (uma linha por coluna) para exibir no console"""
+    rows = []
+    for name, col in report["colunas"].items():
+        quantis = col.get("quantis_aprox") or {}
+        top = col.get("mais_frequentes") or {}
+        rows.append({
+            "coluna": name,
+            "dtype": col["dtype"],
+            "nulos": col["nulos"],
+            "distintos≈": col["distintos_aprox"],
+            "min": col.get("min"),
+            "mediana≈": quantis.get("0.5"),
+            "max": col.get("max"),
+            "media": col.get("media"),
+            "mais_frequente": next(iter(top), None),
+        })
+    return pd.DataFrame(rows).set_index("coluna")
+
+def print_profile(report, title=None):
+    print(f"\n{'='*80}")
+    print(f"📊 PERFIL: {title or report['tabela']}")
+    print(f"{'='*80}")
+    approx = "≈" if report.get("duplicatas_aproximadas") else ""
+    print(f"👉 Registros: {report['registros']}   Duplicatas{approx}: {report['duplicatas']}")
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(profile_summary(report))
@@ -0,0 +1,120 @@
+# ============================================================
+# readers.py
+# Leitura dos extratos brutos (data/raw/) em uma única passada:
+#  - Descompressão transparente (gzip / zstd) detectada pelos bytes mágicos
+#  - Encoding e separador detectados a partir dos primeiros KB do arquivo
+#  - Leitura em blocos (chunks) com memória limitada
+# ============================================================
+
+from pathlib import Path
+import codecs
+import csv
+import gzip
+import io
+
+import pandas as pd
+
+SAMPLE_BYTES = 64 * 1024
+ENCODINGS = ["utf-8", "cp1252", "latin1"]
+SEPARATORS = [",", ";"]
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSED_SUFFIXES = [".gz", ".zst"]
+
+
+# ------------------------------
+# Descompressão
+# ------------------------------
+def find_raw(path: Path):
+    """Retorna o caminho do extrato, aceitando versões comprimidas (.gz / .zst)"""
+    path = Path(path)
+    for candidate in [path] + [path.with_name(path.name + suf) for suf in COMPRESSED_SUFFIXES]:
+        if candidate.exists():
+            return candidate
+    return None
+
+def open_raw(path: Path):
+    """Abre o arquivo em modo binário, descomprimindo gzip/zstd se necessário"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        magic = f.read(4)
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, "rb")
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise ImportError(
+                f"{path} está comprimido em zstd: instale o pacote 'zstandard'"
+            ) from exc
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+# ------------------------------
+# Detecção de encoding e separador
+# ------------------------------
+def _decode_sample(sample: bytes):
+    """Decodifica a amostra com o primeiro encoding válido"""
+    for enc in ENCODINGS:
+        # Decoder incremental: um caractere multibyte cortado no fim da amostra não é erro
+        decoder = codecs.getincrementaldecoder(enc)()
+        try:
+            return enc, decoder.decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Nenhum encoding suportado conseguiu decodificar a amostra")
+
+def sniff_csv(path: Path, sample_bytes: int = SAMPLE_BYTES):
+    """Detecta (encoding, separador) lendo apenas o início do arquivo"""
+    with open_raw(path) as f:
+        sample = f.read(sample_bytes)
+    if not sample:
+        raise ValueError(f"Arquivo vazio: {path}")
+
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding, text = "utf-8-sig", sample[len(codecs.BOM_UTF8):].decode("utf-8", errors="ignore")
+    else:
+        encoding, text = _decode_sample(sample)
+
+    # Descarta a última linha, que pode estar incompleta
+    lines = text.splitlines()
+    if len(lines) > 1:
+        lines = lines[:-1]
+    try:
+        sep = csv.Sniffer().sniff("\n".join(lines), delimiters="".join(SEPARATORS)).delimiter
+    except csv.Error:
+        header = lines[0]
+        sep = max(SEPARATORS, key=header.count)
+
+    if sep not in lines[0]:
+        raise ValueError(f"Não encontrei separador ({' ou '.join(SEPARATORS)}) no cabeçalho de {path}")
+    return encoding, sep
+
+
+# ------------------------------
+# Leitura em blocos
+# ------------------------------
+def read_header(path: Path, encoding=None, sep=None) -> list:
+    """Nomes das colunas do CSV (só a primeira linha é lida)"""
+    if encoding is None or sep is None:
+        encoding, sep = sniff_csv(path)
+    with open_raw(path) as raw:
+        text = io.TextIOWrapper(raw, encoding=encoding, newline="")
+        return list(pd.read_csv(text, sep=sep, nrows=0).columns)
+
+def iter_csv_chunks(path: Path, chunksize: int, encoding=None, sep=None, **read_kwargs):
+    """
+    Lê o CSV uma única vez, em blocos de `chunksize` linhas.
+    Encoding e separador vêm de sniff_csv quando não informados;
+    erros de parsing não são engolidos.
+    """
+    if encoding is None or sep is None:
+        encoding, sep = sniff_csv(path)
+    with open_raw(path) as raw:
+        text = io.TextIOWrapper(raw, encoding=encoding, newline="")
+        reader = pd.read_csv(text, sep=sep, chunksize=chunksize, **read_kwargs)
+        for chunk in reader:
+            yield chunk
@@ -0,0 +1,140 @@
+# ============================================================
+# run_pipeline.py
+# Pipeline completo (01 → 02 → 03) como DAG de tarefas por tabela e por
+# export, com cache (ver dag.py):
+#
+#   ingestao:<tabela>  →  limpar:<tabela>  →  restricoes:<tabela>
+#                                          →  dim_calendario
+#                                          →  anomalias (transações e contas)
+#                                          →  export:<export>
+#
+# Só roda o que mudou a montante: se apenas o extrato de propostas for
+# atualizado, limpeza de transações e exports de transações são pulados.
+#
+# Uso:
+#  python scripts/run_pipeline.py                     # tudo que estiver desatualizado
+#  python scripts/run_pipeline.py --workers 8
+#  python scripts/run_pipeline.py --alvos export:monthly_proposals
+#  python scripts/run_pipeline.py --forcar            # ignora o cache
+#  python scripts/run_pipeline.py --listar            # mostra o estado de cada tarefa
+# ============================================================
+
+from pathlib import Path
+import argparse
+import importlib
+import os
+import sys
+
+from constraints import FOREIGN_KEYS
+from dag import DAG, Task
+from paths import HERE, RAW_DIR, INTERIM_DIR, PROCESSED_DIR, FINAL_DIR, STATE_DIR
+from readers import find_raw
+from storage import find_table
+
+ingest = importlib.import_module("01_ingest_inspect")
+clean = importlib.import_module("02_clean_transform")
+exports = importlib.import_module("03_eda_and_exports")
+
+CACHE_FILE = STATE_DIR / "dag_cache.json"
+
+# Código que entra na chave de cada tipo de tarefa
+CODE = {
+    "ingestao": ["01_ingest_inspect.py", "readers.py", "schema.py", "storage.py", "compaction.py",
+                 "profiling.py", "dag.py"],
+    "limpar": ["02_clean_transform.py", "calendar_dim.py", "date_parsing.py", "schema.py", "compaction.py",
+               "profiling.py", "storage.py", "incremental.py", "dag.py"],
+    "restricoes": ["02_clean_transform.py", "constraints.py", "schema.py", "storage.py"],
+    "anomalias": ["02_clean_transform.py", "anomalies.py", "joins.py", "storage.py"],
+    "export": ["03_eda_and_exports.py", "cube.py", "joins.py", "peak_load.py", "amortization.py",
+               "customer360.py", "dimension_store.py", "schema.py", "compaction.py", "storage.py"],
+}
+
+# Export → (função, tabelas processadas lidas, arquivo de saída)
+EXPORTS = {
+    "carga": (exports.peak_load_task, ["transacoes", "contas", "agencias", "colaboradores"], "carga_dia_hora"),
+    "monthly_proposals": (exports.monthly_proposals_task, ["propostas"], "monthly_proposals"),
+    "cubo_rankings": (exports.cube_rankings_task,
+                      ["transacoes", "contas", "agencias", "colaboradores"], "top_colabs_per_agency"),
+    "colab_performance": (exports.colab_performance_task,
+                          ["propostas", "agencias", "colaboradores", "colab_agencia"], "colab_performance"),
+    "carteira_credito": (exports.credit_exposure_task,
+                         ["propostas", "agencias", "colaboradores", "colab_agencia"], "fluxo_carteira"),
+    "clientes_360": (exports.customer_360_task,
+                     ["transacoes", "propostas", "contas", "agencias", "colaboradores", "clientes"], "clientes_360"),
+}
+
+
+def _code(kind):
+    return [HERE / f for f in CODE[kind]]
+
+def _table(directory, name):
+    return lambda: find_table(directory, name)
+
+def _raw_source(filename) -> Path:
+    return find_raw(RAW_DIR / filename) or RAW_DIR / filename
+
+def _ingest(key) -> dict:
+    path = ingest.inspect_and_save(key, ingest.expected_files[key])
+    if path is None:
+        raise FileNotFoundError(f"Extrato de '{key}' não encontrado em {RAW_DIR}")
+    return {"arquivo": str(path)}
+
+def _calendar(upstream) -> dict:
+    return clean.build_calendar_table([upstream["limpar:transacoes"], upstream["limpar:propostas"]])
+
+
+def build_dag(quarantine=False) -> DAG:
+    dag = DAG(CACHE_FILE)
+
+    for key, filename in ingest.expected_files.items():
+        dag.add(Task(f"ingestao:{key}", _ingest, args=(key,), sources=[_raw_source(filename)],
+                     code=_code("ingestao"), outputs=[_table(INTERIM_DIR, f"{key}_interim")]))
+        dag.add(Task(f"limpar:{key}", clean.clean_table, args=(key,), deps=[f"ingestao:{key}"],
+                     code=_code("limpar"), outputs=[_table(PROCESSED_DIR, key)]))
+
+    dag.add(Task("dim_calendario", _calendar, deps=["limpar:transacoes", "limpar:propostas"],
+                 code=_code("limpar"), outputs=[_table(PROCESSED_DIR, "dim_calendario")]))
+
+    for key in ingest.expected_files:
+        parents = sorted({fk[2] for fk in FOREIGN_KEYS if fk[0] == key})
+        dag.add(Task(f"restricoes:{key}", clean.check_table, args=(key, quarantine),
+                     deps=[f"limpar:{t}" for t in [key] + parents], code=_code("restricoes")))
+
+    # O detector guarda o próprio estado (data/state/anomalias/) e só pontua transações novas
+    dag.add(Task("anomalias", clean.detect_anomalies, deps=["limpar:transacoes", "limpar:contas"],
+                 code=_code("anomalias")))
+
+    for name, (func, tables, output) in EXPORTS.items():
+        dag.add(Task(f"export:{name}", func, deps=[f"limpar:{t}" for t in tables],
+                     code=_code("export"), outputs=[_table(FINAL_DIR, output)]))
+    return dag
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline completo como DAG com cache")
+    parser.add_argument("--alvos", nargs="+", default=None,
+                        help="tarefas desejadas (as dependências entram automaticamente)")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1),
+                        help="tarefas independentes executadas ao mesmo tempo")
+    parser.add_argument("--forcar", action="store_true", help="reexecuta tudo, ignorando o cache")
+    parser.add_argument("--quarantine", action="store_true",
+                        help="grava as linhas que violam chaves em data/quarantine/")
+    parser.add_argument("--listar", action="store_true", help="só lista as tarefas e se estão em cache")
+    args = parser.parse_args(argv)
+
+    dag = build_dag(args.quarantine)
+    if args.listar:
+        order = dag.order(args.alvos)
+        keys = dag.task_keys(order)
+        for name in order:
+            print(f"{'✅ cache   ' if dag.is_cached(name, keys[name]) else '🔁 executar'}  {name}")
+        return 0
+
+    status = dag.run(args.alvos, workers=args.workers, force=args.forcar)
+    counts = {s: sum(1 for v in status.values() if v == s) for s in sorted(set(status.values()))}
+    print("\n🧭 Resumo do DAG: " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+    return 1 if {"falhou", "cancelada"} & set(status.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
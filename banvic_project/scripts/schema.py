@@ -0,0 +1,277 @@
+# ============================================================
+# schema.py
+# Registro único do esquema das sete tabelas. Para cada tabela:
+#  - arquivo bruto (data/raw/), chave primária e coluna de data das fatos
+#  - colunas com tipo, formatos de data aceitos, chave estrangeira e as
+#    etapas que as usam ("limpeza" = 01/02, "exports" = 03)
+#
+# Tipos:
+#   int      → int64; Int64 anulável no bloco com valor vazio ou inválido
+#   float    → float64
+#   category → category já na leitura
+#   date     → texto na leitura; convertido no 02 com os formatos declarados
+#   text     → texto
+#
+# Números são lidos como texto e convertidos por coerce_numbers: valor fora do
+# tipo (texto, decimal em coluna int) vira nulo e é contado, sem derrubar a
+# ingestão. Só o cabeçalho fora do esquema (check_header) interrompe a leitura.
+#
+# Colunas sem etapa (textos largos como endereco e email) são conferidas no
+# cabeçalho do extrato mas não são lidas: não ocupam memória em nenhuma etapa.
+# Colunas derivadas (criadas no 02) não existem no extrato bruto.
+#
+# Exemplo:
+#   read_columns("clientes")            # colunas lidas do extrato
+#   columns("transacoes", "exports")    # colunas que o 03 carrega
+#   check_header("agencias", header)    # SchemaError se o extrato mudou
+#   invalid = coerce_numbers("contas", chunk)   # {coluna: {"invalidos": n, ...}}
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+LIMPEZA = "limpeza"
+EXPORTS = "exports"
+STAGES = [LIMPEZA, EXPORTS]
+
+DATE = ["data"]
+TIMESTAMP = ["data_hora_utc", "data_hora_micro_utc"]
+
+READ_DTYPES = {"int": str, "float": str, "category": "category", "date": str, "text": str}
+NUMERIC_TYPES = ("int", "float")
+INVALID_EXAMPLES = 5
+
+
+class SchemaError(ValueError):
+    """Extrato fora do esquema declarado (colunas ausentes ou inesperadas)"""
+
+
+def _col(tipo, usos=(LIMPEZA,), formatos=None, ref=None, derivada=False) -> dict:
+    return {"tipo": tipo, "usos": list(usos), "formatos": formatos, "ref": ref, "derivada": derivada}
+
+# Atalhos: usada também nos exports / nunca lida (o padrão de _col é só a limpeza)
+_BOTH = (LIMPEZA, EXPORTS)
+_NONE = ()
+
+SCHEMAS = {
+    "agencias": {
+        "arquivo": "agencias.csv",
+        "chave": ["cod_agencia"],
+        "colunas": {
+            "cod_agencia": _col("int", _BOTH),
+            "nome": _col("text", _BOTH),
+            "endereco": _col("text", _NONE),
+            "cidade": _col("category", _BOTH),
+            "uf": _col("category", _BOTH),
+            "data_abertura": _col("date", formatos=DATE),
+            "tipo_agencia": _col("category"),
+        },
+    },
+    "clientes": {
+        "arquivo": "clientes.csv",
+        "chave": ["cod_cliente"],
+        "colunas": {
+            "cod_cliente": _col("int", _BOTH),
+            "primeiro_nome": _col("text"),
+            "ultimo_nome": _col("text"),
+            "email": _col("text", _NONE),
+            "tipo_cliente": _col("category", _BOTH),
+            "data_inclusao": _col("date", formatos=TIMESTAMP),
+            "cpfcnpj": _col("text", _NONE),
+            "data_nascimento": _col("date", _BOTH, formatos=DATE),
+            "endereco": _col("text", _NONE),
+            "cep": _col("text", _NONE),
+        },
+    },
+    "colab_agencia": {
+        "arquivo": "colaborador_agencia.csv",
+        "chave": ["cod_colaborador", "cod_agencia"],
+        "colunas": {
+            "cod_colaborador": _col("int", _BOTH, ref=("colaboradores", "cod_colaborador")),
+            "cod_agencia": _col("int", _BOTH, ref=("agencias", "cod_agencia")),
+        },
+    },
+    "colaboradores": {
+        "arquivo": "colaboradores.csv",
+        "chave": ["cod_colaborador"],
+        "colunas": {
+            "cod_colaborador": _col("int", _BOTH),
+            "primeiro_nome": _col("text", _BOTH),
+            "ultimo_nome": _col("text", _BOTH),
+            "email": _col("text", _NONE),
+            "cpf": _col("text", _NONE),
+            "data_nascimento": _col("date", formatos=DATE),
+            "endereco": _col("text", _NONE),
+            "cep": _col("text", _NONE),
+        },
+    },
+    "contas": {
+        "arquivo": "contas.csv",
+        "chave": ["num_conta"],
+        "colunas": {
+            "num_conta": _col("int", _BOTH),
+            "cod_cliente": _col("int", _BOTH, ref=("clientes", "cod_cliente")),
+            "cod_agencia": _col("int", _BOTH, ref=("agencias", "cod_agencia")),
+            "cod_colaborador": _col("int", _BOTH, ref=("colaboradores", "cod_colaborador")),
+            "tipo_conta": _col("category"),
+            "data_abertura": _col("date", _BOTH, formatos=TIMESTAMP),
+            "saldo_total": _col("float", _BOTH),
+            "saldo_disponivel": _col("float", _BOTH),
+            "data_ultimo_lancamento": _col("date", formatos=TIMESTAMP),
+        },
+    },
+    "propostas": {
+        "arquivo": "propostas_credito.csv",
+        "chave": ["cod_proposta"],
+        "data": "data_entrada_proposta",
+        "colunas": {
+            "cod_proposta": _col("int", _BOTH),
+            "cod_cliente": _col("int", _BOTH, ref=("clientes", "cod_cliente")),
+            "cod_colaborador": _col("int", _BOTH, ref=("colaboradores", "cod_colaborador")),
+            "data_entrada_proposta": _col("date", _BOTH, formatos=TIMESTAMP),
+            "taxa_juros_mensal": _col("float", _BOTH),
+            "valor_proposta": _col("float", _BOTH),
+            "valor_financiamento": _col("float", _BOTH),
+            "valor_entrada": _col("float"),
+            "valor_prestacao": _col("float"),
+            "quantidade_parcelas": _col("int", _BOTH),
+            "carencia": _col("int", _BOTH),
+            "status_proposta": _col("category", _BOTH),
+            "day_name": _col("category", derivada=True),
+            "season": _col("category", derivada=True),
+        },
+    },
+    "transacoes": {
+        "arquivo": "transacoes.csv",
+        "chave": ["cod_transacao"],
+        "data": "data_transacao",
+        "colunas": {
+            "cod_transacao": _col("int", _BOTH),
+            "num_conta": _col("int", _BOTH, ref=("contas", "num_conta")),
+            "data_transacao": _col("date", _BOTH, formatos=TIMESTAMP),
+            "nome_transacao": _col("category", _BOTH),
+            "valor_transacao": _col("float", _BOTH),
+            "date_key": _col("int", (EXPORTS,), derivada=True),
+            "day_name": _col("category", derivada=True),
+            "season": _col("category", derivada=True),
+        },
+    },
+}
+
+
+# ------------------------------
+# Consultas ao registro
+# ------------------------------
+def _columns(name) -> dict:
+    if name not in SCHEMAS:
+        raise KeyError(f"Tabela fora do registro de esquemas: {name}")
+    return SCHEMAS[name]["colunas"]
+
+def tables() -> list:
+    return list(SCHEMAS)
+
+def raw_files() -> dict:
+    """Tabela → nome do extrato em data/raw/"""
+    return {name: s["arquivo"] for name, s in SCHEMAS.items()}
+
+def fact_tables() -> dict:
+    """Tabelas fato (particionadas por mês) → coluna de data"""
+    return {name: s["data"] for name, s in SCHEMAS.items() if "data" in s}
+
+def columns(name, stage=None) -> list:
+    """Colunas da tabela (brutas e derivadas) usadas na etapa, na ordem declarada"""
+    if stage is not None and stage not in STAGES:
+        raise ValueError(f"Etapa desconhecida: {stage} (use {', '.join(STAGES)})")
+    return [c for c, spec in _columns(name).items() if stage is None or stage in spec["usos"]]
+
+def raw_columns(name) -> list:
+    """Cabeçalho esperado do extrato bruto (inclui colunas que não são lidas)"""
+    return [c for c, spec in _columns(name).items() if not spec["derivada"]]
+
+def read_columns(name) -> list:
+    """Colunas lidas do extrato: as brutas usadas em alguma etapa"""
+    return [c for c, spec in _columns(name).items() if not spec["derivada"] and spec["usos"]]
+
+def read_dtypes(name) -> dict:
+    return {c: READ_DTYPES[_columns(name)[c]["tipo"]] for c in read_columns(name)}
+
+def _of_type(name, tipo, derived=False) -> list:
+    return [c for c, spec in _columns(name).items()
+            if spec["tipo"] == tipo and (derived or not spec["derivada"]) and (spec["usos"] or spec["derivada"])]
+
+def date_columns(name) -> list:
+    return _of_type(name, "date")
+
+def float_columns(name) -> list:
+    return _of_type(name, "float")
+
+def category_columns(name) -> list:
+    """Colunas category, incluindo as derivadas"""
+    return _of_type(name, "category", derived=True)
+
+def date_formats(name, col):
+    """Formatos de date_parsing.KNOWN_FORMATS esperados na coluna (None = todos)"""
+    return _columns(name)[col]["formatos"]
+
+def primary_keys() -> dict:
+    return {name: list(s["chave"]) for name, s in SCHEMAS.items()}
+
+def foreign_keys() -> list:
+    """(tabela filha, coluna, tabela pai, coluna no pai)"""
+    return [(name, col, *spec["ref"]) for name, s in SCHEMAS.items()
+            for col, spec in s["colunas"].items() if spec["ref"]]
+
+
+# ------------------------------
+# Validação do extrato
+# ------------------------------
+def check_header(name, header):
+    """Falha se o cabeçalho (já normalizado) não bate com o esquema declarado"""
+    expected = raw_columns(name)
+    missing = [c for c in expected if c not in header]
+    unexpected = [c for c in header if c not in expected]
+    if missing or unexpected:
+        raise SchemaError(f"{name}: extrato fora do esquema "
+                          f"(ausentes: {missing or '-'}; inesperadas: {unexpected or '-'})")
+
+def _coerce(s: pd.Series, tipo) -> pd.Series:
+    values = pd.to_numeric(s, errors="coerce")
+    if tipo == "float":
+        return values.astype(np.float64)
+    # Decimal em coluna inteira também é valor inválido, não é truncado
+    values = values.where(values == np.floor(values))
+    return values.astype(np.int64) if values.notna().all() else values.astype("Int64")
+
+def coerce_numbers(name, df) -> dict:
+    """
+    Converte as colunas int/float presentes em df (lidas como texto) para o
+    tipo declarado. Valores fora do tipo viram nulo; devolve, por coluna com
+    algum inválido, {"invalidos": n, "exemplos": [...]}. Altera o próprio df.
+    """
+    invalid = {}
+    for col, spec in _columns(name).items():
+        if spec["tipo"] not in NUMERIC_TYPES or col not in df.columns:
+            continue
+        s = df[col]
+        if s.dtype.kind in "iuf":
+            continue
+        values = _coerce(s, spec["tipo"])
+        bad = s.notna().to_numpy() & values.isna().to_numpy()
+        if bad.any():
+            invalid[col] = {"invalidos": int(bad.sum()),
+                            "exemplos": s[bad].astype(str).unique()[:INVALID_EXAMPLES].tolist()}
+        df[col] = values
+    return invalid
+
+def merge_invalid(total: dict, invalid: dict) -> dict:
+    """Acumula os inválidos de um bloco (coerce_numbers) no total da tabela"""
+    for col, found in invalid.items():
+        acc = total.setdefault(col, {"invalidos": 0, "exemplos": []})
+        acc["invalidos"] += found["invalidos"]
+        acc["exemplos"] = list(dict.fromkeys(acc["exemplos"] + found["exemplos"]))[:INVALID_EXAMPLES]
+    return total
+
+def print_invalid(name, invalid: dict):
+    for col, found in invalid.items():
+        print(f"⚠️ {name}.{col}: {found['invalidos']} valor(es) fora do tipo declarado viraram nulo")
+        print("  ", found["exemplos"])
@@ -0,0 +1,42 @@
+# ============================================================
+# sharded.py
+# Agregações por partição em vários processos (03 --processos N).
+#  - Cada tarefa recebe uma partição (lista de meses) e devolve um agregado
+#    parcial; map() devolve os parciais na ordem das partições, então a
+#    redução é determinística e igual à execução em um único processo
+#  - As dimensões não passam pelo pool: cada processo de trabalho abre o
+#    repositório de dimensões (dimension_store.py) por memory-map, e as
+#    páginas são compartilhadas pelo SO
+#  - Processos são criados com "spawn": seguro também dentro das threads
+#    do DAG (fork com threads ativas pode travar)
+#
+# Exemplo:
+#   with ShardPool(8) as pool:
+#       parciais = pool.map(agrega_mes, [["2023-01"], ["2023-02"]])
+# ============================================================
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+
+class ShardPool:
+    """Pool de processos para agregados parciais por partição"""
+
+    def __init__(self, processes):
+        self.processes = processes
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        return self
+
+    def map(self, func, partitions) -> list:
+        """func(partição) em paralelo; resultados na mesma ordem das partições"""
+        return list(self._pool.map(func, partitions))
+
+    def __exit__(self, *exc):
+        self._pool.shutdown()
+        return False
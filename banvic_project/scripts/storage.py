@@ -0,0 +1,425 @@
+# ============================================================
+# storage.py
+# Camada de armazenamento compartilhada pelos scripts 01, 02 e 03.
+#  - Formato padrão: Parquet (colunar, comprimido e com tipos preservados:
+#    datetimes, períodos (year_month), booleanos e categorias)
+#  - Leitura com projeção de colunas (lê só o que for usado)
+#  - Escrita em blocos (TableWriter) para tabelas maiores que a memória
+#  - CSV continua disponível como formato de exportação
+#  - Tabelas fato particionadas por mês, com manifesto (linhas e min/max por
+#    partição) e leitura por período que abre só as partições necessárias
+#
+# Variáveis de ambiente:
+#  - BANVIC_STORAGE_FORMAT: formato das etapas interim/processed ("parquet" | "csv")
+#  - BANVIC_EXPORT_FORMATS: formatos dos exports finais, separados por vírgula
+#                           (padrão "parquet,csv")
+# ============================================================
+
+from pathlib import Path
+import json
+import os
+import shutil
+import pandas as pd
+
+FORMATS = {
+    "parquet": ".parquet",
+    "csv": ".csv",
+}
+
+STORAGE_FORMAT = os.environ.get("BANVIC_STORAGE_FORMAT", "parquet")
+EXPORT_FORMATS = [
+    f.strip() for f in os.environ.get("BANVIC_EXPORT_FORMATS", "parquet,csv").split(",") if f.strip()
+]
+PARQUET_COMPRESSION = "zstd"
+
+
+# ------------------------------
+# Caminhos
+# ------------------------------
+def table_path(directory, name, fmt=None) -> Path:
+    """Caminho do arquivo de uma tabela no formato pedido"""
+    fmt = fmt or STORAGE_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconhecido: {fmt} (use {', '.join(FORMATS)})")
+    return Path(directory) / f"{name}{FORMATS[fmt]}"
+
+def find_table(directory, name) -> Path:
+    """Localiza a tabela em disco, priorizando o formato configurado"""
+    order = [STORAGE_FORMAT] + [f for f in FORMATS if f != STORAGE_FORMAT]
+    for fmt in order:
+        path = table_path(directory, name, fmt)
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"Tabela '{name}' não encontrada em {directory}")
+
+def table_format(path) -> str:
+    """Formato de um arquivo a partir da extensão"""
+    for fmt, ext in FORMATS.items():
+        if Path(path).suffix == ext:
+            return fmt
+    raise ValueError(f"Extensão não suportada: {path}")
+
+
+def _clear(path: Path):
+    """Remove uma versão anterior da tabela (arquivo único ou diretório de partes)"""
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def _write_file(df, path: Path):
+    if table_format(path) == "parquet":
+        df.to_parquet(path, index=False, compression=PARQUET_COMPRESSION)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8")
+
+def _read_file(path: Path, columns=None, parse_dates=None) -> pd.DataFrame:
+    if table_format(path) == "parquet":
+        return pd.read_parquet(path, columns=columns)
+
+    dates = [c for c in (parse_dates or []) if columns is None or c in columns]
+    return pd.read_csv(path, encoding="utf-8", usecols=columns, parse_dates=dates or None)
+
+def _read_parts(parts, columns=None, parse_dates=None) -> pd.DataFrame:
+    # Os tipos podem variar entre partes (ex.: inteiros que viram float por
+    # causa de nulos), então cada parte é lida separadamente e o pandas
+    # unifica os tipos no concat
+    return concat_frames([_read_file(p, columns, parse_dates) for p in parts])
+
+def concat_frames(frames) -> pd.DataFrame:
+    """Concatena blocos da mesma tabela; categorias diferentes entre blocos são unificadas"""
+    # Categorias diferentes entre partes virariam object no concat: unifica antes
+    categorical = {c for f in frames for c in f.columns if isinstance(f[c].dtype, pd.CategoricalDtype)}
+    for col in categorical:
+        values = [f[col].cat.categories if isinstance(f[col].dtype, pd.CategoricalDtype)
+                  else pd.Index(f[col].dropna().unique()) for f in frames if col in f]
+        dtype = pd.CategoricalDtype(values[0].append(values[1:]).unique())
+        for f in frames:
+            if col in f:
+                f[col] = f[col].astype(dtype)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ------------------------------
+# Leitura e escrita
+# ------------------------------
+def save_table(df, directory, name, fmt=None) -> Path:
+    """Salva um DataFrame no formato configurado e retorna o caminho"""
+    path = table_path(directory, name, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _clear(path)
+    _write_file(df, path)
+    return path
+
+def load_table(directory, name, columns=None, parse_dates=None) -> pd.DataFrame:
+    """
+    Carrega uma tabela salva por save_table, TableWriter ou write_partitions.
+    - columns: projeção de colunas (no Parquet só essas colunas são lidas do disco)
+    - parse_dates: usado apenas quando a tabela estiver em CSV
+    """
+    path = find_table(directory, name)
+    if path.is_dir():
+        parts = sorted(path.rglob(f"part-*{path.suffix}"))
+        if not parts:
+            raise FileNotFoundError(f"Tabela '{name}' sem partes em {path}")
+        return _read_parts(parts, columns, parse_dates)
+    return _read_file(path, columns, parse_dates)
+
+def export_table(df, directory, name, formats=None) -> list:
+    """Salva um export final em todos os formatos de exportação configurados"""
+    return [save_table(df, directory, name, fmt) for fmt in (formats or EXPORT_FORMATS)]
+
+
+class TableWriter:
+    """
+    Grava uma tabela bloco a bloco, sem mantê-la inteira em memória.
+    - Parquet: diretório <nome>.parquet/ com um arquivo part-NNNNN.parquet por bloco
+    - CSV: um único arquivo, com cabeçalho escrito apenas no primeiro bloco
+
+    Os blocos vão para um caminho temporário ao lado do destino; só um close()
+    sem erro troca a versão anterior pela nova. Se a escrita falhar (exceção
+    dentro do with), a saída parcial é apagada e a versão anterior fica intacta.
+
+    Uso:
+        with TableWriter(INTERIM_DIR, "transacoes_interim") as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, directory, name, fmt=None):
+        self.path = table_path(directory, name, fmt)
+        self.fmt = table_format(self.path)
+        self.tmp = self.path.with_name(f".{self.path.name}.tmp")
+        self.parts = 0
+        self.rows = 0
+        self.closed = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _clear(self.tmp)
+        if self.fmt == "parquet":
+            self.tmp.mkdir()
+
+    def write(self, df):
+        if self.fmt == "parquet":
+            _write_file(df, self.tmp / f"part-{self.parts:05d}.parquet")
+        else:
+            df.to_csv(self.tmp, mode="a", header=self.parts == 0, index=False, encoding="utf-8")
+        self.parts += 1
+        self.rows += len(df)
+
+    def close(self):
+        """Publica a tabela gravada no lugar da versão anterior"""
+        if self.closed:
+            return
+        # Tabela vazia: garante ao menos o arquivo CSV para os leitores
+        if self.fmt == "csv" and self.parts == 0:
+            self.tmp.touch()
+        _clear(self.path)
+        self.tmp.replace(self.path)
+        self.closed = True
+
+    def abort(self):
+        """Descarta a saída parcial; a versão anterior da tabela não é tocada"""
+        _clear(self.tmp)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+# ------------------------------
+# Tabelas particionadas por mês
+# ------------------------------
+# Layout: <nome>.<ext>/year_month=AAAA-MM/part-NNNNN.<ext>
+PARTITION_COLUMN = "year_month"
+NULL_PARTITION = "nulo"
+
+def month_partition_keys(dates: pd.Series) -> pd.Series:
+    """Chave de partição (AAAA-MM) para uma coluna de datas; datas nulas vão para 'nulo'"""
+    keys = dates.dt.strftime("%Y-%m")
+    return keys.fillna(NULL_PARTITION)
+
+def partition_path(directory, name, partition, fmt=None) -> Path:
+    return table_path(directory, name, fmt) / f"{PARTITION_COLUMN}={partition}"
+
+def list_partitions(directory, name, fmt=None) -> list:
+    """Partições existentes de uma tabela (vazio se a tabela não for particionada)"""
+    root = table_path(directory, name, fmt)
+    if not root.is_dir():
+        return []
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(p.name[len(prefix):] for p in root.iterdir() if p.is_dir() and p.name.startswith(prefix))
+
+def write_partitions(df, directory, name, partition_keys, replace=(), overwrite=False, fmt=None,
+                     date_col=None) -> dict:
+    """
+    Grava df particionado pelas chaves informadas (uma por linha).
+    - Por padrão cada partição recebe uma nova parte (append)
+    - replace: partições reescritas do zero (ex.: meses com dados atrasados)
+    - overwrite: apaga a tabela inteira antes de gravar
+    - date_col: coluna de datas usada pela leitura por período (fica no manifesto)
+    O manifesto da tabela é atualizado com as partições gravadas.
+    A coluna de partição (year_month) não vai para as partes: ela já está no
+    nome da pasta, e repetida nos arquivos impediria a leitura do diretório
+    por pd.read_parquet/pyarrow (tipos diferentes para o mesmo campo).
+    Retorna {partição: linhas gravadas}.
+    """
+    root = table_path(directory, name, fmt)
+    if overwrite or not root.is_dir():
+        _clear(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = _current_manifest(root, name, date_col)
+
+    written = {}
+    for key, part in df.drop(columns=[PARTITION_COLUMN], errors="ignore").groupby(partition_keys, sort=True):
+        pdir = root / f"{PARTITION_COLUMN}={key}"
+        if key in replace:
+            _clear(pdir)
+            manifest["particoes"].pop(key, None)
+        pdir.mkdir(parents=True, exist_ok=True)
+        n = len(list(pdir.glob(f"part-*{root.suffix}")))
+        path = pdir / f"part-{n:05d}{root.suffix}"
+        _write_file(part, path)
+        stats = _partition_stats(part, [path])
+        manifest["particoes"][key] = _merge_stats(manifest["particoes"].get(key), stats)
+        written[key] = len(part)
+
+    manifest["particoes"] = dict(sorted(manifest["particoes"].items()))
+    _save_manifest(root, manifest)
+    return written
+
+def load_partitions(directory, name, partitions, columns=None, parse_dates=None) -> pd.DataFrame:
+    """Carrega apenas as partições pedidas de uma tabela particionada"""
+    root = find_table(directory, name)
+    parts = []
+    for key in sorted(partitions):
+        parts += sorted((root / f"{PARTITION_COLUMN}={key}").glob(f"part-*{root.suffix}"))
+    if not parts:
+        # Nenhuma partição pedida existe: devolve uma tabela vazia com o esquema de uma parte qualquer
+        sample = next(root.rglob(f"part-*{root.suffix}"))
+        return _read_file(sample, columns, parse_dates).iloc[0:0]
+    return _read_parts(parts, columns, parse_dates)
+
+
+# ------------------------------
+# Manifesto e leitura por período
+# ------------------------------
+# <nome>.<ext>/_manifest.json:
+#   {"tabela", "coluna_data",
+#    "particoes": {"AAAA-MM": {"linhas", "partes", "bytes",
+#                              "colunas": {coluna: {"min", "max"}}}}}
+# min/max só de colunas numéricas e de datas (datas em ISO 8601)
+MANIFEST_FILE = "_manifest.json"
+
+
+def _json_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if hasattr(value, "item") else value
+
+def _partition_stats(df, files) -> dict:
+    columns = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            continue
+        if pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+            columns[col] = {"min": _json_value(df[col].min()), "max": _json_value(df[col].max())}
+    return {"linhas": len(df), "partes": len(files),
+            "bytes": sum(Path(f).stat().st_size for f in files), "colunas": columns}
+
+def _merge_stats(stored, stats) -> dict:
+    """Estatísticas de uma partição que recebeu uma parte nova"""
+    if stored is None:
+        return stats
+    columns = {}
+    for col in stored["colunas"].keys() | stats["colunas"].keys():
+        pair = [c[col] for c in (stored["colunas"], stats["colunas"]) if col in c]
+        mins = [p["min"] for p in pair if p["min"] is not None]
+        maxs = [p["max"] for p in pair if p["max"] is not None]
+        columns[col] = {"min": min(mins) if mins else None, "max": max(maxs) if maxs else None}
+    return {"linhas": stored["linhas"] + stats["linhas"],
+            "partes": stored["partes"] + stats["partes"],
+            "bytes": stored["bytes"] + stats["bytes"],
+            "colunas": dict(sorted(columns.items()))}
+
+def _save_manifest(root: Path, manifest):
+    tmp = root / f"{MANIFEST_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    tmp.replace(root / MANIFEST_FILE)
+
+def _read_manifest(root: Path):
+    path = root / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _current_manifest(root: Path, name, date_col=None) -> dict:
+    """
+    Manifesto de uma tabela prestes a receber partes novas. Tabelas gravadas
+    antes do manifesto existir têm as estatísticas recalculadas a partir das partes.
+    """
+    manifest = _read_manifest(root)
+    if manifest is None:
+        manifest = {"tabela": name, "coluna_data": date_col, "particoes": {}}
+        prefix = f"{PARTITION_COLUMN}="
+        for pdir in sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith(prefix)):
+            files = sorted(pdir.glob(f"part-*{root.suffix}"))
+            if files:
+                manifest["particoes"][pdir.name[len(prefix):]] = _partition_stats(
+                    _read_parts(files, parse_dates=[date_col] if date_col else None), files)
+    if date_col:
+        manifest["coluna_data"] = date_col
+    return manifest
+
+def partition_manifest(directory, name) -> dict:
+    """Manifesto de uma tabela particionada (None se não houver)"""
+    return _read_manifest(find_table(directory, name))
+
+
+def _day_range(start, end):
+    """[start, end) como Timestamps; fim sem hora (ex.: '2024-12-31') cobre o dia inteiro"""
+    lower = None if start is None else pd.Timestamp(start)
+    upper = None
+    if end is not None:
+        upper = pd.Timestamp(end)
+        if upper == upper.normalize():
+            upper += pd.Timedelta(days=1)
+    return lower, upper
+
+def prune_partitions(directory, name, start=None, end=None) -> list:
+    """
+    Partições que podem ter linhas no período [start, end]. Usa o min/max da
+    coluna de datas do manifesto; sem manifesto, o mês indicado pela chave.
+    Com período informado, a partição de datas nulas fica de fora.
+    """
+    keys = list_partitions(directory, name)
+    if start is None and end is None:
+        return keys
+    lower, upper = _day_range(start, end)
+    manifest = partition_manifest(directory, name) or {}
+    date_col = manifest.get("coluna_data")
+
+    selected = []
+    for key in keys:
+        if key == NULL_PARTITION:
+            continue
+        stats = manifest.get("particoes", {}).get(key, {}).get("colunas", {}).get(date_col)
+        if stats and stats["min"] is not None:
+            first, last = pd.Timestamp(stats["min"]), pd.Timestamp(stats["max"])
+        else:
+            month = pd.Period(key, freq="M")
+            first, last = month.start_time, month.end_time
+        if (lower is None or last >= lower) and (upper is None or first < upper):
+            selected.append(key)
+    return selected
+
+def read_partitioned(directory, name, start=None, end=None, columns=None, parse_dates=None,
+                     partitions=None, date_col=None) -> pd.DataFrame:
+    """
+    Lê uma tabela particionada abrindo só as partições do período pedido.
+    - start/end: período (fim inclusivo; data sem hora cobre o dia inteiro)
+    - columns: projeção de colunas
+    - partitions: restringe ainda mais a leitura a essas partições (ex.: meses pendentes)
+    - date_col: coluna de datas do filtro (padrão: a registrada no manifesto)
+    Sem período e sem partições, o resultado é igual ao de load_table.
+    """
+    root = find_table(directory, name)
+    dated = start is not None or end is not None
+    if dated:
+        date_col = date_col or (partition_manifest(directory, name) or {}).get("coluna_data")
+        if date_col is None:
+            raise ValueError(f"Tabela '{name}' sem coluna de datas no manifesto: informe date_col")
+    read_cols = columns if not dated or columns is None or date_col in columns else list(columns) + [date_col]
+    read_dates = list(parse_dates or []) + ([date_col] if dated else [])
+
+    if root.is_dir():
+        keys = prune_partitions(directory, name, start, end)
+        if partitions is not None:
+            wanted = set(partitions)
+            keys = [k for k in keys if k in wanted]
+        df = load_partitions(directory, name, keys, read_cols, read_dates or None)
+    else:
+        df = load_table(directory, name, read_cols, read_dates or None)
+    if not dated:
+        return df
+
+    lower, upper = _day_range(start, end)
+    mask = df[date_col].notna()
+    if lower is not None:
+        mask &= df[date_col] >= lower
+    if upper is not None:
+        mask &= df[date_col] < upper
+    df = df[mask.to_numpy()].reset_index(drop=True)
+    return df if read_cols is columns else df.drop(columns=[date_col])
@@ -0,0 +1,146 @@
+# ============================================================
+# streaming.py
+# Modo streaming (02/03 --streaming): a tabela fato é percorrida em blocos
+# cujo tamanho vem de um orçamento de memória, não do tamanho da entrada.
+#
+#  - O nº de linhas por bloco é estimado a partir de uma amostra da própria
+#    tabela: (orçamento - memória já residente) / (bytes por linha × cópias)
+#  - Parquet é lido por lotes (iter_batches) e CSV com chunksize: nenhuma
+#    parte do arquivo é carregada inteira
+#  - Quem consome os blocos guarda apenas agregados acumulados
+#    (RunningAggregate): os parciais de cada bloco são combinados sempre que
+#    passam da cota de agregados do orçamento
+#
+# Exemplo:
+#   stream = ChunkStream(budget_mb=512, reserved_mb=memory_mb(contas))
+#   for chunk in stream.chunks(PROCESSED_DIR, "transacoes", columns=[...]):
+#       ...
+# ============================================================
+
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from compaction import memory_mb
+from storage import (
+    PARTITION_COLUMN, concat_frames, find_table, load_partitions, load_table, table_format,
+)
+
+BUDGET_ENV = "BANVIC_MEMORY_MB"
+DEFAULT_BUDGET_MB = int(os.environ.get(BUDGET_ENV, 1024))
+
+# Cópias de um bloco vivas ao mesmo tempo durante as transformações
+# (original, convertido, colunas derivadas, junções): margem de segurança
+WORKING_COPIES = 4
+SAMPLE_ROWS = 10_000
+MIN_CHUNK_ROWS = 1_000
+# Fração mínima do orçamento reservada aos blocos, mesmo com muita memória residente
+MIN_CHUNK_SHARE = 0.1
+# Fração da memória disponível para parciais ainda não combinados
+AGGREGATE_SHARE = 0.25
+
+
+def _table_files(directory, name, partitions=None) -> list:
+    """Arquivos da tabela na ordem de load_table (ou só os das partições pedidas)"""
+    path = find_table(directory, name)
+    if not path.is_dir():
+        return [path]
+    if partitions is None:
+        return sorted(path.rglob(f"part-*{path.suffix}"))
+    files = []
+    for key in sorted(partitions):
+        files += sorted((path / f"{PARTITION_COLUMN}={key}").glob(f"part-*{path.suffix}"))
+    return files
+
+def _iter_batches(directory, name, chunk_rows, columns=None, parse_dates=None, partitions=None):
+    for path in _table_files(directory, name, partitions):
+        if table_format(path) == "parquet":
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        else:
+            dates = [c for c in (parse_dates or []) if columns is None or c in columns]
+            yield from pd.read_csv(path, encoding="utf-8", usecols=columns,
+                                   parse_dates=dates or None, chunksize=chunk_rows)
+
+def iter_table_chunks(directory, name, chunk_rows, columns=None, parse_dates=None, partitions=None):
+    """
+    Blocos de até chunk_rows linhas de uma tabela salva (arquivo único, partes
+    ou partições mensais). Sempre produz ao menos um bloco (vazio, com o esquema).
+    """
+    produced = False
+    pending, rows = [], 0
+    for batch in _iter_batches(directory, name, chunk_rows, columns, parse_dates, partitions):
+        # Partes pequenas (ex.: uma por mês) são juntadas até o tamanho do bloco
+        if pending and rows + len(batch) > chunk_rows:
+            produced = True
+            yield concat_frames(pending)
+            pending, rows = [], 0
+        pending.append(batch)
+        rows += len(batch)
+    if pending:
+        produced = True
+        yield concat_frames(pending)
+    if not produced:
+        # Tabela (ou seleção de partições) vazia: um bloco vazio, com o esquema
+        yield (load_table(directory, name, columns, parse_dates) if partitions is None
+               else load_partitions(directory, name, [], columns, parse_dates))
+
+
+class RunningAggregate:
+    """
+    Acumula agregados parciais. combine(lista de parciais) → um parcial.
+    Os parciais novos só são combinados com o acumulado quando passam da
+    cota: poucas combinações, cada uma sobre um volume limitado de parciais.
+    """
+
+    def __init__(self, combine, quota_mb):
+        self.combine = combine
+        self.quota_mb = quota_mb
+        self.total = None
+        self.pending = []
+        self.pending_mb = 0.0
+
+    def add(self, part):
+        self.pending.append(part)
+        self.pending_mb += memory_mb(part)
+        if self.pending_mb > self.quota_mb:
+            self.total = self.combine([self.total] + self.pending)
+            self.pending, self.pending_mb = [], 0.0
+
+    def result(self):
+        parts = [p for p in [self.total] + self.pending if p is not None]
+        return parts[0] if len(parts) == 1 else self.combine(parts)
+
+
+class ChunkStream:
+    """Leitura em blocos com o tamanho definido pelo orçamento de memória"""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, reserved_mb=0.0):
+        self.budget_mb = budget_mb
+        self.reserved_mb = reserved_mb
+        available = max(budget_mb - reserved_mb, budget_mb * MIN_CHUNK_SHARE)
+        self.aggregate_mb = available * AGGREGATE_SHARE
+        self.chunk_mb = available - self.aggregate_mb
+        self._rows = {}
+
+    def chunk_rows(self, directory, name, columns=None, copies=WORKING_COPIES) -> int:
+        """
+        Linhas por bloco para a tabela, estimadas a partir de uma amostra.
+        copies: memória de trabalho por bloco, em múltiplos do bloco lido
+        (operações com junções e groupby largos pedem mais).
+        """
+        key = (str(directory), name, tuple(columns or []), copies)
+        if key not in self._rows:
+            sample = next(iter_table_chunks(directory, name, SAMPLE_ROWS, columns))
+            per_row = memory_mb(sample) / max(len(sample), 1)
+            rows = int(self.chunk_mb / (per_row * copies)) if per_row else SAMPLE_ROWS
+            self._rows[key] = max(MIN_CHUNK_ROWS, rows)
+        return self._rows[key]
+
+    def chunks(self, directory, name, columns=None, parse_dates=None, partitions=None, copies=WORKING_COPIES):
+        rows = self.chunk_rows(directory, name, columns, copies)
+        return iter_table_chunks(directory, name, rows, columns, parse_dates, partitions)
+
+    def aggregate(self, combine) -> RunningAggregate:
+        return RunningAggregate(combine, self.aggregate_mb)
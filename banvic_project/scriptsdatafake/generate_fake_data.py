@@ -1,11 +1,29 @@
+# Gera os CSVs fake das sete tabelas.
+#
+# Modo padrão (amostra pequena, linha a linha com Faker):
+#   python generate_fake_data.py
+#
+# Modo escala (NumPy em lotes, shards gravados em paralelo):
+#   python generate_fake_data.py --transacoes 10000000 --processos 8 --saida /dados/raw
+#   Nomes, e-mails e endereços saem de pools pré-amostrados do Faker; números,
+#   datas e chaves são sorteados com NumPy. Cada shard tem semente própria
+#   derivada de --seed, então a saída não depende do nº de processos.
+
+import argparse
 import csv
+import os
 import random
-from faker import Faker
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from faker import Faker
 
 fake = Faker("pt_BR")
-Faker.seed(42)
-random.seed(42)
 
 # ------------------- Funções auxiliares -------------------
 
@@ -175,8 +193,315 @@ def gerar_transacoes(contas, qtd=200):
         transacoes.append(transacao)
     return transacoes
 
+# ------------------- Modo escala: auxiliares vetorizados -------------------
+
+POOL_SIZE = 5000                 # valores pré-amostrados do Faker por campo
+LINHAS_POR_SHARD = 5_000_000
+LINHAS_POR_LOTE = 500_000        # memória por processo ~ um lote
+
+TIPOS_AGENCIA = ["Física", "Digital"]
+CIDADES = ["São Paulo", "Campinas", "Osasco", "Porto Alegre",
+           "Rio de Janeiro", "Florianópolis", "Recife", "Curitiba"]
+STATUS_PROPOSTA = ["Enviada", "Aprovada", "Rejeitada"]
+PARCELAS = [12, 24, 36, 48, 60, 100]
+TIPOS_TRANSACAO = ["Saque", "Depósito", "Transferência", "Pagamento"]
+
+def gerar_pools(seed, tamanho=POOL_SIZE):
+    """Amostra uma vez os campos de texto do Faker (nomes, e-mails, endereços, CEPs)"""
+    Faker.seed(seed)
+    return {
+        "primeiro_nome": np.array([fake.first_name() for _ in range(tamanho)], dtype=object),
+        "ultimo_nome": np.array([fake.last_name() for _ in range(tamanho)], dtype=object),
+        "email": np.array([fake.email() for _ in range(tamanho)], dtype=object),
+        "endereco": np.array([fake.address().replace("\n", " ") for _ in range(tamanho)], dtype=object),
+        "cep": np.array([fake.postcode() for _ in range(tamanho)], dtype=object),
+        "cidade": np.array([fake.city() for _ in range(tamanho)], dtype=object),
+        "uf": np.array([fake.estado_sigla() for _ in range(tamanho)], dtype=object),
+    }
+
+def _sortear(rng, pool, n):
+    return pool[rng.integers(0, len(pool), n)]
+
+def _mix64(ids, seed):
+    # splitmix64: hash determinístico de um id (mesmo resultado em qualquer shard)
+    x = ids.astype(np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def tipo_cliente(cod_cliente, seed):
+    """PF/PJ como função do código: contas herdam o tipo do cliente sem consultar a tabela"""
+    return np.where(_mix64(cod_cliente, seed) & np.uint64(1), "PJ", "PF").astype(object)
+
+def _formatar_digitos(digitos, mascara):
+    # digitos: matriz (n, k) de 0-9; mascara: "#" marca as posições dos dígitos
+    out = np.empty((len(digitos), len(mascara)), dtype=np.uint8)
+    pos = [i for i, c in enumerate(mascara) if c == "#"]
+    for i, c in enumerate(mascara):
+        if c != "#":
+            out[:, i] = ord(c)
+    out[:, pos] = digitos + ord("0")
+    return out.view(f"S{len(mascara)}").ravel().astype(str).astype(object)
+
+def _digito_verificador(digitos, pesos):
+    resto = (digitos * np.array(pesos)).sum(axis=1) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+def gerar_cpfs(rng, n):
+    d = rng.integers(0, 10, (n, 11))
+    d[:, 9] = _digito_verificador(d[:, :9], range(10, 1, -1))
+    d[:, 10] = _digito_verificador(d[:, :10], range(11, 1, -1))
+    return _formatar_digitos(d, "###.###.###-##")
+
+def gerar_cnpjs(rng, n):
+    d = rng.integers(0, 10, (n, 14))
+    d[:, 8:12] = [0, 0, 0, 1]
+    d[:, 12] = _digito_verificador(d[:, :12], [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    d[:, 13] = _digito_verificador(d[:, :13], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    return _formatar_digitos(d, "##.###.###/####-##")
+
+def gerar_ceps(rng, pool, n):
+    """CEPs do pool; metade perde o hífen, como em gerar_cep"""
+    ceps = _sortear(rng, pool, n)
+    sem_hifen = rng.random(n) >= 0.5
+    ceps[sem_hifen] = [c.replace("-", "") for c in ceps[sem_hifen]]
+    return ceps
+
+def gerar_datas(rng, n, inicio, fim, com_hora=False, com_micro=False):
+    """
+    Equivalente vetorizado de gerar_data. com_micro pode ser bool ou máscara por linha.
+    Formatos: "2023-12-12", "2023-12-12 14:44:50 UTC", "2023-12-12 14:44:50.123456 UTC"
+    """
+    start = np.datetime64(inicio, "s")
+    dias = (np.datetime64(fim, "D") - np.datetime64(inicio, "D")).astype(np.int64)
+    segundos = rng.integers(0, dias + 1, n) * 86400 + rng.integers(0, 86401, n)
+    momentos = start + segundos.astype("timedelta64[s]")
+    if not com_hora:
+        return np.datetime_as_string(momentos, unit="D").astype(object)
+
+    micro = np.broadcast_to(np.asarray(com_micro, dtype=bool), (n,))
+    out = np.empty(n, dtype=object)
+    for mascara, unidade in ((~micro, "s"), (micro, "us")):
+        if not mascara.any():
+            continue
+        m = momentos[mascara]
+        if unidade == "us":
+            m = m.astype("datetime64[us]") + rng.integers(0, 1_000_000, len(m)).astype("timedelta64[us]")
+        texto = np.datetime_as_string(m, unit=unidade)
+        texto.view(np.uint32).reshape(len(texto), -1)[:, 10] = ord(" ")   # "T" → " "
+        out[mascara] = np.char.add(texto, " UTC")
+    return out
+
+def _uniforme(rng, n, min_val=10, max_val=200000):
+    return rng.uniform(min_val, max_val, n)
+
+
+# ------------------- Modo escala: tabelas em lotes -------------------
+# Cada função recebe os ids do lote (já contíguos) e devolve um DataFrame
+# com as colunas de CAMPOS[tabela].
+
+def lote_agencias(rng, ids, pools, ctx):
+    n = len(ids)
+    return pd.DataFrame({
+        "cod_agencia": ids,
+        "nome": "Agência " + _sortear(rng, pools["cidade"], n),
+        "endereco": _sortear(rng, pools["endereco"], n),
+        "cidade": np.array(CIDADES, dtype=object)[rng.integers(0, len(CIDADES), n)],
+        "uf": _sortear(rng, pools["uf"], n),
+        "data_abertura": gerar_datas(rng, n, "2010-01-01", "2023-12-31"),
+        "tipo_agencia": np.array(TIPOS_AGENCIA, dtype=object)[rng.integers(0, 2, n)],
+    })
+
+def lote_clientes(rng, ids, pools, ctx):
+    n = len(ids)
+    tipo = tipo_cliente(ids, ctx["seed"])
+    pf = tipo == "PF"
+    doc = gerar_cnpjs(rng, n)
+    doc[pf] = gerar_cpfs(rng, int(pf.sum()))
+    nascimento = np.full(n, "", dtype=object)
+    nascimento[pf] = gerar_datas(rng, int(pf.sum()), "1940-01-01", "2005-12-31")
+    return pd.DataFrame({
+        "cod_cliente": ids,
+        "primeiro_nome": _sortear(rng, pools["primeiro_nome"], n),
+        "ultimo_nome": _sortear(rng, pools["ultimo_nome"], n),
+        "email": _sortear(rng, pools["email"], n),
+        "tipo_cliente": tipo,
+        "data_inclusao": gerar_datas(rng, n, "2015-01-01", "2023-12-31", com_hora=True),
+        "cpfcnpj": doc,
+        "data_nascimento": nascimento,
+        "endereco": _sortear(rng, pools["endereco"], n),
+        "cep": gerar_ceps(rng, pools["cep"], n),
+    })
+
+def lote_colaboradores(rng, ids, pools, ctx):
+    n = len(ids)
+    return pd.DataFrame({
+        "cod_colaborador": ids,
+        "primeiro_nome": _sortear(rng, pools["primeiro_nome"], n),
+        "ultimo_nome": _sortear(rng, pools["ultimo_nome"], n),
+        "email": _sortear(rng, pools["email"], n),
+        "cpf": gerar_cpfs(rng, n),
+        "data_nascimento": gerar_datas(rng, n, "1950-01-01", "2000-12-31"),
+        "endereco": _sortear(rng, pools["endereco"], n),
+        "cep": gerar_ceps(rng, pools["cep"], n),
+    })
+
+def lote_colaborador_agencia(rng, ids, pools, ctx):
+    return pd.DataFrame({
+        "cod_colaborador": ids,
+        "cod_agencia": rng.integers(1, ctx["agencias"] + 1, len(ids)),
+    })
+
+def lote_contas(rng, ids, pools, ctx):
+    n = len(ids)
+    cod_cliente = rng.integers(1, ctx["clientes"] + 1, n)
+    return pd.DataFrame({
+        "num_conta": ids,
+        "cod_cliente": cod_cliente,
+        "cod_agencia": rng.integers(1, ctx["agencias"] + 1, n),
+        "cod_colaborador": rng.integers(1, ctx["colaboradores"] + 1, n),
+        "tipo_conta": tipo_cliente(cod_cliente, ctx["seed"]),
+        "data_abertura": gerar_datas(rng, n, "2010-01-01", "2022-12-31", com_hora=True),
+        "saldo_total": _uniforme(rng, n),
+        "saldo_disponivel": _uniforme(rng, n),
+        "data_ultimo_lancamento": gerar_datas(rng, n, "2010-01-01", "2023-12-31", com_hora=True, com_micro=True),
+    })
+
+def lote_propostas(rng, ids, pools, ctx):
+    n = len(ids)
+    valor_proposta = _uniforme(rng, n, 1000, 200000)
+    valor_entrada = valor_proposta * rng.uniform(0.1, 0.4, n)
+    valor_financiamento = valor_proposta + valor_entrada
+    qtd_parcelas = np.array(PARCELAS)[rng.integers(0, len(PARCELAS), n)]
+    return pd.DataFrame({
+        "cod_proposta": ids,
+        "cod_cliente": rng.integers(1, ctx["clientes"] + 1, n),
+        "cod_colaborador": rng.integers(1, ctx["colaboradores"] + 1, n),
+        "data_entrada_proposta": gerar_datas(rng, n, "2010-01-01", "2023-12-31", com_hora=True),
+        "taxa_juros_mensal": np.round(rng.uniform(0.01, 0.03, n), 4),
+        "valor_proposta": valor_proposta,
+        "valor_financiamento": valor_financiamento,
+        "valor_entrada": valor_entrada,
+        "valor_prestacao": valor_financiamento / qtd_parcelas,
+        "quantidade_parcelas": qtd_parcelas,
+        "carencia": rng.integers(0, 7, n),
+        "status_proposta": np.array(STATUS_PROPOSTA, dtype=object)[rng.integers(0, len(STATUS_PROPOSTA), n)],
+    })
+
+def lote_transacoes(rng, ids, pools, ctx):
+    n = len(ids)
+    valor = rng.uniform(10, 5000, n)
+    valor = np.where(rng.random(n) < 0.5, -valor, valor)   # saque/pagamento negativo
+    return pd.DataFrame({
+        "cod_transacao": ids,
+        "num_conta": rng.integers(1, ctx["contas"] + 1, n),
+        "data_transacao": gerar_datas(rng, n, "2015-01-01", "2023-12-31", com_hora=True,
+                                      com_micro=rng.random(n) < 0.3),
+        "nome_transacao": np.array(TIPOS_TRANSACAO, dtype=object)[rng.integers(0, len(TIPOS_TRANSACAO), n)],
+        "valor_transacao": np.round(valor, 2),
+    })
+
+LOTES = {
+    "agencias": lote_agencias,
+    "clientes": lote_clientes,
+    "colaboradores": lote_colaboradores,
+    "colaborador_agencia": lote_colaborador_agencia,
+    "contas": lote_contas,
+    "propostas_credito": lote_propostas,
+    "transacoes": lote_transacoes,
+}
+
+def dimensionar(transacoes) -> dict:
+    """Tamanho de cada tabela a partir do nº de transações (proporções da amostra original)"""
+    contas = max(200, transacoes // 50)
+    clientes = max(100, contas // 2)
+    colaboradores = max(30, clientes // 500)
+    return {
+        "agencias": max(10, colaboradores // 20),
+        "clientes": clientes,
+        "colaboradores": colaboradores,
+        "colaborador_agencia": colaboradores,
+        "contas": contas,
+        "propostas_credito": max(50, transacoes // 20),
+        "transacoes": transacoes,
+    }
+
+
+# ------------------- Modo escala: shards em paralelo -------------------
+
+def gerar_shard(tarefa) -> int:
+    """Gera um shard (faixa contígua de ids) em lotes e grava em CSV"""
+    tabela, shard, inicio, linhas, caminho, pools, ctx = tarefa
+    ordem = list(LOTES).index(tabela)
+    rng = np.random.default_rng(np.random.SeedSequence(ctx["seed"], spawn_key=(ordem, shard)))
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        for lote in range(inicio, inicio + linhas, LINHAS_POR_LOTE):
+            ids = np.arange(lote, min(lote + LINHAS_POR_LOTE, inicio + linhas), dtype=np.int64)
+            df = LOTES[tabela](rng, ids, pools, ctx)
+            # Todo shard leva cabeçalho: com --manter-shards cada parte é um CSV completo
+            df.to_csv(f, index=False, header=(lote == inicio), lineterminator="\r\n")
+    return linhas
+
+def juntar_shards(shards, destino):
+    """Concatena os shards em bytes, mantendo só o cabeçalho do primeiro"""
+    with open(destino, "wb") as out:
+        for i, shard in enumerate(shards):
+            with open(shard, "rb") as f:
+                if i:
+                    f.readline()
+                shutil.copyfileobj(f, out, length=16 * 1024 * 1024)
+
+def gerar_escala(transacoes, saida, processos, linhas_por_shard=LINHAS_POR_SHARD,
+                 seed=42, manter_shards=False):
+    saida = Path(saida)
+    saida.mkdir(parents=True, exist_ok=True)
+    tamanhos = dimensionar(transacoes)
+    ctx = dict(tamanhos, seed=seed)
+    pools = gerar_pools(seed)
+
+    tarefas, shards = [], {}
+    for tabela, total in tamanhos.items():
+        pasta = saida / f"{tabela}_fake.shards"
+        pasta.mkdir(exist_ok=True)
+        shards[tabela] = []
+        for shard, inicio in enumerate(range(1, total + 1, linhas_por_shard)):
+            caminho = pasta / f"part-{shard:05d}.csv"
+            linhas = min(linhas_por_shard, total + 1 - inicio)
+            tarefas.append((tabela, shard, inicio, linhas, caminho, pools, ctx))
+            shards[tabela].append(caminho)
+
+    t0 = time.time()
+    if processos > 1:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            list(pool.map(gerar_shard, tarefas))
+    else:
+        for tarefa in tarefas:
+            gerar_shard(tarefa)
+    print(f"🧩 {len(tarefas)} shards gerados em {time.time() - t0:.1f}s ({processos} processo(s))")
+
+    if manter_shards:
+        return
+    for tabela, partes in shards.items():
+        juntar_shards(partes, saida / f"{tabela}_fake.csv")
+        shutil.rmtree(partes[0].parent)
+        print(f"✅ {tabela}_fake.csv: {tamanhos[tabela]:,} linhas".replace(",", "."))
+
 # ------------------- Função de salvar -------------------
 
+CAMPOS = {
+    "agencias": ["cod_agencia","nome","endereco","cidade","uf","data_abertura","tipo_agencia"],
+    "clientes": ["cod_cliente","primeiro_nome","ultimo_nome","email","tipo_cliente",
+                 "data_inclusao","cpfcnpj","data_nascimento","endereco","cep"],
+    "colaboradores": ["cod_colaborador","primeiro_nome","ultimo_nome","email","cpf","data_nascimento","endereco","cep"],
+    "colaborador_agencia": ["cod_colaborador","cod_agencia"],
+    "contas": ["num_conta","cod_cliente","cod_agencia","cod_colaborador","tipo_conta",
+               "data_abertura","saldo_total","saldo_disponivel","data_ultimo_lancamento"],
+    "propostas_credito": ["cod_proposta","cod_cliente","cod_colaborador","data_entrada_proposta","taxa_juros_mensal",
+                          "valor_proposta","valor_financiamento","valor_entrada","valor_prestacao","quantidade_parcelas",
+                          "carencia","status_proposta"],
+    "transacoes": ["cod_transacao","num_conta","data_transacao","nome_transacao","valor_transacao"],
+}
+
 def salvar_csv(nome_arquivo, lista, campos):
     with open(nome_arquivo, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=campos)
@@ -185,37 +510,47 @@ def salvar_csv(nome_arquivo, lista, campos):
 
 # ------------------- Execução -------------------
 
-agencias = gerar_agencias(10)
-clientes = gerar_clientes(100)
-colaboradores = gerar_colaboradores(30)
-colab_agencia = gerar_colaborador_agencia(colaboradores, agencias)
-contas = gerar_contas(clientes, agencias, colaboradores, 200)
-propostas = gerar_propostas(clientes, colaboradores, 50)
-transacoes = gerar_transacoes(contas, 300)
-
-salvar_csv("agencias_fake.csv", agencias,
-           ["cod_agencia","nome","endereco","cidade","uf","data_abertura","tipo_agencia"])
+def gerar_amostra(saida, seed=42):
+    """Amostra pequena original (linha a linha com Faker)"""
+    Faker.seed(seed)
+    random.seed(seed)
+    saida = Path(saida)
 
-salvar_csv("clientes_fake.csv", clientes,
-           ["cod_cliente","primeiro_nome","ultimo_nome","email","tipo_cliente",
-            "data_inclusao","cpfcnpj","data_nascimento","endereco","cep"])
+    agencias = gerar_agencias(10)
+    clientes = gerar_clientes(100)
+    colaboradores = gerar_colaboradores(30)
+    colab_agencia = gerar_colaborador_agencia(colaboradores, agencias)
+    contas = gerar_contas(clientes, agencias, colaboradores, 200)
+    propostas = gerar_propostas(clientes, colaboradores, 50)
+    transacoes = gerar_transacoes(contas, 300)
 
-salvar_csv("colaboradores_fake.csv", colaboradores,
-           ["cod_colaborador","primeiro_nome","ultimo_nome","email","cpf","data_nascimento","endereco","cep"])
+    tabelas = {
+        "agencias": agencias, "clientes": clientes, "colaboradores": colaboradores,
+        "colaborador_agencia": colab_agencia, "contas": contas,
+        "propostas_credito": propostas, "transacoes": transacoes,
+    }
+    for nome, lista in tabelas.items():
+        salvar_csv(saida / f"{nome}_fake.csv", lista, CAMPOS[nome])
 
-salvar_csv("colaborador_agencia_fake.csv", colab_agencia,
-           ["cod_colaborador","cod_agencia"])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os CSVs fake das sete tabelas")
+    parser.add_argument("--transacoes", type=int, default=None,
+                        help="nº de transações; ativa o modo escala (NumPy em lotes, shards paralelos)")
+    parser.add_argument("--saida", default=".", help="pasta de saída (padrão: pasta atual)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--linhas-por-shard", type=int, default=LINHAS_POR_SHARD)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--manter-shards", action="store_true",
+                        help="não junta os shards em um único CSV por tabela")
+    args = parser.parse_args(argv)
 
-salvar_csv("contas_fake.csv", contas,
-           ["num_conta","cod_cliente","cod_agencia","cod_colaborador","tipo_conta",
-            "data_abertura","saldo_total","saldo_disponivel","data_ultimo_lancamento"])
-
-salvar_csv("propostas_credito_fake.csv", propostas,
-           ["cod_proposta","cod_cliente","cod_colaborador","data_entrada_proposta","taxa_juros_mensal",
-            "valor_proposta","valor_financiamento","valor_entrada","valor_prestacao","quantidade_parcelas",
-            "carencia","status_proposta"])
+    if args.transacoes is None:
+        gerar_amostra(args.saida, args.seed)
+    else:
+        gerar_escala(args.transacoes, args.saida, args.processos, args.linhas_por_shard,
+                     args.seed, args.manter_shards)
+    print("✅ Arquivos gerados com sucesso!")
 
-salvar_csv("transacoes_fake.csv", transacoes,
-           ["cod_transacao","num_conta","data_transacao","nome_transacao","valor_transacao"])
 
-print("✅ Arquivos gerados com sucesso!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+# Os scripts importam os módulos irmãos pelo nome (como ao rodar scripts/*.py)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
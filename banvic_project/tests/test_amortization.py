@@ -0,0 +1,82 @@
+# ============================================================
+# Cronogramas em lote de amortization._schedule (Price e SAC)
+#  - principal quitado e saldo final zero, com e sem carência
+#  - carência: sem prestação, juros incorporados ao saldo
+#  - taxa zero (ramo sem divisão por r)
+# ============================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from amortization import SYSTEMS, _schedule
+
+
+def batch(*rows) -> pd.DataFrame:
+    """Propostas (valor_financiamento, taxa_juros_mensal, quantidade_parcelas, carencia)"""
+    return pd.DataFrame(rows, columns=["valor_financiamento", "taxa_juros_mensal",
+                                       "quantidade_parcelas", "carencia"])
+
+PROPOSTAS = batch(
+    (10_000.0, 0.02, 12, 0),
+    (25_000.0, 0.015, 24, 3),
+    (5_000.0, 0.0, 10, 2),
+    (1_000.0, 0.01, 1, 0),
+)
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_principal_fully_amortized_and_final_balance_zero(system):
+    m = _schedule(PROPOSTAS, system)
+    principal = PROPOSTAS["valor_financiamento"].to_numpy()
+    last = (PROPOSTAS["carencia"] + PROPOSTAS["quantidade_parcelas"]).to_numpy()
+    rows = np.arange(len(PROPOSTAS))
+
+    # Amortização total (negativa na carência) devolve exatamente o principal
+    np.testing.assert_allclose(m["amortizacao"].sum(axis=1), principal, rtol=1e-9)
+    np.testing.assert_allclose(m["prestacao"].sum(axis=1), principal + m["juros"].sum(axis=1), rtol=1e-9)
+    assert (m["saldo_devedor"][rows, last] == 0).all()
+    # Depois da última parcela nada mais é cobrado
+    t = np.arange(m["saldo_devedor"].shape[1])
+    after = t[None, :] > last[:, None]
+    assert (m["prestacao"][after] == 0).all() and (m["saldo_devedor"][after] == 0).all()
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_period_zero_is_the_financed_amount(system):
+    m = _schedule(PROPOSTAS, system)
+    np.testing.assert_array_equal(m["saldo_devedor"][:, 0], PROPOSTAS["valor_financiamento"])
+    assert (m["prestacao"][:, 0] == 0).all() and (m["juros"][:, 0] == 0).all()
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_grace_capitalizes_interest_without_installments(system):
+    p = batch((25_000.0, 0.015, 24, 3))
+    m = _schedule(p, system)
+    expected = 25_000.0 * 1.015 ** np.arange(4)
+    np.testing.assert_allclose(m["saldo_devedor"][0, :4], expected, rtol=1e-12)
+    assert (m["prestacao"][0, 1:4] == 0).all()
+    np.testing.assert_allclose(m["amortizacao"][0, 1:4], -m["juros"][0, 1:4])
+    assert m["prestacao"][0, 4] > 0
+
+def test_price_installment_is_constant_annuity():
+    m = _schedule(batch((25_000.0, 0.015, 24, 3)), "price")
+    base = 25_000.0 * 1.015 ** 3
+    payment = base * 0.015 / (1 - 1.015 ** -24)
+    np.testing.assert_allclose(m["prestacao"][0, 4:28], payment, rtol=1e-12)
+
+def test_sac_amortization_is_constant_and_installments_decrease():
+    m = _schedule(batch((25_000.0, 0.015, 24, 3)), "sac")
+    base = 25_000.0 * 1.015 ** 3
+    np.testing.assert_allclose(m["amortizacao"][0, 4:28], base / 24, rtol=1e-12)
+    assert (np.diff(m["prestacao"][0, 4:28]) < 0).all()
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_zero_rate_splits_principal_evenly(system):
+    m = _schedule(batch((5_000.0, 0.0, 10, 2)), system)
+    assert (m["juros"] == 0).all()
+    np.testing.assert_array_equal(m["saldo_devedor"][0, :3], 5_000.0)
+    np.testing.assert_allclose(m["prestacao"][0, 3:13], 500.0)
+    np.testing.assert_allclose(m["saldo_devedor"][0, 3:13], 5_000.0 - 500.0 * np.arange(1, 11), atol=1e-9)
+
+def test_unknown_system_is_rejected():
+    with pytest.raises(ValueError):
+        _schedule(PROPOSTAS, "americano")
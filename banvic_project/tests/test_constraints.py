@@ -0,0 +1,118 @@
+# ============================================================
+# Validação de chaves (constraints.py)
+#  - KeyIndex: runs ordenados fundidos por porte, busca em todos os runs
+#  - SortedRuns: repetições achadas na fusão dos runs gravados em disco
+#  - PK e FK bloco a bloco: repetições e faltas entre blocos, chaves nulas
+#    ou não inteiras, mesmo resultado em memória, em blocos e relido
+#  - quarentena: linhas violadas gravadas; falha no meio não substitui a anterior
+# ============================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from constraints import ConstraintValidator, KeyIndex, SortedRuns
+from storage import load_table
+
+PKS = {"contas": ["num_conta"], "transacoes": ["cod_transacao"]}
+FKS = [("transacoes", "num_conta", "contas", "num_conta")]
+
+
+def validator(quarantine_dir=None) -> ConstraintValidator:
+    v = ConstraintValidator(primary_keys=PKS, foreign_keys=FKS, quarantine_dir=quarantine_dir)
+    v.add_parent("contas", pd.DataFrame({"num_conta": [1, 2, 3]}))
+    return v
+
+def transacoes() -> pd.DataFrame:
+    # Em blocos de 3: a posição 4 repete a 3 (mesmo bloco), a 7 repete a 0
+    # (bloco anterior); as contas 7 e 9 não existem
+    return pd.DataFrame({
+        "cod_transacao": [1, 2, 3, 4, 4, 5, 6, 1, 7],
+        "num_conta": [1, 7, 2, 3, 1, 9, 2, 3, 1],
+    })
+
+def chunks(df, size=3):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+def by_name(results) -> dict:
+    return {r["restricao"]: r for r in results}
+
+
+def test_key_index_merges_runs_and_searches_all_of_them():
+    index = KeyIndex()
+    for block in ([5, 1, 5], [9], [3, 2], [100, 7, 8, 4], [6]):
+        index.add(np.array(block, dtype=np.uint64))
+
+    # Cada run ordenado, sem repetição, e os portes decrescentes (fusão por porte)
+    sizes = [len(run) for run in index.runs]
+    assert sizes == sorted(sizes, reverse=True)
+    assert len(index.runs) < 5
+    for run in index.runs:
+        assert (np.diff(run.astype(np.int64)) > 0).all()
+
+    probe = np.array([1, 2, 5, 6, 9, 100, 0, 10, 99], dtype=np.uint64)
+    assert index.contains(probe).tolist() == [True] * 6 + [False] * 3
+
+
+def test_sorted_runs_find_repeats_across_key_ranges(tmp_path):
+    rng = np.random.default_rng(0)
+    keys = rng.integers(0, 400, 1_000).astype(np.uint64)
+    runs = SortedRuns(tmp_path)
+    for start in range(0, len(keys), 100):
+        runs.add(keys[start:start + 100], np.arange(start, min(start + 100, len(keys))))
+
+    # Posições de todas as ocorrências, menos a primeira de cada chave
+    expected = np.flatnonzero(pd.Series(keys).duplicated().to_numpy())
+    np.testing.assert_array_equal(runs.duplicates(), expected)
+
+
+@pytest.mark.parametrize("form", ["frame", "blocos", "relida"])
+def test_pk_and_fk_violations_across_chunks(form):
+    df = transacoes()
+    data = {"frame": df, "blocos": chunks(df), "relida": lambda: iter(chunks(df))}[form]
+    results = by_name(validator().validate("transacoes", data))
+
+    pk = results["PK transacoes(cod_transacao)"]
+    assert pk["violacoes"] == 2
+    # A primeira ocorrência fica; as repetições (posições 4 e 7) são as violadas
+    assert sorted(pk["exemplos"].index) == [4, 7]
+
+    fk = results["FK transacoes.num_conta → contas.num_conta"]
+    assert fk["violacoes"] == 2
+    assert fk["exemplos"]["num_conta"].tolist() == [7, 9]
+
+
+def test_null_and_non_integral_keys_are_violations():
+    df = pd.DataFrame({
+        "cod_transacao": [1.0, np.nan, 2.5, np.inf, 2.0, 1.0],
+        # 2.0 é a conta 2 (numérica, como no pai); nulo e 1.5 não batem com nenhuma conta
+        "num_conta": [2.0, 1.0, np.nan, 1.5, 3.0, 1.0],
+    })
+    for data in (df, lambda: iter(chunks(df, 2))):
+        results = by_name(validator().validate("transacoes", data))
+        pk = results["PK transacoes(cod_transacao)"]
+        # nulo, 2.5 e infinito, mais a repetição de 1.0; 2.5 nunca vira 2
+        assert pk["violacoes"] == 4
+        assert sorted(pk["exemplos"].index) == [1, 2, 3, 5]
+        fk = results["FK transacoes.num_conta → contas.num_conta"]
+        assert sorted(fk["exemplos"].index) == [2, 3]
+
+
+def test_quarantine_writes_violations_and_keeps_previous_on_failure(tmp_path):
+    df = transacoes()
+    validator(tmp_path).validate("transacoes", lambda: iter(chunks(df)))
+
+    pk = load_table(tmp_path, "transacoes_pk")
+    fk = load_table(tmp_path, "transacoes_num_conta")
+    pd.testing.assert_frame_equal(pk.sort_values("cod_transacao", ignore_index=True),
+                                  df.iloc[[7, 4]].sort_values("cod_transacao", ignore_index=True))
+    pd.testing.assert_frame_equal(fk, df.iloc[[1, 5]].reset_index(drop=True))
+
+    def failing():
+        yield df.iloc[:3]
+        raise OSError("leitura interrompida")
+
+    with pytest.raises(OSError):
+        validator(tmp_path).validate("transacoes", failing())
+    # Quarentena parcial descartada: os arquivos da execução anterior ficam
+    pd.testing.assert_frame_equal(load_table(tmp_path, "transacoes_num_conta"), fk)
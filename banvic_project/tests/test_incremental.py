@@ -0,0 +1,71 @@
+# ============================================================
+# Seleção do incremento (incremental.py)
+#  - linhas novas viram parte nova do mês; atrasadas (data antiga, chave
+#    inédita) levam o mês inteiro para reescrita
+#  - months_to_check: meses resolvidos só pelo manifesto e meses lidos do disco
+# ============================================================
+
+import pandas as pd
+
+from incremental import months_to_check, split_increment
+from storage import month_partition_keys, partition_manifest, write_partitions
+
+WATERMARK = pd.Timestamp("2024-02-28")
+
+
+def transacoes(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["cod_transacao", "data_transacao"]).astype(
+        {"data_transacao": "datetime64[ns]"})
+
+# Já processadas: janeiro (1, 2) e fevereiro (3, 4)
+PROCESSED = transacoes([
+    (1, "2024-01-05"), (2, "2024-01-20"),
+    (3, "2024-02-03"), (4, "2024-02-25"),
+])
+
+# Base intermediária atual: tudo acima, uma linha nova em março e uma
+# atrasada (chave 5, data de janeiro, anterior à marca d'água)
+INTERIM = pd.concat([PROCESSED, transacoes([(6, "2024-03-02"), (5, "2024-01-10")])], ignore_index=True)
+
+
+def test_late_row_rewrites_its_month_and_new_row_is_appended():
+    increment, append, rewrite = split_increment(INTERIM, "data_transacao", "cod_transacao", WATERMARK,
+                                                 PROCESSED["cod_transacao"])
+
+    assert rewrite == {"2024-01"}
+    assert append == {"2024-03"}
+    # Janeiro inteiro (inclusive as linhas já processadas) + a linha nova; fevereiro fica de fora
+    assert sorted(increment["cod_transacao"]) == [1, 2, 5, 6]
+
+
+def test_nothing_selected_when_no_new_or_late_rows():
+    increment, append, rewrite = split_increment(PROCESSED, "data_transacao", "cod_transacao", WATERMARK,
+                                                 PROCESSED["cod_transacao"])
+    assert increment.empty and not append and not rewrite
+
+
+def test_manifest_settles_months_without_reading_keys(tmp_path):
+    write_partitions(PROCESSED, tmp_path, "transacoes", month_partition_keys(PROCESSED["data_transacao"]),
+                     fmt="parquet", date_col="data_transacao")
+    manifest = partition_manifest(tmp_path, "transacoes")
+
+    # Fevereiro bate com o manifesto; janeiro tem a chave 5 fora do min/max (atrasada)
+    known, to_read = months_to_check(INTERIM, "data_transacao", "cod_transacao", WATERMARK, manifest)
+    assert sorted(known) == [3, 4]
+    assert to_read == []
+    _, append, rewrite = split_increment(INTERIM, "data_transacao", "cod_transacao", WATERMARK, known)
+    assert (append, rewrite) == ({"2024-03"}, {"2024-01"})
+
+    # Uma chave nova dentro do min/max de fevereiro: só o manifesto não decide, o mês é lido
+    inside = pd.concat([PROCESSED.iloc[[2]].assign(cod_transacao=10), PROCESSED.iloc[[3]]], ignore_index=True)
+    write_partitions(inside, tmp_path, "transacoes", month_partition_keys(inside["data_transacao"]),
+                     replace={"2024-02"}, fmt="parquet")
+    interim = pd.concat([inside, transacoes([(7, "2024-02-10")])], ignore_index=True)
+    known, to_read = months_to_check(interim, "data_transacao", "cod_transacao", WATERMARK,
+                                     partition_manifest(tmp_path, "transacoes"))
+    assert to_read == ["2024-02"]
+    assert known.empty
+
+    # Sem manifesto (tabela antiga): todos os meses anteriores à marca d'água são lidos
+    known, to_read = months_to_check(INTERIM, "data_transacao", "cod_transacao", WATERMARK, None)
+    assert to_read == ["2024-01", "2024-02"]
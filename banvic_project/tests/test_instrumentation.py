@@ -0,0 +1,58 @@
+# ============================================================
+# instrumentation.step com BANVIC_PROFILE_DIR e etapas em threads
+# (tarefas do DAG, map_tables): um único cProfile ativo por vez
+# ============================================================
+
+import json
+import threading
+
+import instrumentation
+
+
+class ExclusiveProfile:
+    """cProfile como no Python 3.12+: um segundo enable() simultâneo falha"""
+    active = 0
+    lock = threading.Lock()
+
+    def enable(self):
+        with self.lock:
+            if ExclusiveProfile.active:
+                raise ValueError("Another profiling tool is already active")
+            ExclusiveProfile.active += 1
+
+    def disable(self):
+        with self.lock:
+            ExclusiveProfile.active -= 1
+
+
+def test_concurrent_top_level_steps_share_one_profiler(tmp_path, monkeypatch):
+    metrics = tmp_path / "metricas.jsonl"
+    monkeypatch.setenv(instrumentation.PROFILE_ENV, str(tmp_path / "perfis"))
+    monkeypatch.setenv(instrumentation.METRICS_ENV, str(metrics))
+    monkeypatch.setattr(instrumentation.cProfile, "Profile", ExclusiveProfile)
+    monkeypatch.setattr(instrumentation, "_slowest", {"wall_s": -1.0, "name": None, "profiler": None})
+
+    # As duas etapas ficam abertas ao mesmo tempo
+    both_open = threading.Barrier(2)
+    errors = []
+
+    def run(name):
+        try:
+            with instrumentation.step(name):
+                both_open.wait(timeout=5)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run, args=(f"tabela_{i}",)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    names = {json.loads(line)["etapa"].split("/")[-1] for line in metrics.read_text(encoding="utf-8").splitlines()}
+    assert names == {"tabela_0", "tabela_1"}
+    assert ExclusiveProfile.active == 0
+    # O espaço foi liberado: a próxima etapa volta a ser perfilada
+    with instrumentation.step("depois"):
+        assert ExclusiveProfile.active == 1
@@ -0,0 +1,103 @@
+# ============================================================
+# Tabelas fato particionadas (storage.write_partitions): o diretório
+# year_month=AAAA-MM/ é lido também por leitores comuns (pandas, pyarrow)
+# Leitura por período: poda pelo min/max de datas do manifesto
+# (prune_partitions/read_partitioned) e manifesto recalculado para tabelas
+# gravadas antes dele existir
+# ============================================================
+
+import pandas as pd
+
+from storage import (
+    MANIFEST_FILE, PARTITION_COLUMN, load_table, month_partition_keys, partition_manifest, prune_partitions,
+    read_partitioned, write_partitions,
+)
+
+
+def propostas() -> pd.DataFrame:
+    dates = pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-03", None])
+    return pd.DataFrame({
+        "cod_proposta": [1, 2, 3, 4],
+        "data_entrada_proposta": dates,
+        "valor_proposta": [100.0, 200.0, 300.0, 400.0],
+        # Como no 02: o mês também existe como coluna (Period) na tabela em memória
+        PARTITION_COLUMN: dates.to_period("M"),
+    })
+
+
+def test_partitioned_table_round_trips_through_plain_read_parquet(tmp_path):
+    df = propostas()
+    write_partitions(df, tmp_path, "propostas", month_partition_keys(df["data_entrada_proposta"]),
+                     fmt="parquet", date_col="data_entrada_proposta")
+    # Um segundo lote no mesmo mês (nova parte na partição)
+    extra = propostas().iloc[[0]].assign(cod_proposta=5)
+    write_partitions(extra, tmp_path, "propostas", month_partition_keys(extra["data_entrada_proposta"]),
+                     fmt="parquet")
+
+    plain = pd.read_parquet(tmp_path / "propostas.parquet").sort_values("cod_proposta", ignore_index=True)
+    assert plain["cod_proposta"].tolist() == [1, 2, 3, 4, 5]
+    # O mês vem do nome da pasta
+    assert plain[PARTITION_COLUMN].astype(str).tolist() == ["2024-01", "2024-01", "2024-02", "nulo", "2024-01"]
+    pd.testing.assert_series_equal(plain["valor_proposta"], pd.Series([100.0, 200.0, 300.0, 400.0, 100.0],
+                                                                        name="valor_proposta"))
+
+    # Os leitores do projeto continuam lendo as mesmas linhas, sem a coluna de partição
+    ours = load_table(tmp_path, "propostas").sort_values("cod_proposta", ignore_index=True)
+    assert PARTITION_COLUMN not in ours
+    pd.testing.assert_frame_equal(ours, plain.drop(columns=PARTITION_COLUMN)[ours.columns])
+
+
+def write_propostas(directory, df=None, **kwargs):
+    df = propostas() if df is None else df
+    return write_partitions(df, directory, "propostas", month_partition_keys(df["data_entrada_proposta"]),
+                            fmt="parquet", **kwargs)
+
+
+def test_prune_uses_manifest_min_max_and_skips_null_partition(tmp_path):
+    write_propostas(tmp_path, date_col="data_entrada_proposta")
+
+    assert prune_partitions(tmp_path, "propostas") == ["2024-01", "2024-02", "nulo"]
+    # Janeiro só tem linhas até o dia 20 e fevereiro começa no dia 3: nada a ler entre os dois
+    assert prune_partitions(tmp_path, "propostas", "2024-01-21", "2024-02-02") == []
+    assert prune_partitions(tmp_path, "propostas", "2024-01-20", "2024-02-02") == ["2024-01"]
+    # Fim sem hora cobre o dia inteiro
+    assert prune_partitions(tmp_path, "propostas", end="2024-02-03") == ["2024-01", "2024-02"]
+
+    # Sem manifesto a poda cai para o mês inteiro indicado pela pasta
+    (tmp_path / "propostas.parquet" / MANIFEST_FILE).unlink()
+    assert prune_partitions(tmp_path, "propostas", "2024-01-21", "2024-02-02") == ["2024-01", "2024-02"]
+
+
+def test_read_partitioned_filters_period_and_partitions(tmp_path):
+    write_propostas(tmp_path, date_col="data_entrada_proposta")
+
+    df = read_partitioned(tmp_path, "propostas", "2024-01-20", "2024-02-03", columns=["cod_proposta"])
+    # A coluna de datas só entra para o filtro
+    assert df.columns.tolist() == ["cod_proposta"]
+    assert df["cod_proposta"].tolist() == [2, 3]
+
+    df = read_partitioned(tmp_path, "propostas", start="2024-01-01", partitions=["2024-02"])
+    assert df["cod_proposta"].tolist() == [3]
+
+    # Sem período nem partições: o mesmo que load_table (inclusive a partição de datas nulas)
+    pd.testing.assert_frame_equal(read_partitioned(tmp_path, "propostas"), load_table(tmp_path, "propostas"))
+
+
+def test_manifest_rebuilt_for_tables_written_before_it(tmp_path):
+    write_propostas(tmp_path, date_col="data_entrada_proposta")
+    expected = partition_manifest(tmp_path, "propostas")
+    (tmp_path / "propostas.parquet" / MANIFEST_FILE).unlink()
+    assert partition_manifest(tmp_path, "propostas") is None
+
+    # O próximo lote recalcula as estatísticas das partes já gravadas antes de somar as novas
+    extra = propostas().iloc[[2]].assign(cod_proposta=9, data_entrada_proposta=pd.Timestamp("2024-02-27"))
+    write_propostas(tmp_path, extra, date_col="data_entrada_proposta")
+    manifest = partition_manifest(tmp_path, "propostas")
+
+    assert manifest["coluna_data"] == "data_entrada_proposta"
+    assert manifest["particoes"]["2024-01"] == expected["particoes"]["2024-01"]
+    february = manifest["particoes"]["2024-02"]
+    assert (february["linhas"], february["partes"]) == (2, 2)
+    assert february["colunas"]["cod_proposta"] == {"min": 3, "max": 9}
+    assert february["colunas"]["data_entrada_proposta"]["max"].startswith("2024-02-27")
+    assert prune_partitions(tmp_path, "propostas", "2024-02-20", "2024-02-28") == ["2024-02"]
@@ -0,0 +1,90 @@
+# ============================================================
+# Equivalência do modo streaming (02/03 --streaming) com o modo normal
+# Base fake pequena (gerador em modo escala, semente fixa) e orçamento
+# mínimo, para que transações sejam percorridas em vários blocos: as tabelas
+# processadas e os exports finais têm de sair iguais aos do modo normal.
+# ============================================================
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from storage import load_table
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = PROJECT_ROOT / "scripts"
+GENERATOR = PROJECT_ROOT / "scriptsdatafake" / "generate_fake_data.py"
+
+TRANSACOES = 5_000
+BUDGET_MB = "1"
+PROCESSED_TABLES = ["agencias", "clientes", "colaboradores", "colab_agencia", "contas", "propostas",
+                    "transacoes", "dim_calendario"]
+
+
+def run(script, data_dir, *args) -> str:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("BANVIC_")}
+    env["BANVIC_DATA_DIR"] = str(data_dir)
+    proc = subprocess.run([sys.executable, str(SCRIPTS / script), *args], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True)
+    assert proc.returncode == 0, f"{script} {' '.join(args)} falhou:\n{proc.stdout[-3000:]}\n{proc.stderr[-3000:]}"
+    return proc.stdout
+
+def chunk_rows(log) -> int:
+    return int(re.search(r"blocos de (\d+) linhas", log).group(1))
+
+
+@pytest.fixture(scope="module")
+def outputs(tmp_path_factory):
+    """Mesma base intermediária processada no modo normal e em streaming"""
+    normal = tmp_path_factory.mktemp("normal")
+    raw = normal / "raw"
+    subprocess.run([sys.executable, str(GENERATOR), "--transacoes", str(TRANSACOES), "--processos", "1",
+                    "--saida", str(raw)], check=True, stdout=subprocess.DEVNULL)
+    # O 01 espera os nomes sem o sufixo _fake
+    for path in raw.glob("*_fake.csv"):
+        path.replace(raw / path.name.replace("_fake", ""))
+    run("01_ingest_inspect.py", normal)
+
+    streamed = tmp_path_factory.mktemp("streaming") / "data"
+    shutil.copytree(normal, streamed)
+
+    run("02_clean_transform.py", normal)
+    run("03_eda_and_exports.py", normal)
+    logs = [run("02_clean_transform.py", streamed, "--streaming", "--memoria-mb", BUDGET_MB),
+            run("03_eda_and_exports.py", streamed, "--streaming", "--memoria-mb", BUDGET_MB)]
+    return normal, streamed, logs
+
+
+def test_small_budget_reads_transactions_in_several_chunks(outputs):
+    _, _, logs = outputs
+    for log in logs:
+        assert chunk_rows(log) < TRANSACOES / 2
+
+
+@pytest.mark.parametrize("name", PROCESSED_TABLES)
+def test_streaming_reproduces_processed_tables(outputs, name):
+    normal, streamed, _ = outputs
+    expected = load_table(normal / "processed", name)
+    got = load_table(streamed / "processed", name)
+    key = expected.columns[0]
+    pd.testing.assert_frame_equal(got.sort_values(key, ignore_index=True)[expected.columns],
+                                  expected.sort_values(key, ignore_index=True))
+
+
+def test_streaming_reproduces_final_exports(outputs):
+    normal, streamed, _ = outputs
+    files = sorted(p.name for p in (normal / "final").iterdir())
+    assert files
+    assert sorted(p.name for p in (streamed / "final").iterdir()) == files
+
+    for name in files:
+        read = pd.read_csv if name.endswith(".csv") else pd.read_parquet
+        # Totais somados bloco a bloco: só a última casa decimal pode mudar
+        pd.testing.assert_frame_equal(read(streamed / "final" / name), read(normal / "final" / name),
+                                      check_exact=False, rtol=1e-9, obj=name)